@@ -1,25 +1,30 @@
-import streamlit as st
+from profiling import profiler
+
+profiler.install()
+
+with profiler.stage("导入 streamlit"):
+    import streamlit as st
 import atexit
-from models.config import metadata
-from models.data import data as raw_data
+with profiler.stage("导入数据模型"):
+    from models.config import metadata
+    from models.registry import DEFAULT_PARK, registry
 from context import get_workdir
-from pages import *
+with profiler.stage("声明页面"):
+    from pages import *
 
 __metadata__ = metadata()
 
-if "app_data" not in st.session_state:
-    print("New session started. Loading application data from file...")
-    raw_data.read()
-    st.session_state.app_data = raw_data
-    print("Data loaded into session state.")
+if "park" not in st.session_state:
+    print("New session started.")
+    # 会话里只记录景区名称，景区数据由进程内的注册表统一加载和换出
+    st.session_state.park = DEFAULT_PARK
     print("Starting ScenicPathfinder application...")
 
-data = st.session_state.app_data
-
 
 def save_data_on_exit():
     print("Saving data before exit...")
-    data.save()
+    # 修改都由后台线程保存，退出前把所有已加载景区还在防抖等待中的修改写完
+    registry.close()
 
 
 def register_save_data():
@@ -43,6 +48,7 @@ if __name__ == "__main__":
                 GUEST_FIND_SHORTEST_PATH_PAGE,
                 GUEST_FIND_ALL_SIMPLE_PATH_PAGE,
                 GUEST_GET_PLAN_PAGE,
+                GUEST_FIND_REACHABLE_PAGE,
                 GUEST_VIEW_MAP_PAGE
             ],
             "管理员": [
@@ -52,9 +58,38 @@ if __name__ == "__main__":
                 ADMIN_ADD_PATH_PAGE,
                 ADMIN_MODIFY_PATH_PAGE,
                 ADMIN_REMOVE_PATH_PAGE,
+                ADMIN_BULK_IMPORT_PAGE,
+                ADMIN_SYNC_PAGE,
             ],
             "调试": [DEBUG_DATA_VIEW_PAGE, DEBUG_GENERATE_DATA_PAGE],
         },
         position="top",
     )
-    pg.run()
+    with st.sidebar:
+        parks = registry.names()
+        if st.session_state.park not in parks:
+            st.session_state.park = DEFAULT_PARK
+        st.selectbox("当前景区", parks, key="park")
+        with st.expander("新建景区"):
+            new_park = st.text_input("景区名称", key="new_park")
+            if st.button("新建") and new_park:
+                try:
+                    registry.create(new_park)
+                    st.success(f"已新建景区 {new_park}，可以在上方切换")
+                except ValueError as e:
+                    st.error(str(e))
+    # 第一次使用的景区在后台线程中加载，不阻塞首次渲染
+    data = registry.get(st.session_state.park, background=True)
+    st.session_state.app_data = data
+    # 首页不需要景区数据，其余页面在数据加载完成之前显示加载提示
+    if pg.url_path != HOME_PAGE.url_path and not data.loaded:
+        with st.spinner("正在加载景区数据..."):
+            data.wait_until_loaded()
+    try:
+        pg.run()
+    finally:
+        # 不在会话中长期持有景区数据，景区被换出之后可以释放内存
+        del st.session_state.app_data
+    profiler.mark("首次页面渲染完成")
+    # 启动阶段已经结束，恢复内置的 __import__，之后各页面的导入不再经过计时的包装
+    profiler.uninstall()
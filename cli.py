@@ -0,0 +1,853 @@
+"""
+ScenicPathfinder 命令行工具
+
+用于离线批量查询路线，例如每晚生成线路表：
+
+    python cli.py query data/graph.json jobs.jsonl > routes.jsonl
+    cat jobs.csv | python cli.py query data/graph.json - --format csv --workers 4
+
+每个查询任务是一行 JSON 或 CSV 中的一行，支持的字段：
+
+    type       任务类型，shortest / all_paths / tsp
+    id         任务编号，可选，缺省时使用任务的行号
+    start      起始景点，景点索引或者景点名称
+    target     目标景点，景点索引或者景点名称
+    weight     权重类型，distance / duration，默认为 distance
+    must_pass  必经景点（tsp），JSON 中为列表，CSV 中用 ; 分隔
+    optimize   优化路线的秒数（tsp），缺省时只用贪心算法，给出时在时间内用局部搜索改进贪心路线
+    max_paths  最多返回的路径条数（all_paths）
+    max_depth  路径最多包含的道路条数（all_paths）
+
+任务中大量 tsp 时可以加上 --distance-matrix，预先计算全源最短距离矩阵，之后的 tsp 直接查表
+景点很多的景区中大量 shortest 任务可以加上 --overlay，预先对图分区并建立多层覆盖图，查询时走捷径；
+只对道路大致只连接相邻景点的景区有效，分区切开的道路太多时自动改用 dijkstra
+单个 all_paths 任务很大时可以加上 --enumeration-workers，把一次枚举拆分到多个进程中并行；
+使用 --workers 时，没有 max_paths 或者 max_paths 超过 10000 的 all_paths 任务仍在主进程中逐条输出
+
+结果以 JSON Lines 的形式逐条写到标准输出，任务失败时输出带 error 字段的记录而不会中断后续任务
+
+批量导入景点和道路，记录格式见 models/importer：
+
+    python cli.py import data/graph.json park.csv
+    python cli.py import data/graph.json park.json --strict
+
+所有记录校验完成后一次性写入并只保存一次，无效记录逐条输出到标准错误
+
+在进程内模拟多个并发会话对真实页面做压力测试，报告以 JSON 输出到标准输出：
+
+    python cli.py loadtest --spots 5000 --guests 16 --admins 2 --duration 60
+    python cli.py loadtest --graph data/graph.json --guests 8 --think-time 2
+
+不指定 --graph 时生成一个随机景区；测试中的修改写入临时目录，不会改动原来的数据文件
+
+在多个实例之间同步修改，只传输有变化的景点和道路：
+
+    python cli.py diff base.json data/graph.json > changes.json
+    python cli.py apply data/graph.json changes.json
+
+base.json 是上次分发给其他实例的数据文件（连同同名的 .descriptions 文件一起保留），
+apply 在当前数据与修改集的基准不一致时拒绝修改，重复应用同一个修改集不会有任何效果
+
+比较最短路径搜索使用的各种优先队列（二叉堆、桶队列、基数堆）在大景区上的耗时：
+
+    python cli.py bench-queues --spots 100000 --sources 5
+    python cli.py bench-queues --graph data/graph.json
+
+对大量起点求完整的最短路径树，例如生成全网报表，每个起点输出一行摘要：
+
+    python cli.py sssp --graph data/graph.json --random 200 --workers 0 > report.jsonl
+    python cli.py sssp --graph data/graph.json --sources 0,12,游客中心 --save-dir trees
+
+使用 delta-stepping 算法，每批景点的道路用 NumPy 数组运算一起松弛；多个进程共享同一份邻接数组，
+各自负责一部分起点。结果与 dijkstra 完全相同，--verify N 会用 dijkstra 核对前 N 棵树
+"""
+
+import argparse
+import csv
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from typing import Any, Dict, Iterable, Iterator, List, TextIO
+
+import numpy as np
+
+from exceptions import ScenicPathfinderError
+from models.data import ApplicationData
+from models.deltastep import UNREACHED, CompactGraph, shortest_path_trees, tree_to_dicts
+from models.enumeration import iter_all_paths_parallel
+from models.graph import TourGraph
+from models.importer import FORMATS, detect_format, import_records, read_records
+from models.loadtest import LoadTest, generate_graph
+from models.pqueue import benchmark
+from models.sync import ChangeSet, apply_changes, diff_graphs
+
+JOB_TYPES = ("shortest", "all_paths", "tsp")
+# 工作进程中的任务结果要整体传回主进程，all_paths 任务的 max_paths 不超过这个值时才交给工作进程，
+# 没有 max_paths 或者更大的 all_paths 任务在主进程中流式执行，内存占用不随路径条数增长
+WORKER_MAX_PATHS = 10000
+
+# 工作进程内各自持有的图实例，由 _init_worker 加载
+_worker_graph: TourGraph | None = None
+_worker_overlay = False
+
+
+def load_graph(filepath: str) -> TourGraph:
+    """
+    从数据文件加载图
+
+    :param filepath(str): 图数据文件路径
+    :return: 加载好的图
+    """
+    if not os.path.exists(filepath):
+        raise FileNotFoundError(f"找不到图数据文件 {filepath}")
+    # 路线查询用不到景点简介，不打开简介存储
+    app_data = ApplicationData(file=filepath, lazy_descriptions=False)
+    app_data.read()
+    return app_data.graph
+
+
+def read_jobs(stream: TextIO, fmt: str) -> Iterator[Dict[str, Any]]:
+    """
+    从输入流中逐条读取查询任务，不会一次性把所有任务读入内存
+
+    :param stream(TextIO): 输入流
+    :param fmt(str): 输入格式，jsonl 或者 csv
+    :return: 逐条产出的任务字典
+    """
+    if fmt == "csv":
+        for index, row in enumerate(csv.DictReader(stream)):
+            job: Dict[str, Any] = {k: v for k, v in row.items() if v not in ("", None)}
+            job.setdefault("id", index)
+            yield job
+        return
+
+    for index, line in enumerate(stream):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            job = json.loads(line)
+        except json.JSONDecodeError as e:
+            job = {"error": f"无法解析的任务: {e}"}
+        if not isinstance(job, dict):
+            job = {"error": "任务必须是 JSON 对象"}
+        job.setdefault("id", index)
+        yield job
+
+
+def _resolve_spot(graph: TourGraph, value: Any) -> int:
+    """
+    把任务里的景点字段解析为景点索引，允许直接给出索引或者景点名称
+
+    :param graph(TourGraph): 图
+    :param value(Any): 景点索引或名称
+    :return: 景点索引
+    """
+    if isinstance(value, int):
+        return value
+    value = str(value).strip()
+    if value.lstrip("-").isdigit():
+        return int(value)
+    return graph.find_spot_by_name(value).id
+
+
+def _optional_int(job: Dict[str, Any], key: str) -> int | None:
+    value = job.get(key)
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(f"字段 {key} 必须是整数")
+    return int(value)
+
+
+def _check_job(job: Dict[str, Any]) -> None:
+    """
+    在执行之前检查任务字段的类型，字段类型不对时抛出 ValueError
+
+    :param job(Dict[str, Any]): 任务字典
+    """
+    for key in ("start", "target"):
+        value = job.get(key)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (int, str))):
+            raise ValueError(f"字段 {key} 必须是景点索引或者景点名称")
+    if not isinstance(job.get("weight", "distance"), str):
+        raise ValueError("字段 weight 必须是字符串")
+    must_pass = job.get("must_pass", [])
+    if not isinstance(must_pass, (list, str)):
+        raise ValueError("字段 must_pass 必须是列表或者用 ; 分隔的字符串")
+    if isinstance(must_pass, list) and any(
+        isinstance(p, bool) or not isinstance(p, (int, str)) for p in must_pass
+    ):
+        raise ValueError("字段 must_pass 中只能是景点索引或者景点名称")
+    optimize = job.get("optimize")
+    if optimize not in (None, "") and (
+        isinstance(optimize, bool) or not isinstance(optimize, (int, float, str))
+    ):
+        raise ValueError("字段 optimize 必须是秒数")
+    for key in ("max_paths", "max_depth"):
+        _optional_int(job, key)
+
+
+def run_job(
+    graph: TourGraph,
+    job: Dict[str, Any],
+    enumeration_workers: int = 1,
+    overlay: bool = False,
+) -> Iterator[Dict[str, Any]]:
+    """
+    执行一个查询任务，逐条产出结果记录
+
+    :param graph(TourGraph): 图
+    :param job(Dict[str, Any]): 任务字典
+    :param enumeration_workers(int): all_paths 任务并行枚举的进程数，1 表示不并行
+    :param overlay(bool): shortest 任务是否在多层覆盖图上查询
+    :return: 逐条产出的结果记录
+    """
+    job_id = job.get("id")
+    job_type = job.get("type")
+    if "error" in job:
+        yield {"id": job_id, "error": job["error"]}
+        return
+    if job_type not in JOB_TYPES:
+        yield {"id": job_id, "error": f"未知的任务类型 {job_type}"}
+        return
+
+    try:
+        _check_job(job)
+        start_id = _resolve_spot(graph, job["start"])
+        target_id = _resolve_spot(graph, job["target"])
+        weight_type = job.get("weight", "distance")
+
+        if job_type == "shortest":
+            if overlay:
+                total, path = graph.overlay_dijkstra(start_id, target_id, weight_type)
+            else:
+                total, path = graph.dijkstra(start_id, target_id, weight_type)
+            yield {"id": job_id, "type": job_type, "total": total, "path": path}
+
+        elif job_type == "all_paths":
+            max_paths = _optional_int(job, "max_paths")
+            max_depth = _optional_int(job, "max_depth")
+            if enumeration_workers == 1:
+                paths = graph.iter_all_paths(start_id, target_id, max_depth=max_depth)
+            else:
+                paths = iter_all_paths_parallel(
+                    graph,
+                    start_id,
+                    target_id,
+                    max_depth=max_depth,
+                    workers=enumeration_workers or None,
+                )
+            count = 0
+            with closing(paths):
+                # 达到 max_paths 后立即停止，不再多枚举下一条路径
+                if max_paths is None or max_paths > 0:
+                    for distance, duration, path in paths:
+                        count += 1
+                        yield {
+                            "id": job_id,
+                            "type": job_type,
+                            "distance": distance,
+                            "duration": duration,
+                            "path": path,
+                        }
+                        if max_paths is not None and count >= max_paths:
+                            break
+            if count == 0:
+                yield {"id": job_id, "type": job_type, "path": []}
+
+        else:
+            must_pass = job.get("must_pass", [])
+            if isinstance(must_pass, str):
+                must_pass = [p for p in must_pass.split(";") if p.strip()]
+            must_pass_ids = [_resolve_spot(graph, p) for p in must_pass]
+            optimize = job.get("optimize")
+            if optimize in (None, ""):
+                total, path = graph.tsp(start_id, target_id, must_pass_ids, weight_type)
+                yield {"id": job_id, "type": job_type, "total": total, "path": path}
+            else:
+                total, path, report = graph.optimize_tour(
+                    start_id,
+                    target_id,
+                    must_pass_ids,
+                    weight_type,
+                    time_budget=float(optimize),
+                )
+                yield {
+                    "id": job_id,
+                    "type": job_type,
+                    "total": total,
+                    "path": path,
+                    "greedy_total": report.get("初始路线总权重"),
+                    "improvement": report.get("改进比例"),
+                }
+
+    except KeyError as e:
+        yield {"id": job_id, "error": f"缺少字段 {e}"}
+    except (ScenicPathfinderError, ValueError, IndexError) as e:
+        yield {"id": job_id, "error": str(e)}
+    except Exception as e:
+        # 单个任务的任何异常都只输出错误记录，不中断后续任务
+        yield {"id": job_id, "error": f"{type(e).__name__}: {e}"}
+
+
+def _init_worker(filepath: str, distance_matrix: bool, overlay: bool) -> None:
+    global _worker_graph, _worker_overlay
+    _worker_graph = load_graph(filepath)
+    _worker_overlay = overlay
+    if distance_matrix:
+        _build_distance_matrices(_worker_graph)
+    if overlay:
+        _build_overlays(_worker_graph)
+
+
+def _build_distance_matrices(graph: TourGraph) -> None:
+    for weight_type in ("distance", "duration"):
+        graph.distance_matrix(weight_type)
+
+
+def _build_overlays(graph: TourGraph) -> None:
+    if not graph.partition().worthwhile:
+        return  # 覆盖图不会比 dijkstra 快，查询时直接使用 dijkstra
+    for weight_type in ("distance", "duration"):
+        graph.overlay(weight_type)
+
+
+def _run_job_in_worker(job: Dict[str, Any]) -> List[Dict[str, Any]]:
+    assert _worker_graph is not None
+    return list(run_job(_worker_graph, job, overlay=_worker_overlay))
+
+
+def _runs_in_worker(job: Dict[str, Any]) -> bool:
+    """
+    :param job(Dict[str, Any]): 任务字典
+    :return: 任务的结果条数是否有上限，可以交给工作进程执行
+    """
+    if job.get("type") != "all_paths":
+        return True
+    try:
+        max_paths = _optional_int(job, "max_paths")
+    except Exception:
+        return True  # 由工作进程输出错误记录
+    return max_paths is not None and max_paths <= WORKER_MAX_PATHS
+
+
+def _write_records(records: Iterable[Dict[str, Any]], out: TextIO) -> None:
+    for record in records:
+        out.write(json.dumps(record, ensure_ascii=False))
+        out.write("\n")
+    out.flush()
+
+
+def run_serial(
+    graph: TourGraph,
+    jobs: Iterable[Dict[str, Any]],
+    out: TextIO,
+    enumeration_workers: int = 1,
+    overlay: bool = False,
+) -> None:
+    """
+    在当前进程中逐个执行任务，并把结果流式写出
+
+    :param graph(TourGraph): 图
+    :param jobs(Iterable[Dict[str, Any]]): 任务
+    :param out(TextIO): 输出流
+    :param enumeration_workers(int): all_paths 任务并行枚举的进程数，1 表示不并行
+    :param overlay(bool): shortest 任务是否在多层覆盖图上查询
+    """
+    for job in jobs:
+        _write_records(run_job(graph, job, enumeration_workers, overlay), out)
+
+
+def run_parallel(
+    filepath: str,
+    jobs: Iterable[Dict[str, Any]],
+    out: TextIO,
+    workers: int,
+    distance_matrix: bool = False,
+    overlay: bool = False,
+) -> None:
+    """
+    用进程池并行执行任务，输出顺序与输入顺序一致
+    同一时间最多只有 workers * 4 个任务在途，因此内存占用不随任务总数增长；
+    工作进程的结果要整体传回，结果条数没有上限的 all_paths 任务（见 WORKER_MAX_PATHS）
+    轮到它输出时改为在主进程中流式执行，主进程只在遇到这种任务时才加载图
+
+    :param filepath(str): 图数据文件路径，由每个工作进程各自加载
+    :param jobs(Iterable[Dict[str, Any]]): 任务
+    :param out(TextIO): 输出流
+    :param workers(int): 工作进程数
+    :param distance_matrix(bool): 工作进程是否预先计算全源最短距离矩阵
+    :param overlay(bool): 工作进程是否预先建立多层覆盖图，并用它查询 shortest 任务
+    """
+    window = workers * 4
+    # 在途的任务与对应的 Future，在主进程中执行的任务 Future 为 None
+    pending = deque()
+    graph: TourGraph | None = None
+
+    def write_next() -> None:
+        nonlocal graph
+        job, future = pending.popleft()
+        if future is None:
+            if graph is None:
+                graph = load_graph(filepath)
+            _write_records(run_job(graph, job), out)
+            return
+        try:
+            records = future.result()
+        except Exception as e:
+            # 工作进程异常退出或者结果无法传回，只影响这一个任务
+            records = [{"id": job.get("id"), "error": f"{type(e).__name__}: {e}"}]
+        _write_records(records, out)
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(filepath, distance_matrix, overlay),
+    ) as executor:
+        for job in jobs:
+            if _runs_in_worker(job):
+                pending.append((job, executor.submit(_run_job_in_worker, job)))
+            else:
+                pending.append((job, None))
+            if len(pending) >= window:
+                write_next()
+        while pending:
+            write_next()
+
+
+def _detect_format(jobs_path: str, fmt: str | None) -> str:
+    if fmt is not None:
+        return fmt
+    if jobs_path.lower().endswith(".csv"):
+        return "csv"
+    return "jsonl"
+
+
+def command_query(args: argparse.Namespace) -> int:
+    fmt = _detect_format(args.jobs, args.format)
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    if workers != 1 and args.enumeration_workers != 1:
+        # 进程池中的工作进程不能再创建子进程
+        print("错误: --workers 与 --enumeration-workers 不能同时使用", file=sys.stderr)
+        return 2
+
+    if args.jobs == "-":
+        stream = sys.stdin
+    else:
+        stream = open(args.jobs, "r", encoding="utf-8", newline="")
+
+    try:
+        jobs = read_jobs(stream, fmt)
+        if workers == 1:
+            graph = load_graph(args.graph)
+            if args.distance_matrix:
+                _build_distance_matrices(graph)
+            if args.overlay:
+                _build_overlays(graph)
+            run_serial(graph, jobs, sys.stdout, args.enumeration_workers, args.overlay)
+        else:
+            run_parallel(
+                args.graph,
+                jobs,
+                sys.stdout,
+                workers,
+                args.distance_matrix,
+                args.overlay,
+            )
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    return 0
+
+
+def command_import(args: argparse.Namespace) -> int:
+    fmt = args.format or detect_format(args.records)
+    # 导入的目标文件可以不存在，此时导入到一个空的图中
+    app_data = ApplicationData(file=args.graph)
+    app_data.read()
+
+    if args.records == "-":
+        stream = sys.stdin
+    else:
+        stream = open(args.records, "r", encoding="utf-8-sig", newline="")
+    try:
+        report = import_records(
+            app_data.graph, read_records(stream, fmt), strict=args.strict
+        )
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+    for error in report.errors:
+        print(f"第 {error.line} 行: {error.message}", file=sys.stderr)
+    if not report.applied:
+        print(f"存在 {len(report.errors)} 条无效记录，未导入任何数据", file=sys.stderr)
+        return 1
+    app_data.save()
+    print(
+        f"已导入 {report.spots_added} 个景点、{report.paths_added} 条道路，"
+        f"跳过 {len(report.errors)} 条无效记录"
+    )
+    return 1 if report.errors else 0
+
+
+def command_loadtest(args: argparse.Namespace) -> int:
+    from streamlit import config
+    from streamlit.logger import set_log_level
+
+    # 模拟的会话不在真正的 Streamlit 服务中，缺少 ScriptRunContext 之类的警告没有意义
+    config.set_option("logger.level", "error")
+    set_log_level("error")
+    workdir = tempfile.mkdtemp(prefix="scenic-loadtest-")
+    # 测试中的修改只保存到临时目录
+    app_data = ApplicationData(
+        file=os.path.join(workdir, "graph.json"), lazy_descriptions=False
+    )
+    try:
+        if args.graph:
+            app_data.graph = load_graph(args.graph)
+        else:
+            app_data.graph = generate_graph(args.spots, args.degree, args.seed)
+        print(
+            f"景点 {app_data.graph.live_nodes} 个，道路 {app_data.graph.paths} 条，"
+            f"{args.guests} 个游客会话、{args.admins} 个管理员会话，运行 {args.duration} 秒",
+            file=sys.stderr,
+        )
+        report = LoadTest(
+            app_data,
+            guests=args.guests,
+            admins=args.admins,
+            duration=args.duration,
+            think_time=args.think_time,
+            baseline=args.baseline,
+            seed=args.seed,
+        ).run()
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        sys.stdout.write("\n")
+    finally:
+        app_data.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+def command_bench_queues(args: argparse.Namespace) -> int:
+    if args.graph:
+        graph = load_graph(args.graph)
+    else:
+        graph = generate_graph(args.spots, args.degree, args.seed)
+    live_ids = graph._live_ids
+    if not live_ids:
+        print("错误: 图中没有景点", file=sys.stderr)
+        return 1
+    rng = random.Random(args.seed)
+    sources = rng.sample(live_ids, min(args.sources, len(live_ids)))
+    print(
+        f"景点 {graph.live_nodes} 个，道路 {graph.paths} 条，每种队列求 {len(sources)} 棵最短路径树",
+        file=sys.stderr,
+    )
+    rows = []
+    for weight_type in ("distance", "duration"):
+        rows.extend(benchmark(graph, sources, weight_type))
+    _write_records(rows, sys.stdout)
+    return 0 if all(row["结果一致"] for row in rows) else 1
+
+
+def command_sssp(args: argparse.Namespace) -> int:
+    if args.graph:
+        graph = load_graph(args.graph)
+    else:
+        graph = generate_graph(args.spots, args.degree, args.seed)
+    if args.sources:
+        sources = [_resolve_spot(graph, value) for value in args.sources.split(",")]
+        for source in sources:
+            if not graph._is_valid_node(source):
+                print(f"错误: 景点 {source} 不存在或已被删除", file=sys.stderr)
+                return 1
+    else:
+        live_ids = graph._live_ids
+        rng = random.Random(args.seed)
+        sources = rng.sample(live_ids, min(args.random, len(live_ids)))
+    if args.save_dir:
+        os.makedirs(args.save_dir, exist_ok=True)
+
+    compact = CompactGraph.from_graph(graph, args.weight)
+    delta = args.delta or compact.default_delta
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    print(
+        f"景点 {graph.live_nodes} 个，道路 {graph.paths} 条，"
+        f"用 {workers} 个进程求 {len(sources)} 棵最短路径树，桶宽度 {delta}",
+        file=sys.stderr,
+    )
+    start = time.perf_counter()
+    mismatches = 0
+    trees = shortest_path_trees(compact, sources, delta, workers)
+    for index, (source, dist, predecessors, elapsed) in enumerate(trees):
+        reached = np.flatnonzero(dist != UNREACHED)
+        farthest = int(reached[dist[reached].argmax()])
+        record = {
+            "起点": source,
+            "可达景点": len(reached),
+            "最远景点": farthest,
+            "最远距离": int(dist[farthest]),
+            "平均距离": round(float(dist[reached].mean()), 1),
+            "耗时 (ms)": round(elapsed, 1),
+        }
+        if index < args.verify:
+            same = tree_to_dicts(dist, predecessors) == graph.shortest_path_tree(
+                source, args.weight
+            )
+            record["与 dijkstra 一致"] = same
+            mismatches += not same
+        if args.save_dir:
+            np.savez_compressed(
+                os.path.join(args.save_dir, f"{source}.npz"),
+                dist=dist,
+                predecessors=predecessors,
+            )
+        _write_records([record], sys.stdout)
+    elapsed = time.perf_counter() - start
+    print(
+        f"共 {len(sources)} 棵树，用时 {elapsed:.1f} 秒，"
+        f"平均每秒 {len(sources) / max(elapsed, 1e-9):.1f} 棵",
+        file=sys.stderr,
+    )
+    return 1 if mismatches else 0
+
+
+def _read_data(filepath: str) -> ApplicationData:
+    if not os.path.exists(filepath):
+        raise FileNotFoundError(f"找不到图数据文件 {filepath}")
+    # 增量修改包含景点简介，需要读取简介存储
+    app_data = ApplicationData(file=filepath)
+    app_data.read()
+    return app_data
+
+
+def command_diff(args: argparse.Namespace) -> int:
+    base = _read_data(args.base)
+    current = _read_data(args.graph)
+    changes = diff_graphs(base.graph, current.graph)
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        out.write(changes.model_dump_json(indent=2))
+        out.write("\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(
+        f"共 {len(changes.spots)} 个景点、{len(changes.edges)} 条道路有变化，"
+        f"基准版本 {changes.base}，结果版本 {changes.target}",
+        file=sys.stderr,
+    )
+    return 0
+
+
+def command_apply(args: argparse.Namespace) -> int:
+    if args.changes == "-":
+        text = sys.stdin.read()
+    else:
+        with open(args.changes, "r", encoding="utf-8") as f:
+            text = f.read()
+    try:
+        changes = ChangeSet.model_validate_json(text)
+    except ValueError as e:
+        print(f"错误: 无法解析的增量修改文件: {e}", file=sys.stderr)
+        return 1
+    app_data = _read_data(args.graph)
+    if not apply_changes(app_data.graph, changes):
+        print(f"数据已经是版本 {changes.target}，无需修改")
+        return 0
+    app_data.save()
+    print(
+        f"已应用 {len(changes.spots)} 个景点、{len(changes.edges)} 条道路的修改，"
+        f"当前版本 {changes.target}"
+    )
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="cli.py", description="ScenicPathfinder 景区寻路系统命令行工具"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    query = subparsers.add_parser("query", help="批量执行路线查询任务")
+    query.add_argument("graph", help="图数据文件路径，例如 data/graph.json")
+    query.add_argument(
+        "jobs", nargs="?", default="-", help="任务文件路径，缺省或 - 表示从标准输入读取"
+    )
+    query.add_argument(
+        "--format", choices=["jsonl", "csv"], help="任务格式，缺省时根据文件扩展名判断"
+    )
+    query.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="并行的工作进程数，0 表示使用全部 CPU 核心，默认为 1",
+    )
+    query.add_argument(
+        "--distance-matrix",
+        action="store_true",
+        help="预先计算全源最短距离矩阵，适合大量 tsp 任务",
+    )
+    query.add_argument(
+        "--overlay",
+        action="store_true",
+        help="预先对图分区并建立多层覆盖图，shortest 任务在覆盖图上查询，适合景点很多的景区",
+    )
+    query.add_argument(
+        "--enumeration-workers",
+        type=int,
+        default=1,
+        help="单个 all_paths 任务并行枚举的进程数，0 表示使用全部 CPU 核心，不能与 --workers 同时使用",
+    )
+    query.set_defaults(handler=command_query)
+
+    bulk_import = subparsers.add_parser("import", help="从 CSV / JSON 批量导入景点和道路")
+    bulk_import.add_argument("graph", help="图数据文件路径，不存在时会新建")
+    bulk_import.add_argument(
+        "records", nargs="?", default="-", help="记录文件路径，缺省或 - 表示从标准输入读取"
+    )
+    bulk_import.add_argument(
+        "--format", choices=FORMATS, help="记录格式，缺省时根据文件扩展名判断"
+    )
+    bulk_import.add_argument(
+        "--strict", action="store_true", help="存在任何无效记录时不导入任何数据"
+    )
+    bulk_import.set_defaults(handler=command_import)
+
+    loadtest = subparsers.add_parser("loadtest", help="模拟多个并发会话对页面做压力测试")
+    loadtest.add_argument(
+        "--graph", help="使用已有的图数据文件，缺省时生成随机景区，文件本身不会被修改"
+    )
+    loadtest.add_argument(
+        "--spots", type=int, default=5000, help="生成的景点数量，默认为 5000"
+    )
+    loadtest.add_argument(
+        "--degree", type=int, default=3, help="生成的景区中平均每个景点的道路数，默认为 3"
+    )
+    loadtest.add_argument("--guests", type=int, default=8, help="游客会话数，默认为 8")
+    loadtest.add_argument(
+        "--admins", type=int, default=1, help="管理员会话数，默认为 1"
+    )
+    loadtest.add_argument(
+        "--duration", type=float, default=30.0, help="并发测试的秒数，默认为 30"
+    )
+    loadtest.add_argument(
+        "--think-time",
+        type=float,
+        default=0.0,
+        help="两次操作之间的平均思考秒数，默认为 0，即操作完立即进行下一次",
+    )
+    loadtest.add_argument(
+        "--baseline",
+        type=float,
+        default=5.0,
+        help="先让单个会话单独运行的秒数，用于计算并发时各页面变慢的倍数，0 表示不测",
+    )
+    loadtest.add_argument("--seed", type=int, default=0, help="随机数种子")
+    loadtest.set_defaults(handler=command_loadtest)
+
+    bench_queues = subparsers.add_parser(
+        "bench-queues", help="比较最短路径搜索使用的各种优先队列的耗时"
+    )
+    bench_queues.add_argument(
+        "--graph", help="使用已有的图数据文件，缺省时生成随机景区"
+    )
+    bench_queues.add_argument(
+        "--spots", type=int, default=100000, help="生成的景点数量，默认为 100000"
+    )
+    bench_queues.add_argument(
+        "--degree", type=int, default=3, help="生成的景区中平均每个景点的道路数，默认为 3"
+    )
+    bench_queues.add_argument(
+        "--sources", type=int, default=5, help="每种队列求最短路径树的起点数，默认为 5"
+    )
+    bench_queues.add_argument("--seed", type=int, default=0, help="随机数种子")
+    bench_queues.set_defaults(handler=command_bench_queues)
+
+    sssp = subparsers.add_parser(
+        "sssp", help="用 delta-stepping 算法并行求多个起点的完整最短路径树"
+    )
+    sssp.add_argument("--graph", help="使用已有的图数据文件，缺省时生成随机景区")
+    sssp.add_argument(
+        "--spots", type=int, default=100000, help="生成的景点数量，默认为 100000"
+    )
+    sssp.add_argument(
+        "--degree", type=int, default=3, help="生成的景区中平均每个景点的道路数，默认为 3"
+    )
+    sssp.add_argument(
+        "--sources", help="起点，景点索引或者景点名称，用逗号分隔，缺省时随机选择"
+    )
+    sssp.add_argument(
+        "--random", type=int, default=10, help="没有给出 --sources 时随机选择的起点数，默认为 10"
+    )
+    sssp.add_argument(
+        "--weight",
+        choices=["distance", "duration"],
+        default="distance",
+        help="权重类型，默认为 distance",
+    )
+    sssp.add_argument(
+        "--delta", type=int, help="桶宽度，缺省时取道路平均权重的 4 倍"
+    )
+    sssp.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="并行的工作进程数，0 表示使用全部 CPU 核心，默认为 1",
+    )
+    sssp.add_argument(
+        "--verify",
+        type=int,
+        default=0,
+        help="用 dijkstra 核对前 N 棵树的最短距离与前驱景点，默认为 0，即不核对",
+    )
+    sssp.add_argument(
+        "--save-dir", help="把每棵树的最短距离与前驱景点保存为 <起点>.npz 的目录"
+    )
+    sssp.add_argument("--seed", type=int, default=0, help="随机数种子")
+    sssp.set_defaults(handler=command_sssp)
+
+    diff = subparsers.add_parser("diff", help="对比两份数据文件，导出增量修改")
+    diff.add_argument("base", help="基准数据文件，即其他实例当前使用的数据")
+    diff.add_argument("graph", help="修改之后的数据文件")
+    diff.add_argument(
+        "-o", "--output", default="-", help="增量修改文件路径，缺省或 - 表示写到标准输出"
+    )
+    diff.set_defaults(handler=command_diff)
+
+    apply = subparsers.add_parser("apply", help="把增量修改应用到数据文件")
+    apply.add_argument("graph", help="要修改的图数据文件")
+    apply.add_argument(
+        "changes", nargs="?", default="-", help="增量修改文件路径，缺省或 - 表示从标准输入读取"
+    )
+    apply.set_defaults(handler=command_apply)
+
+    return parser
+
+
+def main(argv: List[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    # Windows 控制台默认编码不是 UTF-8，统一按 UTF-8 读写
+    for stream in (sys.stdin, sys.stdout):
+        if hasattr(stream, "reconfigure"):
+            stream.reconfigure(encoding="utf-8")
+    try:
+        return args.handler(args)
+    except (FileNotFoundError, ScenicPathfinderError) as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -43,4 +43,61 @@ class PathDuplicateError(GraphError):
     def __init__(self, from_id: int, to_id: int):
         self.from_id = from_id
         self.to_id = to_id
-        super().__init__(f"景点 ID {from_id} 和景点 ID {to_id} 之间的路径已存在，不能重复添加")
\ No newline at end of file
+        super().__init__(f"景点 ID {from_id} 和景点 ID {to_id} 之间的路径已存在，不能重复添加")
+
+class PathInvalidError(GraphError):
+    """路径无效异常"""
+
+    def __init__(self, from_id: int, to_id: int):
+        self.from_id = from_id
+        self.to_id = to_id
+        super().__init__(f"景点 ID {from_id} 和景点 ID {to_id} 之间的路径不存在或已被删除")
+
+class TransactionClosedError(GraphError):
+    """事务已结束异常"""
+
+    def __init__(self):
+        super().__init__("事务已经提交或回滚，不能再继续修改")
+
+class TransactionConflictError(GraphError):
+    """事务冲突异常"""
+
+    def __init__(self):
+        super().__init__("事务期间图已被其他操作修改，事务已放弃")
+
+class ChangeSetConflictError(GraphError):
+    """增量修改冲突异常"""
+
+    def __init__(self, expected: str, actual: str):
+        self.expected = expected
+        self.actual = actual
+        super().__init__(
+            f"增量修改基于版本 {expected}，而当前数据的版本为 {actual}，两者不一致，未做任何修改"
+        )
+
+class ChangeSetUnavailableError(GraphError):
+    """无法生成增量修改异常"""
+
+    def __init__(self, reason: str):
+        self.reason = reason
+        super().__init__(f"无法生成增量修改: {reason}，请改为复制完整的数据文件")
+
+class ChangeSetInvalidError(GraphError):
+    """增量修改无效异常"""
+
+    def __init__(self, reason: str):
+        self.reason = reason
+        super().__init__(f"增量修改无效: {reason}")
+
+class GraphRetiredError(GraphError):
+    """图已换出异常"""
+
+    def __init__(self):
+        super().__init__("景区数据已从内存中换出，不能再读取简介或修改，请刷新页面后重试")
+
+class JobQueueFullError(ScenicPathfinderError):
+    """后台查询已满异常"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        super().__init__(f"排队和执行中的查询已达到上限 {limit} 个，请稍后再试")
@@ -1,4 +1,10 @@
-import streamlit.web.cli as cli
+from profiling import profiler
+
+# 尽早开始记录导入耗时，这样 streamlit 自身的导入也能被统计到
+profiler.install()
+
+with profiler.stage("导入 streamlit"):
+    import streamlit.web.cli as cli
 import sys
 import os
 
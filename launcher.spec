@@ -1,10 +1,13 @@
 # -*- mode: python ; coding: utf-8 -*-
 
-from PyInstaller.utils.hooks import collect_all
+from PyInstaller.utils.hooks import collect_all, collect_submodules
 
 streamlit_data, streamlit_binary, streamlit_hidden = collect_all('streamlit')
 pydantic_data, pydantic_binary, pydantic_hidden = collect_all('pydantic')
-networkx_data, networkx_binary, networkx_hidden = collect_all('networkx')
+# networkx 只在地图页面用到，不需要它的数据文件和测试用例
+networkx_hidden = collect_submodules(
+    'networkx', filter=lambda name: '.tests' not in name and '.testing' not in name
+)
 
 
 # 你的项目文件
@@ -14,16 +17,18 @@ item_datas = [
     ("./models", "models"),
     ("./context", "context"),
     ("./exceptions", "exceptions"),
+    ("./profiling", "profiling"),
     ("./resources", "resources"),
 ]
 
-all_datas = streamlit_data + pydantic_data + networkx_data + item_datas
-all_binaries = streamlit_binary + pydantic_binary + networkx_binary
+all_datas = streamlit_data + pydantic_data + item_datas
+all_binaries = streamlit_binary + pydantic_binary
 all_hidden = streamlit_hidden + pydantic_hidden + networkx_hidden + [
     'pydantic.deprecated.decorator',
     'models', 
     'context', 
-    'exceptions'
+    'exceptions',
+    'profiling',
 ]
 
 a = Analysis(
@@ -35,7 +40,7 @@ a = Analysis(
     hookspath=['./hooks'],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    excludes=['tkinter'],
     noarchive=False,
     optimize=0,
 )
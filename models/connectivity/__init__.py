@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import time
+
+from typing import TYPE_CHECKING, Dict, List
+
+if TYPE_CHECKING:
+    from models.graph import Path, TourGraph
+
+__all__ = ["ComponentIndex"]
+
+
+class ComponentIndex:
+    """
+    未删除景点的连通分量索引
+
+    用带路径减半和按大小合并的并查集维护，新增景点和道路时直接合并，判断两点是否连通接近 O(1)。
+    并查集不支持拆分，删除道路或景点后只把索引标记为过期，
+    下一次查询时用一次 O(n + m) 的遍历重建，比一次找不到终点的 dijkstra 便宜
+    """
+
+    def __init__(self, graph: TourGraph) -> None:
+        self.graph = graph
+        self._parent: List[int] = []
+        self._size: List[int] = []
+        self.dirty = True
+        # 重建次数、最近一次重建耗时以及直接判定为不可达的查询次数
+        self.rebuilds = 0
+        self.build_ms = 0.0
+        self.rejected = 0
+        self.rebuild()
+
+    def rebuild(self) -> None:
+        """
+        按当前未删除的道路从头建立并查集
+        """
+        start = time.perf_counter()
+        n = self.graph.nodes
+        parent = list(range(n))
+        size = [1] * n
+        for edge in self.graph.iter_edges():
+            _union(parent, size, edge.from_id, edge.to_id)
+        # 先建好再替换，正在查询的读者仍然使用旧的数组
+        self._parent = parent
+        self._size = size
+        self.dirty = False
+        self.rebuilds += 1
+        self.build_ms = (time.perf_counter() - start) * 1000
+
+    def node_added(self) -> None:
+        """
+        新景点是一个单独的分量
+        """
+        self._parent.append(len(self._parent))
+        self._size.append(1)
+
+    def edge_added(self, edge: Path) -> None:
+        """
+        :param edge(Path): 两端都未删除的新道路
+        """
+        if not self.dirty:
+            _union(self._parent, self._size, edge.from_id, edge.to_id)
+
+    def invalidate(self) -> None:
+        """
+        删除道路或景点后调用，下一次查询时重建
+        """
+        self.dirty = True
+
+    def connected(self, a: int, b: int) -> bool:
+        """
+        :param a(int): 景点索引
+        :param b(int): 景点索引
+        :return: 两个景点是否在同一个连通分量中
+        """
+        if self.dirty:
+            self.rebuild()
+        parent = self._parent
+        if _find(parent, a) == _find(parent, b):
+            return True
+        self.rejected += 1
+        return False
+
+    def stats(self) -> Dict[str, object]:
+        """
+        :return: 连通分量的数量与大小、重建次数以及直接判定为不可达的查询次数
+        """
+        if self.dirty:
+            self.rebuild()
+        parent = self._parent
+        sizes: Dict[int, int] = {}
+        for node_id in self.graph._live_ids:
+            root = _find(parent, node_id)
+            sizes[root] = sizes.get(root, 0) + 1
+        return {
+            "连通分量数": len(sizes),
+            "最大分量的景点数": max(sizes.values(), default=0),
+            "孤立景点数": sum(1 for size in sizes.values() if size == 1),
+            "重建次数": self.rebuilds,
+            "最近一次重建耗时 (ms)": round(self.build_ms, 2),
+            "直接判定不可达的查询": self.rejected,
+        }
+
+
+def _find(parent: List[int], x: int) -> int:
+    while parent[x] != x:
+        # 路径减半：每一步都让节点指向祖父节点
+        parent[x] = parent[parent[x]]
+        x = parent[x]
+    return x
+
+
+def _union(parent: List[int], size: List[int], a: int, b: int) -> None:
+    a = _find(parent, a)
+    b = _find(parent, b)
+    if a == b:
+        return
+    if size[a] < size[b]:
+        a, b = b, a
+    parent[b] = a
+    size[a] += size[b]
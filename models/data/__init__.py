@@ -1,10 +1,40 @@
+import json
 import os
+import threading
 
-from pydantic import BaseModel, Field
+from contextlib import contextmanager
+from pydantic import BaseModel, Field, PrivateAttr
 from datetime import datetime
-from typing import List
+from typing import Dict, Iterator, List
+from models.descriptions import DescriptionStore
 from models.graph import TourGraph
+from models.persistence import SnapshotWriter, atomic_write
+from models.sync import ChangeSet, apply_changes, export_changes
+from models.transaction import GraphTransaction
 from context import get_workdir
+from exceptions import GraphRetiredError
+from profiling import profiler
+
+
+def descriptions_path(filepath: str) -> str:
+    """
+    :param filepath(str): 图数据文件路径
+    :return: 与之配套的简介存储文件路径，例如 data/graph.json -> data/graph.descriptions
+    """
+    return os.path.splitext(filepath)[0] + ".descriptions"
+
+
+def compact_path(filepath: str) -> str:
+    """
+    :param filepath(str): 图数据文件路径
+    :return: 与之配套的紧凑快照文件路径，例如 data/graph.json -> data/graph.snapshot
+    """
+    return os.path.splitext(filepath)[0] + ".snapshot"
+
+
+def _source_stamp(filepath: str) -> List[int]:
+    stat = os.stat(filepath)
+    return [stat.st_mtime_ns, stat.st_size]
 
 
 class ApplicationData(BaseModel):
@@ -12,22 +42,232 @@ class ApplicationData(BaseModel):
     file: str = Field(
         default_factory=lambda: os.path.join(get_workdir(), "data/graph.json")
     )
+    # 后台保存的防抖时间，以及第一次修改后最多等待多久必须写入，单位为秒
+    save_debounce: float = Field(default=1.0, exclude=True)
+    save_max_delay: float = Field(default=10.0, exclude=True)
+    # 是否把景点简介放在单独的简介存储中按需读取，只做路线查询时可以关闭
+    lazy_descriptions: bool = Field(default=True, exclude=True)
+
+    _load_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _load_thread: threading.Thread | None = PrivateAttr(default=None)
+    _load_error: Exception | None = PrivateAttr(default=None)
+    _loaded: threading.Event = PrivateAttr(default_factory=threading.Event)
+    _writer: SnapshotWriter | None = PrivateAttr(default=None)
+    # 读取数据文件之后图的修订号，导出增量修改时作为基准
+    _loaded_revision: int = PrivateAttr(default=0)
 
     def save(self, filepath: str | None = None):
+        """
+        立即在当前线程中保存，写入临时文件后原子替换
+        页面中的修改应使用 schedule_save，不必等待磁盘写入
+        另存到其他路径时，景点简介也一并写到目标路径旁的简介文件中
+
+        :param filepath(str | None): 数据文件路径，默认为 self.file
+        """
         if filepath is None:
             filepath = str(self.file)
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
-        with open(filepath, "w", encoding="utf-8") as f:
-            f.write(self.graph.model_dump_json(indent=4))
+        store = self.graph._descriptions
+        if store is not None and os.path.abspath(descriptions_path(filepath)) != os.path.abspath(
+            store.filepath
+        ):
+            store.copy_to(descriptions_path(filepath))
+        atomic_write(filepath, self._serialize())
+
+    def _snapshot_writer(self) -> SnapshotWriter:
+        if self._writer is None:
+            self._writer = SnapshotWriter(
+                serialize=self._serialize,
+                filepath=lambda: str(self.file),
+                debounce=self.save_debounce,
+                max_delay=self.save_max_delay,
+            )
+        return self._writer
+
+    def _serialize(self) -> str:
+        # 简介存储追加时不刷盘，在后台写入线程中随快照一起刷到磁盘，修改景点时不必等待 fsync
+        if self.graph._descriptions is not None:
+            self.graph._descriptions.sync()
+        return self.graph.dump_json(indent=4)
+
+    def schedule_save(self) -> None:
+        """
+        登记一次保存，由后台线程在防抖时间之后写入，连续多次修改只写一次
+        已经从注册表中换出的数据不能再保存，否则会另起一个写入线程，用旧的内容覆盖重新加载的数据文件
+        """
+        if self.graph.retired:
+            raise GraphRetiredError()
+        self._snapshot_writer().request()
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """
+        立即写入所有已登记的保存并等待完成
+
+        :param timeout(float | None): 最长等待秒数，None 表示一直等待
+        :return: 是否已经全部写入
+        """
+        if self._writer is None:
+            return True
+        return self._writer.flush(timeout)
+
+    def close(self, timeout: float | None = None) -> bool:
+        """
+        写入所有已登记的保存，结束后台写入线程并关闭简介存储，用于程序退出或换出之前
+
+        :param timeout(float | None): 最长等待秒数，None 表示一直等待
+        :return: 是否已经全部写入
+        """
+        flushed = True if self._writer is None else self._writer.stop(timeout)
+        if self.graph._descriptions is not None:
+            self.graph._descriptions.close()
+        return flushed
+
+    def retire(self) -> None:
+        """
+        标记数据已经从注册表中换出，之后的修改和保存都会抛出 GraphRetiredError
+        """
+        self.graph.retire()
+
+    def save_metrics(self) -> Dict[str, object] | None:
+        """
+        :return: 后台保存的写入次数与耗时，还没有登记过保存时返回 None
+        """
+        if self._writer is None:
+            return None
+        return self._writer.metrics()
+
+    @contextmanager
+    def transaction(self) -> Iterator[GraphTransaction]:
+        """
+        在一个图事务中批量修改数据，提交成功后只登记一次保存
+        with 块中抛出异常时既不修改图也不写文件
+        """
+        with self.graph.transaction() as tx:
+            yield tx
+        self.schedule_save()
 
     def read(self, filepath: str | None = None):
         if filepath is None:
             filepath = str(self.file)
         if os.path.exists(filepath):
-            with open(filepath, "r", encoding="utf-8") as f:
-                self.graph = TourGraph.model_validate_json(f.read())
+            graph = self._read_compact(filepath)
+            if graph is None:
+                with open(filepath, "r", encoding="utf-8") as f:
+                    graph = TourGraph.model_validate_json(f.read())
         else:
-            self.graph = TourGraph(spots=[])
+            graph = TourGraph(spots=[])
+        if self.lazy_descriptions:
+            store = DescriptionStore(descriptions_path(filepath))
+            if graph.attach_descriptions(store) and os.path.exists(filepath):
+                # 旧版数据文件中的简介已经迁移到简介存储，重写一次快照去掉它们
+                atomic_write(filepath, graph.model_dump_json(indent=4))
+        # 沿用原来的图的修订号与事件订阅，订阅者会收到一次 load 事件
+        graph._take_over(self.graph)
+        self.graph = graph
+        self._loaded_revision = graph.revision
+
+    @property
+    def loaded_revision(self) -> int:
+        return self._loaded_revision
+
+    def export_changes(self) -> ChangeSet:
+        """
+        导出读取数据文件以来的所有修改，用于同步到仍在使用同一份数据文件的其他实例
+
+        :return: 增量修改集
+        """
+        return export_changes(self.graph, self._loaded_revision)
+
+    def apply_changes(self, changes: ChangeSet) -> bool:
+        """
+        应用其他实例导出的增量修改，修改了图时登记一次保存
+
+        :param changes(ChangeSet): 增量修改集
+        :return: 是否修改了图，重复应用同一个修改集时为 False
+        """
+        applied = apply_changes(self.graph, changes)
+        if applied:
+            self.schedule_save()
+        return applied
+
+    def write_compact(self) -> None:
+        """
+        在数据文件旁写一份紧凑快照，下次 read 时如果数据文件没有变化就直接加载它
+        应在所有修改都已保存之后调用，例如从内存中换出之前
+        """
+        filepath = str(self.file)
+        if not os.path.exists(filepath):
+            return
+        snapshot = {"source": _source_stamp(filepath), **self.graph.dump_compact()}
+        atomic_write(
+            compact_path(filepath),
+            json.dumps(snapshot, ensure_ascii=False, separators=(",", ":")),
+        )
+
+    def _read_compact(self, filepath: str) -> TourGraph | None:
+        """
+        :param filepath(str): 数据文件路径
+        :return: 紧凑快照存在且与数据文件一致时返回加载的图，否则返回 None
+        """
+        path = compact_path(filepath)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+            if snapshot.get("source") != _source_stamp(filepath):
+                return None  # 数据文件在快照之后被修改过
+            return TourGraph.load_compact(snapshot)
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def read_in_background(self, filepath: str | None = None) -> None:
+        """
+        在后台线程中读取数据文件，使页面的首次渲染不必等待数据加载
+        每个进程只会读取一次，重复调用直接返回
+
+        :param filepath(str | None): 数据文件路径，默认为 self.file
+        """
+        with self._load_lock:
+            if self._load_thread is not None:
+                return
+            self._loaded.clear()
+            self._load_thread = threading.Thread(
+                target=self._background_read,
+                args=(filepath,),
+                name="graph-loader",
+                daemon=True,
+            )
+        self._load_thread.start()
+
+    def _background_read(self, filepath: str | None) -> None:
+        try:
+            with profiler.stage("加载景区数据"):
+                self.read(filepath)
+        except Exception as e:
+            self._load_error = e
+        finally:
+            self._loaded.set()
+
+    @property
+    def loaded(self) -> bool:
+        """
+        数据是否已经可以使用
+        """
+        return self._load_thread is None or self._loaded.is_set()
+
+    def wait_until_loaded(self, timeout: float | None = None) -> bool:
+        """
+        等待后台加载完成，如果没有进行后台加载则立即返回
+
+        :param timeout(float | None): 最长等待秒数，None 表示一直等待
+        :return: 数据是否已经加载完成
+        """
+        if self._load_thread is None:
+            return True
+        ready = self._loaded.wait(timeout)
+        if self._load_error is not None:
+            raise self._load_error
+        return ready
 
 
 data = ApplicationData()
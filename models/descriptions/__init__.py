@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import os
+import threading
+
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+from models.persistence import atomic_write
+
+__all__ = ["DescriptionStore"]
+
+# 默认缓存的简介条数
+CACHE_SIZE = 128
+# 被覆盖的旧记录超过文件大小的一半并且超过这个字节数时自动压缩
+COMPACT_MIN_GARBAGE = 64 * 1024
+
+
+class DescriptionStore:
+    """
+    与图结构分开存放的景点简介
+
+    简介以只追加的方式写入一个单独的文件，每条记录为一行头部 "<景点索引> <字节数>" 加上简介的 UTF-8 内容，
+    同一景点的新记录覆盖旧记录。打开时只读取每条记录的头部、跳过内容来建立 景点索引 -> (偏移, 长度) 的索引，
+    读取简介时才按偏移读取，并用一个小的 LRU 缓存保存最近读取的简介
+    """
+
+    def __init__(self, filepath: str, cache_size: int = CACHE_SIZE) -> None:
+        """
+        :param filepath(str): 简介文件路径，不存在时会新建
+        :param cache_size(int): 缓存的简介条数
+        """
+        self.filepath = filepath
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._index: Dict[int, Tuple[int, int]] = {}
+        self._cache: OrderedDict[int, str] = OrderedDict()
+        # 被新记录覆盖的旧记录占用的字节数
+        self._garbage = 0
+        # 是否有已经写入但还没有刷到磁盘的记录
+        self._unsynced = False
+        self._hits = 0
+        self._misses = 0
+        os.makedirs(os.path.dirname(os.path.abspath(filepath)), exist_ok=True)
+        # 追加模式下写入总是在文件末尾，读取前按偏移 seek 即可
+        self._file = open(filepath, "a+b")
+        self._load_index()
+
+    def _load_index(self) -> None:
+        f = self._file
+        size = f.seek(0, os.SEEK_END)
+        f.seek(0)
+        self._index = {}
+        self._garbage = 0
+        while True:
+            start = f.tell()
+            header = f.readline()
+            if not header:
+                break
+            try:
+                node_id, length = (int(part) for part in header.split())
+            except ValueError:
+                node_id, length = -1, -1
+            offset = f.tell()
+            if not header.endswith(b"\n") or length < 0 or offset + length + 1 > size:
+                # 上次写入到一半就中断了，丢弃不完整的尾部
+                f.truncate(start)
+                break
+            if node_id in self._index:
+                self._garbage += self._index[node_id][1]
+            self._index[node_id] = (offset, length)
+            f.seek(offset + length + 1)
+
+    def __contains__(self, node_id: int) -> bool:
+        return node_id in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def get(self, node_id: int, default: str = "") -> str:
+        """
+        :param node_id(int): 景点索引
+        :param default(str): 没有简介时返回的值
+        :return: 景点简介
+        """
+        with self._lock:
+            text = self._cache.get(node_id)
+            if text is not None:
+                self._cache.move_to_end(node_id)
+                self._hits += 1
+                return text
+            location = self._index.get(node_id)
+            if location is None:
+                return default
+            self._misses += 1
+            offset, length = location
+            self._file.seek(offset)
+            text = self._file.read(length).decode("utf-8")
+            self._remember(node_id, text)
+            return text
+
+    def read_all(self) -> Dict[int, str]:
+        """
+        顺序读取整个文件得到所有简介，用于需要遍历全部简介的场合，不经过也不挤占缓存
+
+        :return: 景点索引 -> 简介
+        """
+        with self._lock:
+            self._file.seek(0)
+            data = self._file.read()
+            return {
+                node_id: data[offset : offset + length].decode("utf-8")
+                for node_id, (offset, length) in self._index.items()
+            }
+
+    def _remember(self, node_id: int, text: str) -> None:
+        self._cache[node_id] = text
+        self._cache.move_to_end(node_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def put_many(self, descriptions: Dict[int, str]) -> None:
+        """
+        写入一批简介，只追加一次；为了不让每次修改都等待磁盘，这里不调用 fsync，
+        由 sync 统一刷到磁盘（后台保存快照时和关闭时）
+
+        :param descriptions(Dict[int, str]): 景点索引 -> 简介
+        """
+        if not descriptions:
+            return
+        with self._lock:
+            f = self._file
+            offset = f.seek(0, os.SEEK_END)
+            chunks = []
+            locations = {}
+            for node_id, text in descriptions.items():
+                payload = text.encode("utf-8")
+                header = f"{node_id} {len(payload)}\n".encode("ascii")
+                chunks.append(header + payload + b"\n")
+                locations[node_id] = (offset + len(header), len(payload))
+                offset += len(header) + len(payload) + 1
+            f.write(b"".join(chunks))
+            f.flush()
+            self._unsynced = True
+            for node_id, location in locations.items():
+                old = self._index.get(node_id)
+                if old is not None:
+                    self._garbage += old[1]
+                self._index[node_id] = location
+                if node_id in self._cache:
+                    self._remember(node_id, descriptions[node_id])
+            compact = self._garbage > max(COMPACT_MIN_GARBAGE, offset // 2)
+        if compact:
+            self.compact()
+
+    def put(self, node_id: int, text: str) -> None:
+        """
+        :param node_id(int): 景点索引
+        :param text(str): 简介
+        """
+        self.put_many({node_id: text})
+
+    def _compacted(self) -> bytes:
+        # 每个景点只保留最新的一条记录，调用方持有 _lock
+        f = self._file
+        chunks = []
+        for node_id, (offset, length) in sorted(self._index.items()):
+            f.seek(offset)
+            payload = f.read(length)
+            chunks.append(f"{node_id} {length}\n".encode("ascii") + payload + b"\n")
+        return b"".join(chunks)
+
+    def compact(self) -> None:
+        """
+        只保留每个景点最新的一条记录，重写后原子替换简介文件
+        """
+        with self._lock:
+            content = self._compacted()
+            self._file.close()
+            atomic_write(self.filepath, content)
+            self._unsynced = False
+            self._file = open(self.filepath, "a+b")
+            self._load_index()
+
+    def copy_to(self, filepath: str) -> None:
+        """
+        把所有简介压缩后写到另一个简介文件，例如把数据另存到其他位置时
+
+        :param filepath(str): 目标简介文件路径，已经存在时被原子替换
+        """
+        with self._lock:
+            content = self._compacted()
+        atomic_write(filepath, content)
+
+    def clear(self) -> None:
+        """
+        删除所有简介
+        """
+        with self._lock:
+            self._file.truncate(0)
+            self._unsynced = True
+            self._index.clear()
+            self._cache.clear()
+            self._garbage = 0
+
+    def sync(self) -> None:
+        """
+        把已经写入的简介刷到磁盘，没有新的写入时直接返回
+        """
+        with self._lock:
+            if self._unsynced and not self._file.closed:
+                os.fsync(self._file.fileno())
+                self._unsynced = False
+
+    def close(self) -> None:
+        self.sync()
+        with self._lock:
+            self._file.close()
+
+    def stats(self) -> Dict[str, object]:
+        """
+        :return: 记录数、文件大小以及缓存命中情况
+        """
+        with self._lock:
+            size = self._file.seek(0, os.SEEK_END)
+            return {
+                "简介条数": len(self._index),
+                "文件大小 (字节)": size,
+                "可回收字节数": self._garbage,
+                "缓存条数": len(self._cache),
+                "缓存命中": self._hits,
+                "缓存未命中": self._misses,
+            }
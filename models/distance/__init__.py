@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+from array import array
+from typing import TYPE_CHECKING, List, Literal
+
+if TYPE_CHECKING:
+    from models.graph import TourGraph
+
+__all__ = ["DistanceMatrix"]
+
+INF = float("inf")
+
+
+class DistanceMatrix:
+    """
+    动态维护的全源最短距离矩阵
+
+    第 i 行第 j 列为景点 i 到景点 j 的最短距离，不可达或已删除为 inf
+    每次只修改一条道路时只修复受影响的行和列，而不是全部重新计算：
+    - 道路变短或新增道路时，用经过这条道路的路径做一次 O(n²) 的松弛
+    - 道路变长或删除道路时，只对最短路径树用到了这条道路的源点重新求单源最短路径
+    """
+
+    def __init__(
+        self, graph: TourGraph, weight_type: Literal["distance", "duration"]
+    ) -> None:
+        self.graph = graph
+        self.weight_type = weight_type
+        self._rows: List[array] = []
+        # 最近一次修复中重新计算的源点数量，便于观察修复的开销
+        self.last_recomputed_sources = 0
+        self.rebuild()
+
+    def _weight(self, path) -> int:
+        return path.distance if self.weight_type == "distance" else path.duration
+
+    def _compute_row(self, source: int) -> array:
+        row = array("d", [INF]) * self.graph.nodes
+        if self.graph._is_valid_node(source):
+            weights, _ = self.graph.shortest_path_tree(source, self.weight_type)
+            for node_id, weight in weights.items():
+                row[node_id] = weight
+        return row
+
+    def _recompute_source(self, source: int) -> None:
+        """
+        重新计算一个源点所在的行，并同步更新对称的列
+        """
+        row = self._compute_row(source)
+        self._rows[source] = row
+        for node_id, weight in enumerate(row):
+            self._rows[node_id][source] = weight
+
+    def rebuild(self) -> None:
+        """
+        从头计算整个矩阵
+        """
+        self._rows = [self._compute_row(i) for i in range(self.graph.nodes)]
+        self.last_recomputed_sources = self.graph.live_nodes
+
+    def distance(self, from_id: int, to_id: int) -> int:
+        """
+        :param from_id(int): 起始景点索引
+        :param to_id(int): 目标景点索引
+        :return: 最短距离，不可达时返回 -1，与 dijkstra 的约定一致
+        """
+        weight = self._rows[from_id][to_id]
+        return -1 if weight == INF else int(weight)
+
+    def path(self, from_id: int, to_id: int) -> List[int]:
+        """
+        根据矩阵从终点往回找前驱来还原一条最短路径
+
+        :param from_id(int): 起始景点索引
+        :param to_id(int): 目标景点索引
+        :return: 路径经过的景点索引列表，不可达时返回空列表
+        """
+        row = self._rows[from_id]
+        if row[to_id] == INF:
+            return []
+        sequence = [to_id]
+        current = to_id
+        while current != from_id:
+            for neighbor, path in self.graph.neighbors(current):
+                if row[neighbor] + self._weight(path) == row[current]:
+                    current = neighbor
+                    break
+            else:
+                # 矩阵与图不一致，说明有修改绕过了 TourGraph 的方法
+                raise RuntimeError("距离矩阵与图不一致，请调用 rebuild 重新计算")
+            sequence.append(current)
+        return sequence[::-1]
+
+    def node_added(self) -> None:
+        """
+        新增景点时为它加上一行一列
+        """
+        for row in self._rows:
+            row.append(INF)
+        row = array("d", [INF]) * (len(self._rows) + 1)
+        row[len(self._rows)] = 0
+        self._rows.append(row)
+
+    def edge_decreased(self, u: int, v: int, weight: int) -> None:
+        """
+        道路 (u, v) 新增或变短后修复矩阵
+
+        新的最短路径最多经过这条道路一次，因此 d[i][j] = min(d[i][j], d[i][u] + w + d[v][j], d[i][v] + w + d[u][j])
+        只有经过这条道路能到达得更近的行才需要逐列松弛
+
+        :param u(int): 道路一端的景点索引
+        :param v(int): 道路另一端的景点索引
+        :param weight(int): 道路的新权重
+        """
+        rows = self._rows
+        # 松弛过程中第 u、v 行本身也会变化，先拷贝一份旧值
+        du = array("d", rows[u])
+        dv = array("d", rows[v])
+        n = len(rows)
+        for i in range(n):
+            row = rows[i]
+            via_u = row[u] + weight  # i -> u -> v
+            via_v = row[v] + weight  # i -> v -> u
+            if via_u < row[v]:
+                for j in range(n):
+                    candidate = via_u + dv[j]
+                    if candidate < row[j]:
+                        row[j] = candidate
+            elif via_v < row[u]:
+                for j in range(n):
+                    candidate = via_v + du[j]
+                    if candidate < row[j]:
+                        row[j] = candidate
+        self.last_recomputed_sources = 0
+
+    def edge_increased(self, u: int, v: int, old_weight: int) -> None:
+        """
+        道路 (u, v) 变长或被删除后修复矩阵
+
+        只有当这条道路在某个源点的最短路径树上（两端距离之差恰好等于旧权重）时，
+        这个源点的最短距离才可能变化，只重新计算这些源点
+
+        :param u(int): 道路一端的景点索引
+        :param v(int): 道路另一端的景点索引
+        :param old_weight(int): 道路修改前的权重
+        """
+        affected = []
+        for source, row in enumerate(self._rows):
+            du, dv = row[u], row[v]
+            if du == INF:
+                continue
+            if du + old_weight == dv or dv + old_weight == du:
+                affected.append(source)
+        for source in affected:
+            self._recompute_source(source)
+        self.last_recomputed_sources = len(affected)
+
+    def node_deleted(self, node_id: int) -> None:
+        """
+        删除景点后修复矩阵，只重新计算最短路径经过该景点的源点
+
+        :param node_id(int): 被删除的景点索引
+        """
+        rows = self._rows
+        # 以 node_id 为中转且仍然是最短路径的源点：存在一条从它出发的道路在最短路径树上
+        incident = [
+            (neighbor, self._weight(path))
+            for neighbor, path in self.graph.neighbors(node_id)
+        ]
+        affected = []
+        for source, row in enumerate(rows):
+            if source == node_id:
+                continue
+            through = row[node_id]
+            if through == INF:
+                continue
+            if any(through + weight == row[neighbor] for neighbor, weight in incident):
+                affected.append(source)
+
+        rows[node_id] = array("d", [INF]) * len(rows)
+        for row in rows:
+            row[node_id] = INF
+        for source in affected:
+            self._recompute_source(source)
+        self.last_recomputed_sources = len(affected)
@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import multiprocessing
+import os
+import queue
+
+from typing import TYPE_CHECKING, Iterator, List, Tuple
+
+from exceptions import SpotIdInvalidError
+
+if TYPE_CHECKING:
+    from models.graph import TourGraph
+
+__all__ = ["iter_all_paths_parallel"]
+
+# 每个工作进程平均分到的子问题数，子问题越多负载越均衡，但调度开销也越大
+TASKS_PER_WORKER = 16
+# 前缀最多展开的层数，防止在度数很大的图上前缀数量爆炸
+MAX_SPLIT_DEPTH = 6
+
+PathResult = Tuple[int, int, List[int]]
+Prefix = Tuple[List[int], int, int]
+
+
+def split_prefixes(
+    graph: TourGraph,
+    start_id: int,
+    target_id: int,
+    max_depth: int | None,
+    min_tasks: int,
+) -> Tuple[List[Prefix], List[PathResult]]:
+    """
+    从起点开始逐层展开路径前缀，把搜索树切分成互不重叠的子问题
+
+    展开过程中直接到达终点的路径不再属于任何子问题，单独返回
+
+    :param graph(TourGraph): 图
+    :param start_id(int): 起始景点索引
+    :param target_id(int): 目标景点索引
+    :param max_depth(int | None): 路径最多包含的道路条数，None 表示不限制
+    :param min_tasks(int): 至少切分出的子问题数量
+    :return: 子问题列表 (前缀, 前缀总距离, 前缀总时间)，以及展开时找到的完整路径
+    """
+    frontier: List[Prefix] = [([start_id], 0, 0)]
+    found: List[PathResult] = []
+    level = 0
+
+    while frontier and len(frontier) < min_tasks and level < MAX_SPLIT_DEPTH:
+        depth = level + 1  # 展开后前缀包含的道路条数
+        if max_depth is not None and depth >= max_depth:
+            break  # 再展开就轮到直接找终点了，交给子问题处理
+        next_frontier: List[Prefix] = []
+        for path, distance, duration in frontier:
+            visited = set(path)
+            for neighbor, p in graph.neighbors(path[-1]):
+                if neighbor in visited:
+                    continue
+                new_distance = distance + p.distance
+                new_duration = duration + p.duration
+                if neighbor == target_id:
+                    found.append((new_distance, new_duration, path + [neighbor]))
+                else:
+                    next_frontier.append((path + [neighbor], new_distance, new_duration))
+        frontier = next_frontier
+        level += 1
+
+    return frontier, found
+
+
+def _worker(
+    graph_json: str,
+    target_id: int,
+    max_depth: int | None,
+    batch_size: int,
+    tasks,
+    results,
+    stop,
+) -> None:
+    """
+    工作进程：从任务队列里不断领取前缀，把找到的路径分批放进结果队列
+    先做完的进程会继续领取剩下的前缀，以此实现动态的负载均衡
+    """
+    from models.graph import TourGraph
+
+    try:
+        graph = TourGraph.model_validate_json(graph_json)
+        while not stop.is_set():
+            task = tasks.get()
+            if task is None:
+                break
+            prefix, distance, duration = task
+            batch = []
+            for result in graph._extend_paths(
+                prefix, distance, duration, target_id, max_depth
+            ):
+                batch.append(result)
+                if len(batch) >= batch_size:
+                    results.put(("paths", batch))
+                    batch = []
+                    if stop.is_set():
+                        return
+            if batch:
+                results.put(("paths", batch))
+            results.put(("done", None))
+    except Exception as e:
+        results.put(("error", f"{type(e).__name__}: {e}"))
+
+
+def iter_all_paths_parallel(
+    graph: TourGraph,
+    start_id: int,
+    target_id: int,
+    max_depth: int | None = None,
+    workers: int | None = None,
+    batch_size: int = 256,
+) -> Iterator[PathResult]:
+    """
+    用多个进程并行枚举从起点到终点的所有简单路径
+
+    搜索树按路径前缀切分成若干子问题放进共享的任务队列，各进程做完一个就领下一个，
+    找到的路径分批流式返回。产出的路径集合与 TourGraph.iter_all_paths 相同，但顺序不固定。
+    提前停止迭代（例如只取前若干条）时会通知并结束所有工作进程
+
+    :param graph(TourGraph): 图
+    :param start_id(int): 起始景点索引
+    :param target_id(int): 目标景点索引
+    :param max_depth(int | None): 路径最多包含的道路条数，None 表示不限制
+    :param workers(int | None): 工作进程数，None 表示使用全部 CPU 核心
+    :param batch_size(int): 每批返回的路径条数
+    :return: 逐条产出 (总距离, 总时间, 路径经过的景点索引列表)
+    """
+    if not graph._is_valid_node(start_id):
+        raise SpotIdInvalidError(start_id)
+    if not graph._is_valid_node(target_id):
+        raise SpotIdInvalidError(target_id)
+    if start_id == target_id:
+        yield 0, 0, [start_id]
+        return
+    if not graph.connected(start_id, target_id):
+        return  # 不连通时不需要启动工作进程
+
+    workers = workers or os.cpu_count() or 1
+    prefixes, found = split_prefixes(
+        graph, start_id, target_id, max_depth, workers * TASKS_PER_WORKER
+    )
+    yield from found
+    if not prefixes:
+        return
+
+    context = multiprocessing.get_context()
+    tasks = context.Queue()
+    # 结果队列有上限，消费者处理不过来时工作进程会等待，内存不会无限增长
+    results = context.Queue(maxsize=workers * 4)
+    stop = context.Event()
+    for prefix in prefixes:
+        tasks.put(prefix)
+    for _ in range(workers):
+        tasks.put(None)
+
+    graph_json = graph.dump_json()
+    processes = [
+        context.Process(
+            target=_worker,
+            args=(graph_json, target_id, max_depth, batch_size, tasks, results, stop),
+            daemon=True,
+        )
+        for _ in range(min(workers, len(prefixes)))
+    ]
+    for process in processes:
+        process.start()
+
+    remaining = len(prefixes)
+    finished = False
+    try:
+        while remaining:
+            try:
+                kind, payload = results.get(timeout=1)
+            except queue.Empty:
+                if not any(process.is_alive() for process in processes):
+                    raise RuntimeError("路径枚举的工作进程意外退出")
+                continue
+            if kind == "paths":
+                yield from payload
+            elif kind == "done":
+                remaining -= 1
+            else:
+                raise RuntimeError(f"路径枚举的工作进程出错: {payload}")
+        finished = True
+    finally:
+        stop.set()
+        for process in processes:
+            if finished:
+                process.join()
+            else:
+                # 提前结束时工作进程可能正阻塞在结果队列上，直接结束它们
+                process.terminate()
+                process.join()
+        tasks.cancel_join_thread()
+        results.cancel_join_thread()
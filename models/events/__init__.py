@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+import threading
+import traceback
+
+from collections import deque
+from typing import Callable, Deque, Dict, List, Literal, Tuple, Type
+
+from pydantic import BaseModel, ConfigDict, Field
+
+__all__ = [
+    "GraphEvent",
+    "SpotAdded",
+    "SpotModified",
+    "SpotDeleted",
+    "PathAdded",
+    "PathModified",
+    "PathDeleted",
+    "GraphReset",
+    "TOPOLOGY_EVENTS",
+    "ROUTING_EVENTS",
+    "EventFeed",
+]
+
+# 保留的最近事件条数，更早的修改只能通过重新计算得到
+EVENT_HISTORY = 1000
+
+
+class GraphEvent(BaseModel):
+    """
+    图的一次修改，同一次提交（例如一个事务）产生的事件具有相同的修订号
+
+    :param revision(int): 修改之后图的修订号
+    """
+
+    model_config = ConfigDict(frozen=True)
+
+    revision: int = Field(..., description="修改之后图的修订号")
+
+
+class SpotAdded(GraphEvent):
+    """
+    :param spot_id(int): 新景点的索引
+    :param name(str): 景点名称
+    :param description(str): 景点简介
+    :param position(Tuple[float, float] | None): 景点坐标
+    """
+
+    spot_id: int
+    name: str
+    description: str = ""
+    position: Tuple[float, float] | None = None
+
+
+class SpotModified(GraphEvent):
+    """
+    名称、简介或坐标没有变化时对应的新旧值均为 None，第一次设置坐标时只有新坐标
+
+    :param spot_id(int): 景点索引
+    :param old_name(str | None): 原来的名称
+    :param new_name(str | None): 新的名称
+    :param old_description(str | None): 原来的简介
+    :param new_description(str | None): 新的简介
+    :param old_position(Tuple[float, float] | None): 原来的坐标
+    :param new_position(Tuple[float, float] | None): 新的坐标
+    """
+
+    spot_id: int
+    old_name: str | None = None
+    new_name: str | None = None
+    old_description: str | None = None
+    new_description: str | None = None
+    old_position: Tuple[float, float] | None = None
+    new_position: Tuple[float, float] | None = None
+
+
+class SpotDeleted(GraphEvent):
+    """
+    :param spot_id(int): 景点索引
+    :param name(str): 景点名称
+    """
+
+    spot_id: int
+    name: str
+
+
+class PathAdded(GraphEvent):
+    """
+    :param path_id(int): 新道路的索引
+    :param from_id(int): 一端景点的索引
+    :param to_id(int): 另一端景点的索引
+    :param distance(int): 路径长度
+    :param duration(int): 所需时间
+    :param restored(bool): 是否沿用已有的道路索引，即恢复已删除的道路或者改接了两端景点（见 GraphTransaction.put_path）
+    """
+
+    path_id: int
+    from_id: int
+    to_id: int
+    distance: int
+    duration: int
+    restored: bool = False
+
+
+class PathModified(GraphEvent):
+    """
+    :param path_id(int): 道路索引
+    :param from_id(int): 一端景点的索引
+    :param to_id(int): 另一端景点的索引
+    :param old_distance(int): 原来的路径长度
+    :param new_distance(int): 新的路径长度
+    :param old_duration(int): 原来的所需时间
+    :param new_duration(int): 新的所需时间
+    """
+
+    path_id: int
+    from_id: int
+    to_id: int
+    old_distance: int
+    new_distance: int
+    old_duration: int
+    new_duration: int
+
+
+class PathDeleted(GraphEvent):
+    """
+    :param path_id(int): 道路索引
+    :param from_id(int): 一端景点的索引
+    :param to_id(int): 另一端景点的索引
+    :param distance(int): 删除前的路径长度
+    :param duration(int): 删除前的所需时间
+    """
+
+    path_id: int
+    from_id: int
+    to_id: int
+    distance: int
+    duration: int
+
+
+class GraphReset(GraphEvent):
+    """
+    图被整体替换，没有逐项的变化，订阅者应丢弃所有派生数据
+
+    :param reason(str): 原因，load 为重新加载数据文件，clear 为清空，bulk_add 为批量导入
+    :param nodes(int): 替换后的景点数量，包括已删除的景点
+    :param paths(int): 替换后未删除的道路数量
+    """
+
+    reason: Literal["load", "clear", "bulk_add"]
+    nodes: int
+    paths: int
+
+
+# 会改变地图上景点和道路的事件，只修改名称、简介或权重时布局不需要重新计算
+TOPOLOGY_EVENTS: Tuple[Type[GraphEvent], ...] = (
+    SpotAdded,
+    SpotDeleted,
+    PathAdded,
+    PathDeleted,
+    GraphReset,
+)
+# 可能改变最短距离的事件，新增的孤立景点和修改景点信息不会影响已有的最短路径
+ROUTING_EVENTS: Tuple[Type[GraphEvent], ...] = (
+    SpotDeleted,
+    PathAdded,
+    PathModified,
+    PathDeleted,
+    GraphReset,
+)
+
+
+class EventFeed:
+    """
+    图修改事件的发布与订阅
+
+    事件在修改图的线程中同步发送给订阅者，订阅者抛出的异常只会被打印，不影响图的修改和其他订阅者。
+    同时保留最近 history 条事件，不方便订阅的使用者（例如每次重跑的页面）可以记下修订号，
+    之后通过 since 查询这段时间内发生了哪些修改
+    """
+
+    def __init__(self, revision: int = 0, history: int = EVENT_HISTORY) -> None:
+        """
+        :param revision(int): 开始记录时图的修订号
+        :param history(int): 保留的最近事件条数
+        """
+        self._lock = threading.Lock()
+        # 订阅编号 -> (回调, 接收的事件类型)
+        self._subscribers: Dict[
+            int,
+            Tuple[Callable[[GraphEvent], None], Tuple[Type[GraphEvent], ...] | None],
+        ] = {}
+        self._next_token = 0
+        self._history: Deque[GraphEvent] = deque(maxlen=history)
+        # 修订号大于它的事件都还保留在 _history 中
+        self._covered_from = revision
+        self.published = 0
+
+    def subscribe(
+        self,
+        callback: Callable[[GraphEvent], None],
+        kinds: Tuple[Type[GraphEvent], ...] | None = None,
+    ) -> Callable[[], None]:
+        """
+        :param callback(Callable[[GraphEvent], None]): 每个事件调用一次
+        :param kinds(Tuple[Type[GraphEvent], ...] | None): 只接收这些类型的事件，None 表示全部
+        :return: 取消订阅的函数
+        """
+        with self._lock:
+            token = self._next_token
+            self._next_token += 1
+            self._subscribers[token] = (callback, kinds)
+
+        def unsubscribe() -> None:
+            with self._lock:
+                self._subscribers.pop(token, None)
+
+        return unsubscribe
+
+    def record(self, events: List[GraphEvent]) -> None:
+        """
+        把事件加入历史记录，应在图的修订号更新之前调用，
+        这样读到新修订号的使用者一定能通过 since 查到对应的事件
+
+        :param events(List[GraphEvent]): 同一次提交产生的事件
+        """
+        with self._lock:
+            for event in events:
+                if len(self._history) == self._history.maxlen:
+                    self._covered_from = self._history[0].revision
+                self._history.append(event)
+            self.published += len(events)
+
+    def notify(self, events: List[GraphEvent]) -> None:
+        """
+        把已经记录的事件发送给订阅者，应在图的修订号更新之后调用
+
+        :param events(List[GraphEvent]): 同一次提交产生的事件
+        """
+        with self._lock:
+            subscribers = list(self._subscribers.values())
+        for callback, kinds in subscribers:
+            for event in events:
+                if kinds is not None and not isinstance(event, kinds):
+                    continue
+                try:
+                    callback(event)
+                except Exception:
+                    traceback.print_exc()
+
+    def since(self, revision: int) -> List[GraphEvent] | None:
+        """
+        :param revision(int): 之前记下的修订号
+        :return: 这个修订号之后的所有事件，较早的事件已经不在保留范围内时返回 None
+        """
+        with self._lock:
+            if revision < self._covered_from:
+                return None
+            return [event for event in self._history if event.revision > revision]
+
+    def stats(self) -> Dict[str, object]:
+        """
+        :return: 订阅者数量、已发布的事件数以及保留的修订号范围
+        """
+        with self._lock:
+            return {
+                "订阅者": len(self._subscribers),
+                "已发布事件": self.published,
+                "保留事件": len(self._history),
+                "可查询的最早修订号": self._covered_from,
+            }
@@ -1,31 +1,114 @@
 from __future__ import annotations
 
 import heapq
+import math
+import threading
+import time
+
+from bisect import bisect_left
+from contextlib import closing
+from functools import wraps
+from itertools import count, islice
+
+from pydantic import BaseModel, Field, PrivateAttr, constr, model_validator
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Literal,
+    Tuple,
+    Type,
+)
 
-from pydantic import BaseModel, Field, constr
-from typing import Dict, List, Optional, Literal, Tuple
-
+from models.connectivity import ComponentIndex
+from models.descriptions import DescriptionStore
+from models.distance import DistanceMatrix
+from models.enumeration import iter_all_paths_parallel
+from models.events import (
+    ROUTING_EVENTS,
+    EventFeed,
+    GraphEvent,
+    GraphReset,
+    PathAdded,
+    PathDeleted,
+    PathModified,
+    SpotAdded,
+    SpotDeleted,
+    SpotModified,
+)
+from models.overlay import Overlay, Partition
+from models.pqueue import QUEUES, choose_queue
+from models.pathcache import path_trees
+from models.search import SearchIndex
+from models.spatial import SpatialIndex
+from models.tour import TourOptimizer, greedy_tour
 from exceptions import (
     SpotIdInvalidError,
     StandardInvalidError,
     SpotNameInvalidError,
     SpotNameDuplicateError,
-    PathDuplicateError
+    PathDuplicateError,
+    PathInvalidError,
+    GraphRetiredError,
 )
 
+if TYPE_CHECKING:
+    from models.transaction import GraphTransaction
+
+# 进程内每个图对象的编号，用作最短路径树缓存的键
+_graph_ids = count()
+# 枚举所有路径时每扩展这么多个景点调用一次 should_stop，检查是否需要停止并报告进度
+STOP_CHECK_INTERVAL = 1024
+
+# 长时间查询的停止检查函数，参数是当前的进度，返回 True 表示应当停止
+StopCheck = Callable[[Dict[str, object]], bool]
+
+
+def _mutation(method: Callable) -> Callable:
+    """
+    修改图的方法：整个修改都在图的写锁中进行，后台保存线程序列化快照时持有同一把锁，
+    因此快照总是某一次修改完成之后的完整状态；已经换出的图不能再修改
+    """
+
+    @wraps(method)
+    def wrapper(self: TourGraph, *args, **kwargs):
+        with self._write_lock:
+            self._check_resident()
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
 
 class Path(BaseModel):
     """
-    表示从当前节点到另一个节点的道路的信息
+    表示两个景点之间的一条无向道路，每条道路只存储一份
 
-    :param target(int): 目标景点的索引
+    :param id(int): 道路的索引，删除其他道路不会改变它
+    :param from_id(int): 一端景点的索引
+    :param to_id(int): 另一端景点的索引
     :param distance(int): 路径长度
     :param duration(int): 所需时间
+    :param deleted(bool): 道路是否已删除
     """
 
-    target_id: int = Field(..., description="目标景点的索引")
+    id: int = Field(..., description="道路的整数索引")
+    from_id: int = Field(..., description="一端景点的索引")
+    to_id: int = Field(..., description="另一端景点的索引")
     distance: int = Field(..., description="路径长度")
     duration: int = Field(..., description="所需时间")
+    deleted: bool = Field(default=False, description="道路是否已删除")
+
+    def other(self, node_id: int) -> int:
+        """
+        :param node_id(int): 道路一端的景点索引
+        :return: 道路另一端的景点索引
+        """
+        return self.to_id if self.from_id == node_id else self.from_id
 
 
 class Spot(BaseModel):
@@ -34,16 +117,27 @@ class Spot(BaseModel):
 
     :param id(int): 当前景点的索引
     :param name(str): 景点名称
-    :param description(str): 景点简介
+    :param description(str): 景点简介，图关联了简介存储时为空，应通过 TourGraph.description 读取
     :param deleted(bool): 景点是否已删除
-    :param paths(List[Path]): 从当前景点出发的路径列表
+    :param x(float | None): 景区平面坐标系中的横坐标，单位与道路距离相同（米），可选
+    :param y(float | None): 景区平面坐标系中的纵坐标，可选
     """
 
     id: int = Field(..., description="景点的整数索引")
     name: str = Field(..., description="景点名称")
-    description: str = Field(..., description="景点简介")
-    paths: List[Path] = Field(default=[], description="从当前景点出发的路径列表")
+    description: str = Field(default="", description="景点简介")
     deleted: bool = Field(default=False, description="景点是否已删除")
+    x: float | None = Field(default=None, description="横坐标")
+    y: float | None = Field(default=None, description="纵坐标")
+
+    @property
+    def position(self) -> Tuple[float, float] | None:
+        """
+        :return: 景点的坐标，没有设置时返回 None
+        """
+        if self.x is None or self.y is None:
+            return None
+        return self.x, self.y
 
 
 class TourGraph(BaseModel):
@@ -51,19 +145,382 @@ class TourGraph(BaseModel):
     导览系统封装
 
     :param spots(List[Spot]): 景点节点列表
+    :param edges(List[Path]): 道路列表，道路的索引即为它在列表中的位置
     """
 
     spots: List[Spot] = []
+    edges: List[Path] = []
+
+    # 以下为派生索引，不参与序列化，加载或修改图时同步维护
+    # 未删除景点的名称 -> 景点索引
+    _name_index: Dict[str, int] = PrivateAttr(default_factory=dict)
+    # 按索引升序排列的未删除景点
+    _live_ids: List[int] = PrivateAttr(default_factory=list)
+    # 未删除的道路，键为 (较小的景点索引, 较大的景点索引)，值为道路索引，按添加顺序排列
+    _edge_index: Dict[Tuple[int, int], int] = PrivateAttr(default_factory=dict)
+    # 每个景点关联的未删除道路，与 edges 中的是同一个对象
+    _incidence: List[List[Path]] = PrivateAttr(default_factory=list)
+    # 按权重类型动态维护的全源最短距离矩阵，只有调用过 distance_matrix 才会建立
+    _distance_matrices: Dict[str, DistanceMatrix] = PrivateAttr(default_factory=dict)
+    # 与图结构分开存放的景点简介，关联之后 Spot.description 不再保存简介内容
+    _descriptions: DescriptionStore | None = PrivateAttr(default=None)
+    # 景点名称与简介的全文搜索索引，只有调用过 search 才会建立
+    _search_index: SearchIndex | None = PrivateAttr(default=None)
+    # 与权重无关的多层分区，以及按权重类型定制的覆盖图，只有调用过 overlay 才会建立
+    _partition: Partition | None = PrivateAttr(default=None)
+    _overlays: Dict[str, Overlay] = PrivateAttr(default_factory=dict)
+    # 连通分量索引，只有判断过两点是否连通才会建立
+    _components: ComponentIndex | None = PrivateAttr(default=None)
+    # 景点坐标的网格索引与 A* 的下界，只有按位置查询或求最短路径时才会建立
+    _spatial: SpatialIndex | None = PrivateAttr(default=None)
+    # 权重类型 -> 道路权重的上限，用于选择最短路径搜索的优先队列，删除道路后不缩小
+    _max_weights: Dict[str, int] = PrivateAttr(default_factory=dict)
+    # 图的编号与修订号，每次修改都会递增修订号，用来判断缓存的最短路径树是否过期
+    _uid: int = PrivateAttr(default_factory=lambda: next(_graph_ids))
+    _revision: int = PrivateAttr(default=0)
+    # 修改事件的订阅与最近的历史记录
+    _events: EventFeed = PrivateAttr(default_factory=EventFeed)
+    # 所在的景区已经从注册表中换出，之后不能再修改，简介存储也已经关闭
+    _retired: bool = PrivateAttr(default=False)
+    # 写锁，修改图与序列化快照时持有，可重入以便事务提交时调用 _replace
+    _write_lock: threading.RLock = PrivateAttr(default_factory=threading.RLock)
+
+    @model_validator(mode="before")
+    @classmethod
+    def _convert_legacy_paths(cls, data: Any) -> Any:
+        """
+        兼容旧版数据文件：旧版把每条道路在两端景点的 paths 中各存一份，
+        这里把它们合并为 edges 中的一条记录
+        """
+        if not isinstance(data, dict) or "edges" in data:
+            return data
+        spots = data.get("spots") or []
+        if not any(isinstance(spot, dict) and spot.get("paths") for spot in spots):
+            return data
+
+        edges = []
+        seen = set()
+        for spot in spots:
+            for path in spot.get("paths") or []:
+                key = _edge_key(spot["id"], path["target_id"])
+                if key in seen:
+                    continue
+                seen.add(key)
+                edges.append(
+                    {
+                        "id": len(edges),
+                        "from_id": spot["id"],
+                        "to_id": path["target_id"],
+                        "distance": path["distance"],
+                        "duration": path["duration"],
+                    }
+                )
+        return {**data, "edges": edges}
+
+    def model_post_init(self, __context) -> None:
+        self._rebuild_indexes()
+
+    def _rebuild_indexes(self) -> None:
+        """
+        根据 spots 和 edges 重新构建所有派生索引
+        新索引先在局部变量中构建好再一并替换，构建过程中读者看到的仍是旧索引
+        """
+        name_index: Dict[str, int] = {}
+        live_ids: List[int] = []
+        edge_index: Dict[Tuple[int, int], int] = {}
+        incidence: List[List[Path]] = [[] for _ in self.spots]
+        for spot in self.spots:
+            if not spot.deleted:
+                name_index.setdefault(spot.name, spot.id)
+                live_ids.append(spot.id)
+        for edge in self.edges:
+            if edge.deleted:
+                continue
+            edge_index[_edge_key(edge.from_id, edge.to_id)] = edge.id
+            incidence[edge.from_id].append(edge)
+            incidence[edge.to_id].append(edge)
+        self._name_index = name_index
+        self._live_ids = live_ids
+        self._edge_index = edge_index
+        self._incidence = incidence
+        self._distance_matrices = {}
+        self._search_index = None
+        self._partition = None
+        self._overlays = {}
+        self._components = None
+        self._spatial = None
+        self._max_weights = {}
+
+    def _publish(self, changes: List[Tuple[Type[GraphEvent], Dict[str, Any]]]) -> None:
+        """
+        递增修订号，并把这次修改作为一组具有新修订号的事件发布
+
+        :param changes(List[Tuple[Type[GraphEvent], Dict[str, Any]]]): (事件类型, 除修订号以外的字段)
+        """
+        revision = self._revision + 1
+        events = [kind(revision=revision, **fields) for kind, fields in changes]
+        self._events.record(events)
+        self._revision = revision
+        self._events.notify(events)
+
+    def _reset(self, reason: str) -> None:
+        """
+        :param reason(str): 整体替换的原因，见 GraphReset
+        """
+        self._publish(
+            [(GraphReset, {"reason": reason, "nodes": self.nodes, "paths": self.paths})]
+        )
+
+    def _take_over(self, previous: TourGraph) -> None:
+        """
+        重新加载数据文件时接替原来的图：沿用它的修订号与事件订阅，并发布一次 load 事件
+        原来的图不再使用，标记为换出并关闭它的简介存储，同一个简介文件不会同时被两个存储打开
+
+        :param previous(TourGraph): 原来的图
+        """
+        previous.retire()
+        store = previous._descriptions
+        if store is not None and store is not self._descriptions:
+            store.close()
+        self._events = previous._events
+        self._revision = max(self._revision, previous._revision)
+        self._reset("load")
+
+    @_mutation
+    def _replace(
+        self,
+        spots: List[Spot],
+        edges: List[Path],
+        descriptions: Dict[int, str] | None = None,
+        changes: List[Tuple[Type[GraphEvent], Dict[str, Any]]] | None = None,
+    ) -> None:
+        """
+        用新的景点和道路列表整体替换当前数据，并重建派生索引
+
+        :param spots(List[Spot]): 新的景点列表
+        :param edges(List[Path]): 新的道路列表
+        :param descriptions(Dict[int, str] | None): 新增或修改过的景点简介
+        :param changes(List[Tuple[Type[GraphEvent], Dict[str, Any]]] | None): 这次替换包含的逐项修改，作为同一修订号的事件发布
+        """
+        self.spots = spots
+        self.edges = edges
+        self._rebuild_indexes()
+        if descriptions:
+            self._set_descriptions(descriptions)
+        self._publish(changes or [])
+
+    def dump_json(self, indent: int | None = None) -> str:
+        """
+        在写锁中把整个图序列化为 JSON，可以在后台线程中调用，不会夹杂其他线程修改了一半的状态
+
+        :param indent(int | None): 缩进的空格数
+        :return: 完整的 JSON 快照
+        """
+        with self._write_lock:
+            return self.model_dump_json(indent=indent)
+
+    def dump_compact(self) -> Dict[str, list]:
+        """
+        导出紧凑快照：景点和道路都用数组而不是对象表示，体积更小，
+        并且可以通过 load_compact 跳过逐字段校验快速加载
+
+        :return: 可以直接 JSON 序列化的紧凑快照
+        """
+        with self._write_lock:
+            return {
+                # 有坐标的景点在末尾追加横纵坐标
+                "spots": [
+                    [spot.id, spot.name, spot.deleted, spot.description]
+                    + ([] if spot.position is None else [spot.x, spot.y])
+                    for spot in self.spots
+                ],
+                "edges": [
+                    [e.id, e.from_id, e.to_id, e.distance, e.duration, e.deleted]
+                    for e in self.edges
+                ],
+            }
+
+    @classmethod
+    def load_compact(cls, data: Dict[str, list]) -> TourGraph:
+        """
+        从 dump_compact 导出的紧凑快照加载图，快照由本程序生成，因此不再校验
+
+        :param data(Dict[str, list]): 紧凑快照
+        :return: 图
+        """
+        spots = [
+            Spot.model_construct(
+                id=i,
+                name=name,
+                deleted=deleted,
+                description=text,
+                x=position[0] if position else None,
+                y=position[1] if position else None,
+            )
+            for i, name, deleted, text, *position in data["spots"]
+        ]
+        edges = [
+            Path.model_construct(
+                id=i,
+                from_id=from_id,
+                to_id=to_id,
+                distance=distance,
+                duration=duration,
+                deleted=deleted,
+            )
+            for i, from_id, to_id, distance, duration, deleted in data["edges"]
+        ]
+        # model_construct 同样会调用 model_post_init 建立派生索引
+        return cls.model_construct(spots=spots, edges=edges)
 
     # 景点数量
     @property
     def nodes(self) -> int:
         return len(self.spots)
 
+    # 未删除的景点数量
+    @property
+    def live_nodes(self) -> int:
+        return len(self._live_ids)
+
     # 道路数量
     @property
     def paths(self) -> int:
-        return sum(len(s.paths) for s in self.spots) // 2
+        return len(self._edge_index)
+
+    # 修订号，每次修改景点或道路都会递增
+    @property
+    def revision(self) -> int:
+        return self._revision
+
+    # 是否已经从注册表中换出
+    @property
+    def retired(self) -> bool:
+        return self._retired
+
+    def retire(self) -> None:
+        """
+        标记图已经换出，之后所有修改以及读取简介存储都会抛出 GraphRetiredError，
+        仍持有它的会话不会把修改写到已经不再使用的对象上
+        """
+        with self._write_lock:
+            self._retired = True
+
+    def _check_resident(self) -> None:
+        if self._retired:
+            raise GraphRetiredError()
+
+    def subscribe(
+        self,
+        callback: Callable[[GraphEvent], None],
+        kinds: Tuple[Type[GraphEvent], ...] | None = None,
+    ) -> Callable[[], None]:
+        """
+        订阅图的修改事件，每次修改之后在修改图的线程中同步调用 callback
+        重新加载数据文件时订阅会转移到新加载的图上，并收到一次 GraphReset 事件
+
+        :param callback(Callable[[GraphEvent], None]): 每个事件调用一次
+        :param kinds(Tuple[Type[GraphEvent], ...] | None): 只接收这些类型的事件，None 表示全部
+        :return: 取消订阅的函数
+        """
+        return self._events.subscribe(callback, kinds)
+
+    def changes_since(self, revision: int) -> List[GraphEvent] | None:
+        """
+        :param revision(int): 之前记下的修订号
+        :return: 之后发生的所有修改事件，修改太多、较早的事件已经不再保留时返回 None
+        """
+        return self._events.since(revision)
+
+    @_mutation
+    def clear(self) -> None:
+        """
+        清空所有景点和道路
+        """
+        self.spots.clear()
+        self.edges.clear()
+        if self._descriptions is not None:
+            self._descriptions.clear()
+        self._rebuild_indexes()
+        self._reset("clear")
+
+    def attach_descriptions(self, store: DescriptionStore) -> int:
+        """
+        关联简介存储，之后景点简介只保存在存储中，快照里不再包含简介
+        景点上已有的简介（例如旧版数据文件）会一次性迁移到存储中
+
+        :param store(DescriptionStore): 简介存储
+        :return: 迁移的简介条数
+        """
+        inline = {spot.id: spot.description for spot in self.spots if spot.description}
+        self._descriptions = store
+        self._set_descriptions(inline)
+        return len(inline)
+
+    def description(self, node_id: int) -> str:
+        """
+        读取景点简介，关联了简介存储时按需从存储中读取
+
+        :param node_id(int): 景点索引
+        :return: 景点简介
+        """
+        spot = self.spots[node_id]
+        if self._descriptions is None:
+            return spot.description
+        # 换出时简介存储已经关闭
+        self._check_resident()
+        return self._descriptions.get(node_id, spot.description)
+
+    def all_descriptions(self) -> Dict[int, str]:
+        """
+        一次读取所有景点的简介，关联了简介存储时顺序读取整个简介文件，不会挤掉缓存中的热门简介
+
+        :return: 景点索引 -> 简介
+        """
+        if self._descriptions is None:
+            return {spot.id: spot.description for spot in self.spots}
+        self._check_resident()
+        stored = self._descriptions.read_all()
+        return {spot.id: stored.get(spot.id, spot.description) for spot in self.spots}
+
+    def _set_descriptions(self, descriptions: Dict[int, str]) -> None:
+        """
+        写入一批景点简介，关联了简介存储时写入存储并清空景点上的简介
+
+        :param descriptions(Dict[int, str]): 景点索引 -> 简介
+        """
+        if self._descriptions is None:
+            for node_id, text in descriptions.items():
+                self.spots[node_id].description = text
+            return
+        self._descriptions.put_many(descriptions)
+        for node_id in descriptions:
+            self.spots[node_id].description = ""
+
+    def iter_edges(self) -> Iterator[Path]:
+        """
+        遍历所有两端景点都未删除的道路，每条道路只出现一次
+        遍历的是调用时道路索引的副本，其他线程同时增删道路不会打断遍历
+
+        :return: 逐条产出的道路
+        """
+        edges = self.edges
+        for edge_id in list(self._edge_index.values()):
+            edge = edges[edge_id]
+            if self._is_valid_node(edge.from_id) and self._is_valid_node(edge.to_id):
+                yield edge
+
+    def neighbors(self, node_id: int) -> Iterator[Tuple[int, Path]]:
+        """
+        遍历与景点相连且另一端未删除的道路
+
+        :param node_id(int): 景点索引
+        :return: 逐条产出 (另一端景点索引, 道路)
+        """
+        for edge in self._incidence[node_id]:
+            neighbor = edge.to_id if edge.from_id == node_id else edge.from_id
+            if self._is_valid_node(neighbor):
+                yield neighbor, edge
 
     def _is_valid_node(self, node_id: int) -> bool:
         """
@@ -81,11 +538,9 @@ class TourGraph(BaseModel):
         :param name(str): 景点名称
         :return: 是否存在同名景点
         """
-        for spot in self.spots:
-            if spot.name == name and not spot.deleted:
-                return True
-        return False
+        return name in self._name_index
 
+    @_mutation
     def add_node(self, spot: Spot) -> int:
         """
         添加一个新的景点
@@ -95,10 +550,37 @@ class TourGraph(BaseModel):
         if self._have_same_spot_name(spot.name):
             raise SpotNameDuplicateError(spot.name)
         node_id = len(self.spots)
-        spot = Spot(id=node_id, name=spot.name, description=spot.description)
-        self.spots.append(spot)
+        self.spots.append(Spot(id=node_id, name=spot.name, x=spot.x, y=spot.y))
+        self._set_descriptions({node_id: spot.description})
+        self._name_index[spot.name] = node_id
+        self._live_ids.append(node_id)
+        self._incidence.append([])
+        for matrix in self._distance_matrices.values():
+            matrix.node_added()
+        if self._partition is not None:
+            self._partition.node_added(node_id)
+        if self._components is not None:
+            self._components.node_added()
+        if self._search_index is not None:
+            self._search_index.add(node_id, spot.name, spot.description)
+        if self._spatial is not None:
+            self._spatial.node_added(node_id, spot.position)
+        self._publish(
+            [
+                (
+                    SpotAdded,
+                    {
+                        "spot_id": node_id,
+                        "name": spot.name,
+                        "description": spot.description,
+                        "position": spot.position,
+                    },
+                )
+            ]
+        )
         return node_id
 
+    @_mutation
     def add_path(self, from_id: int, to_id: int, distance: int, duration: int) -> None:
         """
         为两个景点之间添加一条道路
@@ -108,24 +590,111 @@ class TourGraph(BaseModel):
         :param distance(int): 路径长度
         :param duration(int): 所需时间
         """
-        from_spot = self.spots[from_id]
-        to_spot = self.spots[to_id]
+        if not (0 <= from_id < len(self.spots)):
+            raise SpotIdInvalidError(from_id)
+        if not (0 <= to_id < len(self.spots)):
+            raise SpotIdInvalidError(to_id)
         # 确认两点之间不存在路径
-        for path in from_spot.paths:
-            if path.target_id == to_id:
-                raise PathDuplicateError(from_id, to_id)
-        for path in to_spot.paths:
-            if path.target_id == from_id:
-                raise PathDuplicateError(from_id, to_id)
-        from_spot.paths.append(
-            Path(target_id=to_id, distance=distance, duration=duration)
+        key = _edge_key(from_id, to_id)
+        if key in self._edge_index:
+            raise PathDuplicateError(from_id, to_id)
+        edge = Path(
+            id=len(self.edges),
+            from_id=from_id,
+            to_id=to_id,
+            distance=distance,
+            duration=duration,
         )
-        to_spot.paths.append(
-            Path(target_id=from_id, distance=distance, duration=duration)
+        self.edges.append(edge)
+        self._edge_index[key] = edge.id
+        self._raise_max_weights(edge)
+        # 先记下道路在分区中的层级再把它加入邻接表，不持有写锁的覆盖图查询遇到它时层级已经存在
+        level = self._partition.edge_added(edge) if self._partition is not None else 0
+        self._incidence[from_id].append(edge)
+        self._incidence[to_id].append(edge)
+        if self._is_valid_node(from_id) and self._is_valid_node(to_id):
+            for weight_type, matrix in self._distance_matrices.items():
+                matrix.edge_decreased(from_id, to_id, getattr(edge, weight_type))
+            if self._components is not None:
+                self._components.edge_added(edge)
+            if self._spatial is not None:
+                self._spatial.edge_changed(edge)
+        if self._partition is not None:
+            # 两端可能成为新的边界景点，从第 1 层开始重新定制到道路所在的层
+            for overlay in self._overlays.values():
+                overlay.update((from_id, to_id), low=1, high=level + 1)
+        self._publish([(PathAdded, _path_fields(edge))])
+
+    @_mutation
+    def bulk_add(
+        self,
+        spots: List[Tuple[str, str] | Tuple[str, str, Tuple[float, float] | None]],
+        paths: List[Tuple[int, int, int, int]],
+    ) -> None:
+        """
+        一次性添加大量景点和道路，所有派生索引只在最后重建一次
+        不做重名和重复道路检查，调用方需要事先校验（见 models.importer）
+
+        :param spots(List[Tuple]): 新景点的 (名称, 简介) 或 (名称, 简介, 坐标)，按顺序分配索引
+        :param paths(List[Tuple[int, int, int, int]]): 新道路的 (起始景点索引, 目标景点索引, 距离, 时间)
+        """
+        first_id = len(self.spots)
+        for offset, (name, _, *rest) in enumerate(spots):
+            position = rest[0] if rest else None
+            self.spots.append(
+                Spot(
+                    id=first_id + offset,
+                    name=name,
+                    x=position[0] if position else None,
+                    y=position[1] if position else None,
+                )
+            )
+        for from_id, to_id, distance, duration in paths:
+            self.edges.append(
+                Path(
+                    id=len(self.edges),
+                    from_id=from_id,
+                    to_id=to_id,
+                    distance=distance,
+                    duration=duration,
+                )
+            )
+        # 距离矩阵也会被丢弃，下次使用时重新计算，比逐条修复更快
+        self._rebuild_indexes()
+        self._set_descriptions(
+            {
+                first_id + offset: spot[1]
+                for offset, spot in enumerate(spots)
+            }
         )
+        self._reset("bulk_add")
+
+    def transaction(self) -> GraphTransaction:
+        """
+        开始一个事务，把多次增删改作为一个整体提交：
+
+            with graph.transaction() as tx:
+                spot_id = tx.add_node("新景点", "简介")
+                tx.add_path(spot_id, 0, 100, 5)
+                tx.delete_node(3)
+
+        事务中的修改在提交前对读者不可见；with 块中抛出任何异常都不会修改图，
+        正常结束时一次性写入并只重建一次派生索引
+
+        :return: 事务对象
+        """
+        # 事务模块需要用到本模块的 Spot 和 Path，在这里导入以避免循环导入
+        from models.transaction import GraphTransaction
 
+        return GraphTransaction(self)
+
+    @_mutation
     def modify_node(
-        self, target_id: int, name: str | None = None, description: str | None = None
+        self,
+        target_id: int,
+        name: str | None = None,
+        description: str | None = None,
+        position: Tuple[float, float] | None = None,
     ) -> None:
         """
         修改景点信息
@@ -133,13 +702,53 @@ class TourGraph(BaseModel):
         :param target_id(int): 目标景点索引
         :param name(str | None): 新的景点名称
         :param description(str | None): 新的景点简介
+        :param position(Tuple[float, float] | None): 新的坐标，不能把已有的坐标清除
         """
         spot = self.spots[target_id]
-        if name is not None:
+        old_name = spot.name
+        if name is not None and name != spot.name:
+            if self._have_same_spot_name(name):
+                raise SpotNameDuplicateError(name)
+            if not spot.deleted:
+                self._name_index.pop(spot.name, None)
+                self._name_index[name] = target_id
             spot.name = name
+        else:
+            name = None
+        old_description = None
         if description is not None:
-            spot.description = description
+            old_description = self.description(target_id)
+            self._set_descriptions({target_id: description})
+        if self._search_index is not None:
+            self._search_index.update(target_id, name, old_description, description)
+        old_position = spot.position
+        if position is not None and tuple(position) != old_position:
+            position = (float(position[0]), float(position[1]))
+            spot.x, spot.y = position
+            if self._spatial is not None and not spot.deleted:
+                self._spatial.node_moved(target_id, position)
+        else:
+            position = old_position = None
+        if name is None and description is None and position is None:
+            return
+        self._publish(
+            [
+                (
+                    SpotModified,
+                    {
+                        "spot_id": target_id,
+                        "old_name": None if name is None else old_name,
+                        "new_name": name,
+                        "old_description": old_description,
+                        "new_description": description,
+                        "old_position": old_position,
+                        "new_position": position,
+                    },
+                )
+            ]
+        )
 
+    @_mutation
     def delete_node(self, target_id: int) -> None:
         """
         删除景点
@@ -147,8 +756,27 @@ class TourGraph(BaseModel):
         :param target_id(int): 目标景点索引
         """
         spot = self.spots[target_id]
+        if spot.deleted:
+            return
         spot.deleted = True
-
+        if self._name_index.get(spot.name) == target_id:
+            del self._name_index[spot.name]
+        index = bisect_left(self._live_ids, target_id)
+        if index < len(self._live_ids) and self._live_ids[index] == target_id:
+            del self._live_ids[index]
+        for matrix in self._distance_matrices.values():
+            matrix.node_deleted(target_id)
+        for overlay in self._overlays.values():
+            overlay.update((target_id,), low=1, high=self._partition.levels)
+        if self._components is not None:
+            self._components.invalidate()
+        if self._search_index is not None:
+            self._search_index.remove(target_id, self.description(target_id))
+        if self._spatial is not None:
+            self._spatial.node_deleted(target_id)
+        self._publish([(SpotDeleted, {"spot_id": target_id, "name": spot.name})])
+
+    @_mutation
     def modify_path(
         self,
         from_id: int,
@@ -164,25 +792,53 @@ class TourGraph(BaseModel):
         :param distance(int | None): 新的路径长度
         :param duration(int | None): 新的所需时间
         """
-        from_spot = self.spots[from_id]
-        to_spot = self.spots[to_id]
-
-        for path in from_spot.paths:
-            if path.target_id == to_id:
-                if distance is not None:
-                    path.distance = distance
-                if duration is not None:
-                    path.duration = duration
-                break
-
-        for path in to_spot.paths:
-            if path.target_id == from_id:
-                if distance is not None:
-                    path.distance = distance
-                if duration is not None:
-                    path.duration = duration
-                break
+        edge = self.find_path(from_id, to_id)
+        if edge is None:
+            raise PathInvalidError(from_id, to_id)
+        old_weights = {"distance": edge.distance, "duration": edge.duration}
+        if distance is not None:
+            edge.distance = distance
+        if duration is not None:
+            edge.duration = duration
+        self._raise_max_weights(edge)
+        for weight_type, overlay in self._overlays.items():
+            if getattr(edge, weight_type) != old_weights[weight_type]:
+                overlay.edge_changed(edge, old_weights[weight_type])
+
+        if self._is_valid_node(from_id) and self._is_valid_node(to_id):
+            for weight_type, matrix in self._distance_matrices.items():
+                old_weight = old_weights[weight_type]
+                new_weight = getattr(edge, weight_type)
+                if new_weight < old_weight:
+                    matrix.edge_decreased(from_id, to_id, new_weight)
+                elif new_weight > old_weight:
+                    matrix.edge_increased(from_id, to_id, old_weight)
+            if self._spatial is not None:
+                self._spatial.edge_changed(edge)
+
+        if (edge.distance, edge.duration) == (
+            old_weights["distance"],
+            old_weights["duration"],
+        ):
+            return
+        self._publish(
+            [
+                (
+                    PathModified,
+                    {
+                        "path_id": edge.id,
+                        "from_id": edge.from_id,
+                        "to_id": edge.to_id,
+                        "old_distance": old_weights["distance"],
+                        "new_distance": edge.distance,
+                        "old_duration": old_weights["duration"],
+                        "new_duration": edge.duration,
+                    },
+                )
+            ]
+        )
 
+    @_mutation
     def delete_path(self, from_id: int, to_id: int) -> None:
         """
         删除道路
@@ -190,11 +846,370 @@ class TourGraph(BaseModel):
         :param from_id(int): 起始景点索引
         :param to_id(int): 目标景点索引
         """
-        from_spot = self.spots[from_id]
-        to_spot = self.spots[to_id]
+        edge_id = self._edge_index.pop(_edge_key(from_id, to_id), None)
+        if edge_id is None:
+            return
+        edge = self.edges[edge_id]
+        edge.deleted = True
+        self._incidence[edge.from_id].remove(edge)
+        self._incidence[edge.to_id].remove(edge)
+        for weight_type, overlay in self._overlays.items():
+            overlay.edge_changed(edge, getattr(edge, weight_type))
+        if self._is_valid_node(edge.from_id) and self._is_valid_node(edge.to_id):
+            for weight_type, matrix in self._distance_matrices.items():
+                matrix.edge_increased(
+                    edge.from_id, edge.to_id, getattr(edge, weight_type)
+                )
+            if self._components is not None:
+                self._components.invalidate()
+        self._publish([(PathDeleted, _path_fields(edge))])
+
+    def distance_matrix(
+        self, weight_type: Literal["distance", "duration"]
+    ) -> DistanceMatrix:
+        """
+        获取按指定权重维护的全源最短距离矩阵，第一次调用时从头计算
+        之后每次通过本类的方法修改景点或道路，矩阵都只修复受影响的部分
+
+        :param weight_type(Literal['distance', 'duration']): 权重类型
+        :return: 距离矩阵
+        """
+        if weight_type not in ["distance", "duration"]:
+            raise StandardInvalidError(weight_type)
+        matrix = self._distance_matrices.get(weight_type)
+        if matrix is None:
+            matrix = DistanceMatrix(self, weight_type)
+            self._distance_matrices[weight_type] = matrix
+        return matrix
+
+    def connected(self, a: int, b: int) -> bool:
+        """
+        判断两个未删除的景点之间是否存在道路相连的路径，不做任何搜索
+        第一次调用时建立连通分量索引，新增景点和道路时增量合并，删除后在下一次调用时重建
 
-        from_spot.paths = [path for path in from_spot.paths if path.target_id != to_id]
-        to_spot.paths = [path for path in to_spot.paths if path.target_id != from_id]
+        :param a(int): 景点索引
+        :param b(int): 景点索引
+        :return: 是否连通
+        """
+        if a == b:
+            return True
+        index = self._components
+        if index is None:
+            index = ComponentIndex(self)
+            self._components = index
+        return index.connected(a, b)
+
+    def max_weight(self, weight_type: Literal["distance", "duration"]) -> int:
+        """
+        道路权重的上限，第一次调用时遍历所有道路，之后新增或加大权重时随之更新，删除道路后不缩小
+
+        :param weight_type(Literal['distance', 'duration']): 权重类型
+        :return: 不小于所有道路权重的值，没有道路时为 0
+        """
+        value = self._max_weights.get(weight_type)
+        if value is None:
+            value = max(
+                (getattr(edge, weight_type) for edge in self.iter_edges()), default=0
+            )
+            self._max_weights[weight_type] = value
+        return value
+
+    def _raise_max_weights(self, edge: Path) -> None:
+        for weight_type, value in self._max_weights.items():
+            weight = getattr(edge, weight_type)
+            if weight > value:
+                self._max_weights[weight_type] = weight
+
+    def spatial_index(self) -> SpatialIndex:
+        """
+        获取景点坐标的网格索引，第一次调用时建立，之后随景点和道路的修改增量维护
+
+        :return: 空间索引
+        """
+        index = self._spatial
+        if index is None:
+            index = SpatialIndex(self)
+            self._spatial = index
+        return index
+
+    def nearest_spots(self, x: float, y: float, k: int = 1) -> List[Tuple[Spot, float]]:
+        """
+        按直线距离查找离某个位置最近的景点，没有坐标的景点不参与
+
+        :param x(float): 横坐标
+        :param y(float): 纵坐标
+        :param k(int): 返回的景点数
+        :return: 按距离从近到远排列的 (景点, 直线距离)
+        """
+        return [
+            (self.spots[node_id], distance)
+            for node_id, distance in self.spatial_index().nearest(x, y, k)
+        ]
+
+    def spots_in_box(
+        self, min_x: float, min_y: float, max_x: float, max_y: float
+    ) -> List[Spot]:
+        """
+        查找坐标落在矩形范围内的景点，用于地图只绘制可见区域
+
+        :return: 按索引升序排列的景点
+        """
+        return [
+            self.spots[node_id]
+            for node_id in self.spatial_index().within(min_x, min_y, max_x, max_y)
+        ]
+
+    def partition(self) -> Partition:
+        """
+        获取与权重无关的多层分区，第一次调用时或者分区之后新增的景点和道路过多时重新分区
+        分区在写锁中建立并替换，修改方在同一把锁中增量维护它，不会更新到一半被替换掉
+
+        :return: 分区
+        """
+        partition = self._partition
+        if partition is not None and not partition.stale:
+            return partition
+        with self._write_lock:
+            if self._partition is None or self._partition.stale:
+                self._partition = Partition(self)
+                self._overlays = {}
+            return self._partition
+
+    def overlay(self, weight_type: Literal["distance", "duration"]) -> Overlay:
+        """
+        获取按指定权重定制的多层覆盖图，第一次调用时先对图分区再定制所有捷径
+        分区与权重无关，两种权重共用同一个分区；之后修改道路权重只重新定制受影响的单元，
+        新增的景点和道路过多时在下一次调用时重新分区。定制同样在写锁中进行，期间的道路修改会等它完成后再增量更新
+
+        :param weight_type(Literal['distance', 'duration']): 权重类型
+        :return: 覆盖图
+        """
+        if weight_type not in ["distance", "duration"]:
+            raise StandardInvalidError(weight_type)
+        overlay = self._overlays.get(weight_type)
+        if overlay is not None and overlay.partition is self.partition():
+            return overlay
+        with self._write_lock:
+            partition = self.partition()
+            overlay = self._overlays.get(weight_type)
+            if overlay is None:
+                overlay = Overlay(self, partition, weight_type)
+                self._overlays[weight_type] = overlay
+            return overlay
+
+    def overlay_dijkstra(
+        self,
+        start_id: int,
+        target_id: int,
+        weight_type: Literal["distance", "duration"],
+    ) -> Tuple[int, List[int]]:
+        """
+        在多层覆盖图上求从起点到终点的最短路径，适合景点很多、道路大致只连接相邻景点（例如网格状）的景区
+        总权重与 dijkstra 相同，存在多条等长的最短路径时返回的可能是其中另一条；
+        分区切开的道路太多时覆盖图不会更快（见 models.overlay.MAX_CUT_RATIO），直接使用 dijkstra
+
+        :param start_id(int): 起始景点索引
+        :param target_id(int): 目标景点索引
+        :param weight_type(Literal['distance', 'duration']): 权重类型
+        :return: 最短路径的总权重和路径经过的景点索引列表，不可达返回 (-1, [])
+        """
+        if not self._is_valid_node(start_id):
+            raise SpotIdInvalidError(start_id)
+        if not self._is_valid_node(target_id):
+            raise SpotIdInvalidError(target_id)
+        if weight_type not in ["distance", "duration"]:
+            raise StandardInvalidError(weight_type)
+        if not self.connected(start_id, target_id):
+            return -1, []
+        if not self.partition().worthwhile:
+            return self.dijkstra(start_id, target_id, weight_type)
+        return self.overlay(weight_type).query(start_id, target_id)
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[Spot, float]]:
+        """
+        按名称和简介模糊搜索未删除的景点，允许错字
+        第一次调用时建立 n-gram 倒排索引，之后随景点的增删改增量更新
+
+        :param query(str): 查询文本
+        :param limit(int): 最多返回的结果数
+        :return: 按相关程度从高到低排列的 (景点, 得分)
+        """
+        index = self.search_index()
+        return [(self.spots[node_id], score) for node_id, score in index.search(query, limit)]
+
+    def search_index(self) -> SearchIndex:
+        """
+        获取景点名称与简介的倒排索引，第一次调用时在写锁中建立，期间的修改不会漏掉
+
+        :return: 倒排索引
+        """
+        index = self._search_index
+        if index is not None:
+            return index
+        with self._write_lock:
+            if self._search_index is None:
+                descriptions = self.all_descriptions()
+                index = SearchIndex()
+                for node_id in self._live_ids:
+                    index.add(node_id, self.spots[node_id].name, descriptions[node_id])
+                self._search_index = index
+            return self._search_index
+
+    def shortest_path_tree(
+        self,
+        start_id: int,
+        weight_type: Literal["distance", "duration"],
+        budget: int | None = None,
+        queue: str | None = None,
+    ) -> Tuple[Dict[int, int], Dict[int, int | None]]:
+        """
+        利用 dijkstra 算法求从起点到所有可达景点的最短路径树
+
+        :param start_id(int): 起始景点索引
+        :param weight_type(Literal['distance', 'duration']): 权重类型
+        :param budget(int | None): 权重上限，超过上限的景点不再扩展，None 表示不限制
+        :param queue(str | None): 优先队列，见 models.pqueue.QUEUES，None 表示按道路权重的上限自动选择
+        :return: 可达景点的最短距离，以及它们在最短路径树上的前驱景点
+        """
+        if not self._is_valid_node(start_id):
+            raise SpotIdInvalidError(start_id)
+        if weight_type not in ["distance", "duration"]:
+            raise StandardInvalidError(weight_type)
+        return self._search(start_id, weight_type, budget=budget, queue=queue)
+
+    def _search(
+        self,
+        start_id: int,
+        weight_type: Literal["distance", "duration"],
+        budget: int | None = None,
+        targets: Iterable[int] | None = None,
+        queue: str | None = None,
+    ) -> Tuple[Dict[int, int], Dict[int, int | None]]:
+        """
+        所有 dijkstra 变体共用的搜索过程，起点和权重类型由调用方校验
+
+        道路权重都是整数，权重上限较小（例如分钟）时使用桶队列，否则使用二叉堆，见 models.pqueue；
+        队列每次取出键相同的一批景点并按景点索引升序扩展，因此无论使用哪种队列，最短路径树都完全相同：
+        每个景点的前驱是最短距离上所有可能的前驱中最先扩展的那个
+
+        :param start_id(int): 起始景点索引
+        :param weight_type(Literal['distance', 'duration']): 权重类型
+        :param budget(int | None): 权重上限，超过上限的景点不再扩展
+        :param targets(Iterable[int] | None): 目标景点，它们的最短距离都确定之后就停止，None 表示求完整的树
+        :param queue(str | None): 优先队列名称，None 表示自动选择
+        :return: 最短距离与前驱景点，提前停止时只有已确定的景点及其最短路径上的景点是最终结果
+        """
+        max_weight = self.max_weight(weight_type)
+        pq = QUEUES[queue or choose_queue(max_weight)](max_weight)
+        push, pop_batch = pq.push, pq.pop_batch
+        spots, incidence = self.spots, self._incidence
+        weights: Dict[int, int] = {start_id: 0}
+        previous_nodes: Dict[int, int | None] = {start_id: None}
+        remaining = None
+        if targets is not None:
+            remaining = set(targets)
+            remaining.discard(start_id)
+            if not remaining:
+                return weights, previous_nodes
+        push(0, start_id)
+
+        while pq:
+            current_weight, batch = pop_batch()
+            for current_id in batch:
+                if current_weight > weights[current_id]:
+                    continue  # 已经有更短的路径，跳过
+                if remaining is not None:
+                    remaining.discard(current_id)
+                    if not remaining:
+                        return weights, previous_nodes  # 所有目标都已确定，提前退出
+                for path in incidence[current_id]:
+                    neighbor = path.to_id if path.from_id == current_id else path.from_id
+                    if spots[neighbor].deleted:
+                        continue
+                    new_weight = current_weight + getattr(path, weight_type)
+                    if budget is not None and new_weight > budget:
+                        continue  # 超出上限，这条路不再往下搜索
+                    old_weight = weights.get(neighbor)
+                    if old_weight is None or new_weight < old_weight:
+                        weights[neighbor] = new_weight
+                        previous_nodes[neighbor] = current_id
+                        push(new_weight, neighbor)
+
+        return weights, previous_nodes
+
+    def _routes_unchanged_since(self, revision: int) -> bool:
+        """
+        :param revision(int): 之前记下的修订号
+        :return: 这之后的修改是否都不会改变最短路径，例如只修改了景点名称或简介
+        """
+        changes = self._events.since(revision)
+        return changes is not None and not any(
+            isinstance(event, ROUTING_EVENTS) for event in changes
+        )
+
+    def _cached_tree(
+        self,
+        start_id: int,
+        weight_type: Literal["distance", "duration"],
+        always: bool = False,
+    ) -> Tuple[Dict[int, int], Dict[int, int | None]] | None:
+        """
+        从进程内共享的缓存中获取起点的完整最短路径树
+        缓存中没有时，起点被查询得足够频繁（或者 always 为 True）才求完整的树并放入缓存，否则返回 None
+
+        :param start_id(int): 起始景点索引
+        :param weight_type(Literal['distance', 'duration']): 权重类型
+        :param always(bool): 缓存中没有时是否总是求完整的树，同一个起点要查多个终点时使用
+        :return: 最短距离与前驱景点，返回的字典不能修改
+        """
+        # 先记下修订号，求树期间图被修改的话，这棵树会在下一次查询时被当作过期丢弃
+        revision = self._revision
+        tree = path_trees.get(
+            self._uid, start_id, weight_type, revision, self._routes_unchanged_since
+        )
+        if tree is None and (
+            always or path_trees.should_admit(self._uid, start_id, weight_type, revision)
+        ):
+            tree = self.shortest_path_tree(start_id, weight_type)
+            path_trees.put(self._uid, start_id, weight_type, revision, tree)
+        return tree
+
+    def reachable_within(
+        self,
+        start_id: int,
+        budget: int,
+        weight_type: Literal["distance", "duration"],
+    ) -> List[Tuple[int, int, int | None]]:
+        """
+        求从起点出发在给定距离或时间以内能到达的所有景点
+        只做一次在上限处停止的 dijkstra，而不是对每个景点各求一次最短路径
+
+        :param start_id(int): 起始景点索引
+        :param budget(int): 距离或时间上限
+        :param weight_type(Literal['distance', 'duration']): 权重类型
+        :return: 按花费从小到大排列的 (景点索引, 花费, 前驱景点索引) 列表，起点的前驱为 None
+        """
+        if not self._is_valid_node(start_id):
+            raise SpotIdInvalidError(start_id)
+        if weight_type not in ["distance", "duration"]:
+            raise StandardInvalidError(weight_type)
+        # 缓存中有完整的树时直接筛选，上限以内的景点的距离和前驱与有上限的搜索相同
+        tree = path_trees.get(
+            self._uid,
+            start_id,
+            weight_type,
+            self._revision,
+            self._routes_unchanged_since,
+        )
+        if tree is None:
+            tree = self.shortest_path_tree(start_id, weight_type, budget=budget)
+        weights, previous_nodes = tree
+        result = [
+            (node_id, weight, previous_nodes[node_id])
+            for node_id, weight in weights.items()
+            if weight <= budget
+        ]
+        return sorted(result, key=lambda item: (item[1], item[0]))
 
     def dijkstra(
         self,
@@ -205,6 +1220,7 @@ class TourGraph(BaseModel):
         """
         利用 dijkstra 算法求从起点到终点的最短路径
         允许以距离或者时间作为权重进行求解
+        所有景点都有坐标时改用以直线距离为启发函数的 A*，总权重不变，存在多条等长的最短路径时返回的可能是其中另一条
 
         :param start_id(int): 起始景点索引
         :param target_id(int): 目标景点索引
@@ -215,128 +1231,203 @@ class TourGraph(BaseModel):
             raise SpotIdInvalidError(start_id)
         if not self._is_valid_node(target_id):
             raise SpotIdInvalidError(target_id)
+        if weight_type not in ["distance", "duration"]:
+            raise StandardInvalidError(weight_type)
 
-        weights = {
-            spot.id: float("inf") for spot in self.spots if not spot.deleted
-        }  # 初始化为无穷大
-        weights[start_id] = 0  # 自己到自己距离为 0
+        if not self.connected(start_id, target_id):
+            return -1, []  # 不在同一个连通分量中，不需要搜索
 
-        previous_nodes: Dict[int, None | int] = {
-            spot.id: None for spot in self.spots if not spot.deleted
-        }
-        pq = [(0, start_id)]  # 优先队列，存储 (距离, 节点索引)
+        # 热门起点的完整最短路径树在缓存中，只需要还原路径
+        tree = self._cached_tree(start_id, weight_type)
+        if tree is not None:
+            return _trace(tree, target_id)
 
-        while pq:
-            current_weight, current_id = heapq.heappop(pq)
+        ratio = self.spatial_index().lower_bound(weight_type)
+        if ratio:
+            return self._astar(start_id, target_id, weight_type, ratio)
+
+        weights, previous_nodes = self._search(
+            start_id, weight_type, targets=(target_id,)
+        )
+        if target_id not in weights:
+            return -1, []  # 终点不可达
+        return weights[target_id], _trace_path(previous_nodes, target_id)
+
+    def _astar(
+        self,
+        start_id: int,
+        target_id: int,
+        weight_type: Literal["distance", "duration"],
+        ratio: float,
+    ) -> Tuple[int, List[int]]:
+        """
+        以 下界系数 × 到终点的直线距离 为启发函数的 A*，只搜索朝终点方向的景点
+
+        :param start_id(int): 起始景点索引
+        :param target_id(int): 目标景点索引，与起点连通
+        :param weight_type(Literal['distance', 'duration']): 权重类型
+        :param ratio(float): 空间索引给出的下界系数
+        :return: 最短路径的总权重和路径经过的景点索引列表
+        """
+        position = self._spatial.position
+        target_x, target_y = position(target_id)
+        # 略微缩小系数，避免浮点误差让启发函数超过真实距离
+        ratio *= 1 - 1e-9
+        weights: Dict[int, int] = {start_id: 0}
+        previous_nodes: Dict[int, int | None] = {start_id: None}
+        closed = set()
+        x, y = position(start_id)
+        pq = [(ratio * math.hypot(x - target_x, y - target_y), start_id)]
 
+        while pq:
+            _, current_id = heapq.heappop(pq)
             if current_id == target_id:
-                break  # 找到最短路径，提前退出
-            if current_weight > weights[current_id]:  # type: ignore
+                break
+            if current_id in closed:
                 continue  # 已经有更短的路径，跳过
+            closed.add(current_id)
+            current_weight = weights[current_id]
+
+            for neighbor, path in self.neighbors(current_id):
+                new_weight = current_weight + getattr(path, weight_type)
+                if neighbor not in weights or new_weight < weights[neighbor]:
+                    weights[neighbor] = new_weight
+                    previous_nodes[neighbor] = current_id
+                    x, y = position(neighbor)
+                    heapq.heappush(
+                        pq,
+                        (
+                            new_weight + ratio * math.hypot(x - target_x, y - target_y),
+                            neighbor,
+                        ),
+                    )
+
+        return weights[target_id], _trace_path(previous_nodes, target_id)
+
+    def iter_all_paths(
+        self,
+        start_id: int,
+        target_id: int,
+        max_depth: int | None = None,
+        should_stop: StopCheck | None = None,
+    ) -> Iterator[Tuple[int, int, List[int]]]:
+        """
+        利用非递归的 DFS 逐条产出从起点到终点的所有简单路径
+        内存占用只和当前搜索深度有关，适合结果很多时边找边处理
+
+        :param start_id(int): 起始景点索引
+        :param target_id(int): 目标景点索引
+        :param max_depth(int | None): 路径最多包含的道路条数，None 表示不限制
+        :param should_stop(StopCheck | None): 每扩展 STOP_CHECK_INTERVAL 个景点调用一次，返回 True 时结束枚举
+        :return: 逐条产出 (总距离, 总时间, 路径经过的景点索引列表)
+        """
+        if not self._is_valid_node(start_id):
+            raise SpotIdInvalidError(start_id)
+        if not self._is_valid_node(target_id):
+            raise SpotIdInvalidError(target_id)
+
+        if start_id == target_id:
+            yield 0, 0, [start_id]
+            return
+        if not self.connected(start_id, target_id):
+            return
 
-            current_spot = self.spots[current_id]
-            for path in current_spot.paths:
-                if not self._is_valid_node(path.target_id):
-                    continue  # 跳过已删除的节点
-
-                weight = path.distance if weight_type == "distance" else path.duration
-                new_weight = current_weight + weight
-
-                if new_weight < weights[path.target_id]:  # type: ignore
-                    # 找到更短路径，更新权重和前驱节点
-                    weights[path.target_id] = new_weight
-                    previous_nodes[path.target_id] = current_id
-                    heapq.heappush(pq, (new_weight, path.target_id))
-
-        if weights[target_id] == float("inf"):
-            # 终点非可达
-            return -1, []  # 不可达返回 -1
-
-        path_sequence = []
-        current_id = target_id
-        while current_id is not None:
-            path_sequence.append(current_id)
-            current_id = previous_nodes[current_id]
-
-        return (
-            int(weights[target_id]),
-            path_sequence[::-1],
-        )  # 返回总权重和路径序列，因为在这里是肯定找到了
-        # 所以可以直接 int 一下，不然 int('inf') 会炸 ValueError
-
-    def _dfs(
+        yield from self._extend_paths(
+            [start_id], 0, 0, target_id, max_depth, should_stop
+        )
+
+    def _extend_paths(
         self,
-        current: int,
-        target: int,
-        path: List[int],
-        current_distance: int,
-        current_duration: int,
-        visited: set,
-    ) -> List[Tuple[int, int, List[int]]]:
+        prefix: List[int],
+        prefix_distance: int,
+        prefix_duration: int,
+        target_id: int,
+        max_depth: int | None = None,
+        should_stop: StopCheck | None = None,
+    ) -> Iterator[Tuple[int, int, List[int]]]:
+        """
+        从一段已经确定的路径前缀出发，逐条产出延伸到终点的所有简单路径
+
+        :param prefix(List[int]): 路径前缀，以起点开头，不包含终点
+        :param prefix_distance(int): 前缀的总距离
+        :param prefix_duration(int): 前缀的总时间
+        :param target_id(int): 目标景点索引
+        :param max_depth(int | None): 路径最多包含的道路条数，None 表示不限制
+        :param should_stop(StopCheck | None): 每扩展 STOP_CHECK_INTERVAL 个景点调用一次，返回 True 时结束枚举
+        :return: 逐条产出 (总距离, 总时间, 路径经过的景点索引列表)
         """
-        用来求所有路径的 DFS
-
-        :param current(int): 当前节点索引
-        :param target(int): 目标节点索引
-        :param path(List[int]): 当前路径
-        :param current_dist(int): 当前路径总距离
-        :param current_duration(int): 当前路径总时间
-        :param visited(set): 已访问节点集合
-        :return : List[Tuple[int, int, List[int]]]: 所有路径结果列表
-        """
-        results = []
-        if current == target:
-            results.append(
-                (current_distance, current_duration, list(path))
-            )  # 找到一条路径
-            return results
-
-        visited.add(current)
-        spot = self.spots[current]
-        for p in spot.paths:
-            neighbor = p.target_id
-            if (
-                self._is_valid_node(neighbor) and neighbor not in visited
-            ):  # 节点存在且未访问过
+        expanded = 0
+        path = list(prefix)
+        visited = set(prefix)
+        # 栈中存放 (邻接道路迭代器, 到当前节点的总距离, 到当前节点的总时间)
+        stack = [(self.neighbors(path[-1]), prefix_distance, prefix_duration)]
+
+        while stack:
+            neighbors, current_distance, current_duration = stack[-1]
+            depth = len(path)  # 再走一步之后路径包含的道路条数
+            advanced = False
+
+            for neighbor, p in neighbors:
+                if neighbor in visited:
+                    continue
+                if max_depth is not None and depth > max_depth:
+                    break
+
+                new_distance = current_distance + p.distance
+                new_duration = current_duration + p.duration
+                if neighbor == target_id:
+                    yield new_distance, new_duration, path + [neighbor]  # 找到一条路径
+                    continue
+                if max_depth is not None and depth >= max_depth:
+                    continue  # 再往下走已经不可能在限制内到达终点
+
                 path.append(neighbor)
-                sub_paths = self._dfs(
-                    neighbor,
-                    target,
-                    path,
-                    current_distance + p.distance,
-                    current_duration + p.duration,
-                    visited,
+                visited.add(neighbor)
+                stack.append(
+                    (self.neighbors(neighbor), new_distance, new_duration)
                 )
-                results.extend(sub_paths)  # 收集子路径结果
-                path.pop()  # 回溯
+                advanced = True
+                expanded += 1
+                if (
+                    should_stop is not None
+                    and expanded % STOP_CHECK_INTERVAL == 0
+                    and should_stop({"已扩展景点": expanded})
+                ):
+                    return
+                break
 
-        visited.remove(current)  # 回溯时去掉访问状态
-        return results
+            if not advanced:
+                # 当前节点的邻居都已尝试过，回溯
+                stack.pop()
+                visited.discard(path.pop())
 
     def find_all_paths(
-        self, start_id: int, target_id: int
+        self,
+        start_id: int,
+        target_id: int,
+        max_paths: int | None = None,
+        max_depth: int | None = None,
+        workers: int = 1,
     ) -> List[Tuple[int, int, List[int]]]:
         """
         利用 DFS 算法求从起点到终点的所有路径
 
         :param start_id(int): 起始景点索引
         :param target_id(int): 目标景点索引
+        :param max_paths(int | None): 最多返回的路径条数，None 表示不限制
+        :param max_depth(int | None): 路径最多包含的道路条数，None 表示不限制
+        :param workers(int): 并行枚举的进程数，1 表示在当前进程中搜索，0 表示使用全部 CPU 核心
         :return: 所有路径的列表，每条路径包含 (总距离, 总时间, 路径经过的景点索引列表)
         """
-        if not self._is_valid_node(start_id):
-            raise SpotIdInvalidError(start_id)
-        if not self._is_valid_node(target_id):
-            raise SpotIdInvalidError(target_id)
-
-        result = self._dfs(
-            start_id,
-            target_id,
-            path=[start_id],
-            current_distance=0,
-            current_duration=0,
-            visited=set(),
-        )
-        return result
+        if workers == 1:
+            paths = self.iter_all_paths(start_id, target_id, max_depth=max_depth)
+        else:
+            paths = iter_all_paths_parallel(
+                self, start_id, target_id, max_depth=max_depth, workers=workers or None
+            )
+        # 取够数量后立即关闭生成器，并行模式下会同时结束工作进程
+        with closing(paths):
+            return list(islice(paths, max_paths))
 
     def tsp(
         self,
@@ -344,6 +1435,7 @@ class TourGraph(BaseModel):
         target_id: int,
         must_pass: List[int],
         weight_type: Literal["distance", "duration"],
+        should_stop: StopCheck | None = None,
     ) -> Tuple[int, List[int]]:
         """
         贪心算法解决旅行商问题
@@ -353,6 +1445,8 @@ class TourGraph(BaseModel):
         :param target_id(int): 目标景点索引
         :param must_pass(List[int]): 必须经过的景点索引列表
         :param weight_type(Literal['distance', 'duration']): 权重类型
+        :param should_stop(StopCheck | None): 每次选择下一个必经景点之前调用，返回 True 时立即返回目前为止的路线，
+            这条路线还没有经过剩下的必经景点，也没有到达终点
         :return: 最短路径的总权重和路径经过的景点索引列表
         """
         if not self._is_valid_node(start_id):
@@ -363,12 +1457,19 @@ class TourGraph(BaseModel):
         if weight_type not in ["distance", "duration"]:
             raise StandardInvalidError("weight_type must be 'distance' or 'duration'")
 
+        # 如果维护了距离矩阵，候选点的距离直接查表，只为选中的那一段还原路径
+        matrix = self._distance_matrices.get(weight_type)
+
         # 构建必须访问的节点列表
         to_visit = set()
         for pid in must_pass:
             if self._is_valid_node(pid) and pid != start_id and pid != target_id:
                 to_visit.add(pid)
 
+        # 终点或任何一个必经点与起点不连通时无解，不需要逐个尝试
+        if not all(self.connected(start_id, pid) for pid in (target_id, *to_visit)):
+            return -1, []
+
         current_node = start_id
         total_cost = 0
         full_path: List[int] = []
@@ -376,24 +1477,40 @@ class TourGraph(BaseModel):
         full_path.append(start_id)  # 加入起点
 
         # 寻找未访问过的节点
+        total_stops = len(to_visit)
         while to_visit:
+            if should_stop is not None and should_stop(
+                {"已确定的必经景点": total_stops - len(to_visit), "必经景点数": total_stops}
+            ):
+                return total_cost, full_path
             best_next_node = -1
             min_dist = float("inf")
-            best_segment_path = []
 
+            # 没有距离矩阵时，从当前位置求一棵最短路径树即可得到到所有候选点的距离
+            tree = (
+                None
+                if matrix is not None
+                else self._cached_tree(current_node, weight_type, always=True)
+            )
             for candidate in to_visit:
                 # 找距离当前位置最近的必经点
-                dist, path = self.dijkstra(current_node, candidate, weight_type)
+                if matrix is not None:
+                    dist = matrix.distance(current_node, candidate)
+                else:
+                    dist = tree[0].get(candidate, -1)
 
                 # 连通且距离短
                 if dist != -1 and dist < min_dist:
                     min_dist = dist
                     best_next_node = candidate
-                    best_segment_path = path
 
             # 不连通
             if best_next_node == -1:
                 return -1, []
+            if matrix is not None:
+                best_segment_path = matrix.path(current_node, best_next_node)
+            else:
+                best_segment_path = _trace(tree, best_next_node)[1]
 
             # 累加距离
             total_cost += int(min_dist)
@@ -409,7 +1526,13 @@ class TourGraph(BaseModel):
             to_visit.remove(current_node)
 
         # 从当前点前往终点
-        dist_to_end, path_to_end = self.dijkstra(current_node, target_id, weight_type)
+        if matrix is not None:
+            dist_to_end = matrix.distance(current_node, target_id)
+            path_to_end = matrix.path(current_node, target_id)
+        else:
+            dist_to_end, path_to_end = self.dijkstra(
+                current_node, target_id, weight_type
+            )
 
         if dist_to_end == -1:
             return -1, []
@@ -423,6 +1546,119 @@ class TourGraph(BaseModel):
 
         return total_cost, full_path
 
+    def _tree_to_targets(
+        self,
+        start_id: int,
+        targets: set,
+        weight_type: Literal["distance", "duration"],
+    ) -> Tuple[Dict[int, int], Dict[int, int | None]]:
+        """
+        与 shortest_path_tree 相同，但所有目标景点的最短距离都确定之后就停止
+        只有目标景点及其最短路径上的景点的距离和前驱是最终结果
+
+        :param start_id(int): 起始景点索引
+        :param targets(set): 目标景点索引集合
+        :param weight_type(Literal['distance', 'duration']): 权重类型
+        :return: 最短距离与前驱景点
+        """
+        tree = path_trees.get(
+            self._uid,
+            start_id,
+            weight_type,
+            self._revision,
+            self._routes_unchanged_since,
+        )
+        if tree is not None:
+            return tree
+
+        return self._search(start_id, weight_type, targets=targets)
+
+    def optimize_tour(
+        self,
+        start_id: int,
+        target_id: int,
+        must_pass: List[int],
+        weight_type: Literal["distance", "duration"],
+        time_budget: float = 1.0,
+        seed: int | None = 0,
+        should_stop: StopCheck | None = None,
+    ) -> Tuple[int, List[int], Dict[str, object]]:
+        """
+        适合几十到几百个必经景点的路线规划，在时间预算内尽量改进贪心路线
+        先求出起点、终点和所有必经景点两两之间的最短距离表，再用 2-opt、Or-opt 和模拟退火在表上优化访问顺序，
+        时间用完时返回目前为止最好的路线，因此预算越长结果越好，但不保证是最优解
+
+        :param start_id(int): 起始景点索引
+        :param target_id(int): 目标景点索引
+        :param must_pass(List[int]): 必须经过的景点索引列表
+        :param weight_type(Literal['distance', 'duration']): 权重类型
+        :param time_budget(float): 包括求距离表在内的总秒数
+        :param seed(int | None): 随机数种子
+        :param should_stop(StopCheck | None): 求距离表时每一行、优化时每次扰动之前调用，返回 True 时提前结束：
+            距离表还没有求完时按无解返回，求完之后返回目前为止最好的路线
+        :return: 总权重、路径经过的景点索引列表以及优化报告，无解时总权重为 -1、路径为空
+        """
+        started = time.perf_counter()
+        if not self._is_valid_node(start_id):
+            raise SpotIdInvalidError(start_id)
+        if not self._is_valid_node(target_id):
+            raise SpotIdInvalidError(target_id)
+        if weight_type not in ["distance", "duration"]:
+            raise StandardInvalidError(weight_type)
+
+        stops = []
+        for pid in dict.fromkeys(must_pass):
+            if self._is_valid_node(pid) and pid != start_id and pid != target_id:
+                stops.append(pid)
+        if not all(self.connected(start_id, pid) for pid in (target_id, *stops)):
+            return -1, [], {"必经景点数": len(stops)}
+
+        # 距离表中 0 为起点，1 为终点，起点和终点相同时也各占一行
+        nodes = [start_id, target_id] + stops
+        size = len(nodes)
+        table: List[List[float]] = [[0] * size for _ in range(size)]
+        matrix = self._distance_matrices.get(weight_type)
+        trees: Dict[int, Dict[int, int | None]] = {}
+        for i in range(size):
+            if should_stop is not None and should_stop(
+                {"已求出的距离表行数": i, "距离表行数": size}
+            ):
+                return -1, [], {"必经景点数": len(stops), "已停止": True}
+            if matrix is not None:
+                for j in range(i + 1, size):
+                    table[i][j] = table[j][i] = matrix.distance(nodes[i], nodes[j])
+                continue
+            # 无向图的距离表是对称的，每一行只需要求到后面的景点的距离
+            weights, previous_nodes = self._tree_to_targets(
+                nodes[i], set(nodes[i + 1 :]), weight_type
+            )
+            trees[i] = previous_nodes
+            for j in range(i + 1, size):
+                table[i][j] = table[j][i] = weights[nodes[j]]
+        table_ms = (time.perf_counter() - started) * 1000
+
+        optimizer = TourOptimizer(table, greedy_tour(table, list(range(2, size))), seed)
+        remaining = time_budget - (time.perf_counter() - started)
+        if should_stop is not None and should_stop(
+            {"已求出的距离表行数": size, "距离表行数": size}
+        ):
+            remaining = 0.0  # 距离表已经求完，直接返回贪心路线
+        tour = optimizer.run(max(remaining, 0.0), should_stop)
+
+        full_path = [start_id]
+        for a, b in zip(tour, tour[1:]):
+            if matrix is not None:
+                segment = matrix.path(nodes[a], nodes[b])
+            elif a < b:
+                segment = _trace_path(trees[a], nodes[b])
+            else:
+                segment = _trace_path(trees[b], nodes[a])[::-1]
+            full_path.extend(segment[1:])
+
+        report = {"必经景点数": len(stops), "求距离表耗时 (ms)": round(table_ms, 1)}
+        report.update(optimizer.report())
+        return int(optimizer.best_cost), full_path, report
+
     def find_spot_by_name(self, name: str) -> Spot:
         """
         根据景点名称查找景点
@@ -430,7 +1666,134 @@ class TourGraph(BaseModel):
         :param name(str): 景点名称
         :return: 找到的景点对象
         """
-        for spot in self.spots:
-            if spot.name == name and not spot.deleted:
-                return spot
-        raise SpotNameInvalidError(name)
+        node_id = self._name_index.get(name)
+        if node_id is None:
+            raise SpotNameInvalidError(name)
+        return self.spots[node_id]
+
+    def find_path(self, from_id: int, to_id: int) -> Path | None:
+        """
+        查找两个景点之间的道路
+
+        :param from_id(int): 起始景点索引
+        :param to_id(int): 目标景点索引
+        :return: 两个景点之间未删除的道路，不存在时返回 None
+        """
+        edge_id = self._edge_index.get(_edge_key(from_id, to_id))
+        if edge_id is None:
+            return None
+        return self.edges[edge_id]
+
+    def list_spots(
+        self, keyword: str = "", offset: int = 0, limit: int = 20
+    ) -> Tuple[List[Spot], bool]:
+        """
+        分页列出未删除的景点，可以按名称筛选
+        没有关键字时直接对索引切片，有关键字时先用倒排索引找出名称可能包含关键字的景点，
+        只核对和排序这些候选，不扫描所有景点
+
+        :param keyword(str): 名称中需要包含的关键字，为空时不筛选
+        :param offset(int): 跳过的条目数
+        :param limit(int): 每页条目数
+        :return: 当前页的景点列表，以及之后是否还有更多景点
+        """
+        if not keyword:
+            page = self._live_ids[offset : offset + limit + 1]
+        else:
+            page = heapq.nsmallest(offset + limit + 1, self._name_matches(keyword))[offset:]
+        return [self.spots[node_id] for node_id in page[:limit]], len(page) > limit
+
+    def _name_matches(self, keyword: str) -> Iterator[int]:
+        """
+        :param keyword(str): 关键字
+        :return: 名称包含关键字的未删除景点，顺序不定
+        """
+        candidates = self.search_index().name_candidates(keyword)
+        if candidates is None:
+            candidates = self._live_ids
+        spots = self.spots
+        for node_id in candidates:
+            spot = spots[node_id]
+            if not spot.deleted and keyword in spot.name:
+                yield node_id
+
+    def list_paths(
+        self, keyword: str = "", offset: int = 0, limit: int = 20
+    ) -> Tuple[List[Tuple[Spot, Spot, Path]], bool]:
+        """
+        分页列出两端景点都未删除的道路，可以按任一端的景点名称筛选
+        有关键字时只查看名称包含关键字的景点所连接的道路，按道路索引排列
+
+        :param keyword(str): 景点名称中需要包含的关键字，为空时不筛选
+        :param offset(int): 跳过的条目数
+        :param limit(int): 每页条目数
+        :return: 当前页的 (起始景点, 目标景点, 道路) 列表，以及之后是否还有更多道路
+        """
+        spots = self.spots
+        if not keyword:
+            page = list(islice(self.iter_edges(), offset, offset + limit + 1))
+        else:
+            matched = {
+                edge.id: edge
+                for node_id in self._name_matches(keyword)
+                for _, edge in self.neighbors(node_id)
+            }
+            page = [
+                matched[edge_id]
+                for edge_id in heapq.nsmallest(offset + limit + 1, matched)[offset:]
+            ]
+        result = [
+            (spots[edge.from_id], spots[edge.to_id], edge) for edge in page[:limit]
+        ]
+        return result, len(page) > limit
+
+
+def _trace(
+    tree: Tuple[Dict[int, int], Dict[int, int | None]], target_id: int
+) -> Tuple[int, List[int]]:
+    """
+    沿最短路径树的前驱还原从起点到终点的路径
+
+    :param tree(Tuple[Dict[int, int], Dict[int, int | None]]): 最短距离与前驱景点
+    :param target_id(int): 目标景点索引
+    :return: 最短路径的总权重和路径经过的景点索引列表，不可达返回 (-1, [])
+    """
+    weights, previous_nodes = tree
+    if target_id not in weights:
+        return -1, []
+    return weights[target_id], _trace_path(previous_nodes, target_id)
+
+
+def _trace_path(previous_nodes: Dict[int, int | None], target_id: int) -> List[int]:
+    """
+    :param previous_nodes(Dict[int, int | None]): 最短路径树上的前驱景点
+    :param target_id(int): 树上的目标景点索引
+    :return: 从树根到目标景点经过的景点索引列表
+    """
+    path_sequence = []
+    current_id: int | None = target_id
+    while current_id is not None:
+        path_sequence.append(current_id)
+        current_id = previous_nodes[current_id]
+    return path_sequence[::-1]
+
+
+def _path_fields(edge: Path) -> Dict[str, int]:
+    """
+    :param edge(Path): 道路
+    :return: PathAdded / PathDeleted 事件除修订号以外的字段
+    """
+    return {
+        "path_id": edge.id,
+        "from_id": edge.from_id,
+        "to_id": edge.to_id,
+        "distance": edge.distance,
+        "duration": edge.duration,
+    }
+
+
+def _edge_key(from_id: int, to_id: int) -> Tuple[int, int]:
+    """
+    无向道路的规范键，两端景点索引按从小到大排列
+    """
+    return (from_id, to_id) if from_id < to_id else (to_id, from_id)
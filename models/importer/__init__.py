@@ -0,0 +1,302 @@
+"""
+从 CSV / JSON 批量导入景点和道路
+
+每条记录是一个景点或者一条道路，支持的字段：
+
+    type         记录类型，spot / path，缺省时根据是否有 from 字段判断
+    name         景点名称（spot）
+    description  景点简介（spot），可选
+    x, y         景点坐标（spot），可选，必须同时给出，单位与道路距离相同
+    from         道路一端的景点名称（path）
+    to           道路另一端的景点名称（path）
+    distance     道路距离（path），正整数
+    duration     所需时间（path），正整数
+
+道路两端可以是图中已有的景点，也可以是同一批导入的景点，与记录的先后顺序无关
+"""
+
+from __future__ import annotations
+
+import csv
+import json
+import math
+
+from pydantic import BaseModel, Field
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Set,
+    TextIO,
+    Tuple,
+)
+
+if TYPE_CHECKING:
+    from models.graph import TourGraph
+
+__all__ = [
+    "FORMATS",
+    "ImportRowError",
+    "ImportReport",
+    "detect_format",
+    "read_records",
+    "import_records",
+]
+
+FORMATS = ("csv", "jsonl", "json")
+
+# (行号, 记录)，无法解析的记录为错误信息字符串
+Record = Tuple[int, Dict[str, Any] | str]
+
+
+class ImportRowError(BaseModel):
+    """
+    导入时被拒绝的一条记录
+
+    :param line(int): 记录所在的行号，JSON 文件中为记录的序号
+    :param message(str): 拒绝的原因
+    """
+
+    line: int = Field(..., description="记录所在的行号")
+    message: str = Field(..., description="拒绝的原因")
+
+
+class ImportReport(BaseModel):
+    """
+    批量导入的结果
+
+    :param spots_added(int): 新增的景点数量
+    :param paths_added(int): 新增的道路数量
+    :param errors(List[ImportRowError]): 所有被拒绝的记录
+    :param applied(bool): 是否已经写入图中，严格模式下存在错误时不会写入
+    """
+
+    spots_added: int = Field(default=0, description="新增的景点数量")
+    paths_added: int = Field(default=0, description="新增的道路数量")
+    errors: List[ImportRowError] = Field(default_factory=list, description="被拒绝的记录")
+    applied: bool = Field(default=False, description="是否已经写入图中")
+
+
+def detect_format(filename: str) -> str:
+    """
+    根据文件扩展名判断记录格式，无法判断时按 JSON Lines 处理
+
+    :param filename(str): 文件名
+    :return: csv / json / jsonl
+    """
+    lower = filename.lower()
+    if lower.endswith(".csv"):
+        return "csv"
+    if lower.endswith(".json"):
+        return "json"
+    return "jsonl"
+
+
+def read_records(stream: TextIO, fmt: str) -> Iterator[Record]:
+    """
+    从输入流中逐条读取记录，CSV 与 JSON Lines 不会一次性读入整个文件
+
+    JSON 格式可以是记录数组，也可以是 {"spots": [...], "paths": [...]}
+
+    :param stream(TextIO): 输入流
+    :param fmt(str): 输入格式，csv / jsonl / json
+    :return: 逐条产出 (行号, 记录字典或错误信息)
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            record = {
+                k.strip(): v.strip()
+                for k, v in row.items()
+                if k is not None and isinstance(v, str) and v.strip() != ""
+            }
+            yield reader.line_num, record
+        return
+
+    if fmt == "json":
+        try:
+            document = json.load(stream)
+        except json.JSONDecodeError as e:
+            yield e.lineno, f"无法解析的 JSON: {e}"
+            return
+        if isinstance(document, dict):
+            items = [
+                {"type": kind, **item} if isinstance(item, dict) else item
+                for kind, key in (("spot", "spots"), ("path", "paths"))
+                for item in document.get(key) or []
+            ]
+        elif isinstance(document, list):
+            items = document
+        else:
+            yield 1, "JSON 文件必须是记录数组或者包含 spots / paths 的对象"
+            return
+        for index, item in enumerate(items, start=1):
+            yield index, item if isinstance(item, dict) else "记录必须是 JSON 对象"
+        return
+
+    for index, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield index, f"无法解析的记录: {e}"
+            continue
+        yield index, record if isinstance(record, dict) else "记录必须是 JSON 对象"
+
+
+def _positive_int(record: Dict[str, Any], key: str) -> int:
+    value = record.get(key)
+    if value is None:
+        raise ValueError(f"缺少字段 {key}")
+    try:
+        number = int(str(value).strip())
+    except ValueError:
+        raise ValueError(f"字段 {key} 必须是整数，而不是 {value!r}")
+    if number < 1:
+        raise ValueError(f"字段 {key} 必须是正整数，而不是 {number}")
+    return number
+
+
+def _position(record: Dict[str, Any]) -> Tuple[float, float] | None:
+    # CSV 中没有填写的列是空字符串，与没有这个字段相同
+    values = [record.get(key) for key in ("x", "y")]
+    values = [None if str(value or "").strip() == "" else value for value in values]
+    if values == [None, None]:
+        return None
+    if None in values:
+        raise ValueError("坐标 x 和 y 必须同时给出")
+    try:
+        x, y = (float(str(value).strip()) for value in values)
+    except ValueError:
+        raise ValueError(f"坐标必须是数字，而不是 {values[0]!r}, {values[1]!r}")
+    if not (math.isfinite(x) and math.isfinite(y)):
+        raise ValueError("坐标必须是有限的数字")
+    return x, y
+
+
+def import_records(
+    graph: TourGraph, records: Iterable[Record], strict: bool = False
+) -> ImportReport:
+    """
+    校验并导入一批记录
+
+    只扫描一遍记录，用哈希表检查重名和重复道路，每条无效记录都会被报告而不会中断导入。
+    全部校验完成后通过 TourGraph.bulk_add 一次性写入，整体为 O(V + E)。
+    读取和解析记录不持有图的写锁；与图中已有景点和道路的比较、分配索引直到写入都在写锁中进行，
+    期间其他会话添加的景点不会让预先分配的索引错位。本函数不会保存文件，由调用方在导入后保存一次
+
+    :param graph(TourGraph): 导入到的图
+    :param records(Iterable[Record]): read_records 产出的记录
+    :param strict(bool): 为 True 时只要存在无效记录就不导入任何数据
+    :return: 导入结果
+    """
+    report = ImportReport()
+    # 先只解析记录，暂存 (行号, 名称, 简介, 坐标)
+    pending_spots: List[Tuple[int, str, str, Tuple[float, float] | None]] = []
+    # 道路要等所有景点读完才能解析名称，先暂存 (行号, 一端名称, 另一端名称, 距离, 时间)
+    pending_paths: List[Tuple[int, str, str, int, int]] = []
+
+    for line, record in records:
+        if isinstance(record, str):
+            report.errors.append(ImportRowError(line=line, message=record))
+            continue
+        kind = record.get("type") or ("path" if "from" in record else "spot")
+        kind = str(kind).strip()
+        try:
+            if kind == "spot":
+                name = str(record.get("name") or "").strip()
+                if not name:
+                    raise ValueError("景点名称不能为空")
+                position = _position(record)
+                pending_spots.append(
+                    (line, name, str(record.get("description") or "").strip(), position)
+                )
+            elif kind == "path":
+                from_name = str(record.get("from") or "").strip()
+                to_name = str(record.get("to") or "").strip()
+                if not from_name or not to_name:
+                    raise ValueError("道路必须给出 from 和 to 两端的景点名称")
+                if from_name == to_name:
+                    raise ValueError("道路两端不能是同一个景点")
+                pending_paths.append(
+                    (
+                        line,
+                        from_name,
+                        to_name,
+                        _positive_int(record, "distance"),
+                        _positive_int(record, "duration"),
+                    )
+                )
+            else:
+                raise ValueError(f"未知的记录类型 {kind}，必须为 spot 或者 path")
+        except ValueError as e:
+            report.errors.append(ImportRowError(line=line, message=str(e)))
+
+    with graph._write_lock:
+        _apply(graph, pending_spots, pending_paths, report, strict)
+    return report
+
+
+def _apply(
+    graph: TourGraph,
+    pending_spots: List[Tuple[int, str, str, Tuple[float, float] | None]],
+    pending_paths: List[Tuple[int, str, str, int, int]],
+    report: ImportReport,
+    strict: bool,
+) -> None:
+    """
+    对照图中已有的景点和道路校验解析好的记录并写入，调用方持有图的写锁
+
+    :param graph(TourGraph): 导入到的图
+    :param pending_spots(List[Tuple]): 解析好的景点 (行号, 名称, 简介, 坐标)
+    :param pending_paths(List[Tuple]): 解析好的道路 (行号, 一端名称, 另一端名称, 距离, 时间)
+    :param report(ImportReport): 导入结果，无效记录追加到其中
+    :param strict(bool): 为 True 时只要存在无效记录就不导入任何数据
+    """
+    # 本批新增的景点名称 -> 景点索引，图中已有的景点直接查图的名称索引
+    new_names: Dict[str, int] = {}
+    new_spots: List[Tuple[str, str, Tuple[float, float] | None]] = []
+    for line, name, description, position in pending_spots:
+        if name in new_names or name in graph._name_index:
+            message = f"景点名称 {name} 已存在，不能重复添加"
+            report.errors.append(ImportRowError(line=line, message=message))
+            continue
+        new_names[name] = graph.nodes + len(new_spots)
+        new_spots.append((name, description, position))
+
+    def spot_id(name: str) -> int | None:
+        node_id = new_names.get(name)
+        return graph._name_index.get(name) if node_id is None else node_id
+
+    new_keys: Set[Tuple[int, int]] = set()
+    new_paths: List[Tuple[int, int, int, int]] = []
+    for line, from_name, to_name, distance, duration in pending_paths:
+        from_id, to_id = spot_id(from_name), spot_id(to_name)
+        missing = [
+            name for name, node_id in ((from_name, from_id), (to_name, to_id)) if node_id is None
+        ]
+        if missing:
+            message = f"景点名称 {'、'.join(missing)} 不存在"
+            report.errors.append(ImportRowError(line=line, message=message))
+            continue
+        key = (from_id, to_id) if from_id < to_id else (to_id, from_id)
+        if key in new_keys or key in graph._edge_index:
+            message = f"{from_name} 和 {to_name} 之间的道路已存在，不能重复添加"
+            report.errors.append(ImportRowError(line=line, message=message))
+            continue
+        new_keys.add(key)
+        new_paths.append((from_id, to_id, distance, duration))
+
+    report.errors.sort(key=lambda error: error.line)
+    report.spots_added = len(new_spots)
+    report.paths_added = len(new_paths)
+    if strict and report.errors:
+        return
+    if new_spots or new_paths:
+        graph.bulk_add(new_spots, new_paths)
+    report.applied = True
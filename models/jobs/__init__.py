@@ -0,0 +1,361 @@
+from __future__ import annotations
+
+import heapq
+import os
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from itertools import count
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Literal
+
+from exceptions import JobQueueFullError
+
+if TYPE_CHECKING:
+    from models.graph import TourGraph
+
+__all__ = [
+    "Job",
+    "JobManager",
+    "jobs",
+    "all_paths_job",
+    "tour_job",
+    "DEFAULT_TIMEOUT",
+    "MAX_TIMEOUT",
+]
+
+# 查询默认的超时秒数，以及页面上允许设置的最大值
+DEFAULT_TIMEOUT = 30
+MAX_TIMEOUT = 300
+# 每个执行线程最多对应的排队和执行中的查询数，超出时拒绝新的查询
+PENDING_PER_WORKER = 8
+# 结束的查询在管理器中保留的秒数，之后页面再也拿不到它的结果
+RETAIN_SECONDS = 600
+# 查询每执行这么多秒就在 checkpoint 中主动让出一次 GIL，
+# 让等待中的页面脚本线程优先运行；实测单个后台查询让其他页面变慢的倍数从约 1.75 降到约 1.2 ~ 1.3
+YIELD_INTERVAL = 0.002
+
+QUEUED = "排队中"
+RUNNING = "运行中"
+DONE = "已完成"
+CANCELLED = "已取消"
+TIMED_OUT = "已超时"
+FAILED = "失败"
+# 提前停止的查询仍然有结果，只是不完整
+STOPPED = (CANCELLED, TIMED_OUT)
+
+
+class Job:
+    """
+    一次在后台线程中执行的耗时查询
+
+    查询函数以 Job 为参数，执行过程中定期调用 checkpoint 报告进度；
+    用户取消或者超时之后 checkpoint 返回 True，查询函数应当尽快返回目前为止的结果，
+    因此被取消和超时的查询也有（不完整的）结果
+    """
+
+    def __init__(
+        self,
+        job_id: int,
+        kind: str,
+        func: Callable[[Job], Any],
+        timeout: float,
+        params: Dict[str, Any] | None = None,
+    ) -> None:
+        """
+        :param job_id(int): 查询编号
+        :param kind(str): 查询类型，用于显示
+        :param func(Callable[[Job], Any]): 查询函数，返回值作为查询结果
+        :param timeout(float): 从开始执行算起的超时秒数，排队的时间不计算在内
+        :param params(Dict[str, Any] | None): 页面显示结果时需要的查询参数
+        """
+        self.id = job_id
+        self.kind = kind
+        self.timeout = timeout
+        self.params = params or {}
+        self.status = QUEUED
+        self.progress: Dict[str, object] = {}
+        self.result: Any = None
+        self.error: str | None = None
+        self.created_at = time.time()
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+        self._func = func
+        self._deadline: float | None = None
+        self._last_yield = 0.0
+        self._timed_out = False
+        self._cancel = threading.Event()
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    @property
+    def stopped(self) -> bool:
+        """
+        :return: 查询是否被取消或超时，此时结果不完整
+        """
+        return self.status in STOPPED
+
+    @property
+    def elapsed(self) -> float:
+        """
+        :return: 已经执行的秒数，还在排队时为 0
+        """
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def cancel(self) -> None:
+        """
+        请求取消查询，立即返回；还在排队的查询不会再执行
+        """
+        self._cancel.set()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """
+        :param timeout(float | None): 最多等待的秒数
+        :return: 查询是否已经结束
+        """
+        return self._done.wait(timeout)
+
+    def checkpoint(self, progress: Dict[str, object] | None = None) -> bool:
+        """
+        由查询函数定期调用
+
+        :param progress(Dict[str, object] | None): 要更新的进度
+        :return: 是否应当停止
+        """
+        if progress:
+            with self._lock:
+                self.progress.update(progress)
+        now = time.monotonic()
+        if now - self._last_yield > YIELD_INTERVAL:
+            # 后台查询与页面脚本共用一个 GIL，主动让出，其他游客的页面不必等到解释器强制切换
+            time.sleep(0)
+            self._last_yield = time.monotonic()
+        if self._cancel.is_set():
+            return True
+        if self._deadline is not None and now > self._deadline:
+            self._timed_out = True
+            return True
+        return False
+
+    def snapshot(self) -> Dict[str, object]:
+        """
+        :return: 用于显示的查询状态，不包括结果
+        """
+        with self._lock:
+            progress = dict(self.progress)
+        return {
+            "编号": self.id,
+            "类型": self.kind,
+            "状态": self.status,
+            "已执行 (秒)": round(self.elapsed, 1),
+            "超时 (秒)": self.timeout,
+            "进度": progress,
+        }
+
+    def _run(self) -> None:
+        if self._cancel.is_set():
+            self.status = CANCELLED
+            self.finished_at = time.time()
+            self._done.set()
+            return
+        self.started_at = time.time()
+        self._deadline = time.monotonic() + self.timeout
+        self.status = RUNNING
+        try:
+            self.result = self._func(self)
+        except Exception as e:
+            self.error = str(e)
+            self.status = FAILED
+        else:
+            if self._cancel.is_set():
+                self.status = CANCELLED
+            elif self._timed_out:
+                self.status = TIMED_OUT
+            else:
+                self.status = DONE
+        finally:
+            self.finished_at = time.time()
+            self._done.set()
+
+
+class JobManager:
+    """
+    所有会话共享的后台查询执行器
+
+    查询在固定数量的线程中执行，同一时间最多只有 workers 个耗时查询在运行，其余的排队，
+    一个游客的大查询不会占满所有资源，也不会阻塞其他游客的页面；
+    排队和执行中的查询总数有上限，超出时直接拒绝
+    """
+
+    def __init__(self, workers: int) -> None:
+        """
+        :param workers(int): 执行线程数
+        """
+        self.workers = max(workers, 1)
+        self.max_pending = self.workers * PENDING_PER_WORKER
+        self._executor: ThreadPoolExecutor | None = None
+        self._jobs: Dict[int, Job] = {}
+        self._ids = count(1)
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.rejected = 0
+
+    def submit(
+        self,
+        kind: str,
+        func: Callable[[Job], Any],
+        timeout: float = DEFAULT_TIMEOUT,
+        params: Dict[str, Any] | None = None,
+    ) -> Job:
+        """
+        提交一个查询，立即返回
+
+        :param kind(str): 查询类型，用于显示
+        :param func(Callable[[Job], Any]): 查询函数
+        :param timeout(float): 超时秒数
+        :param params(Dict[str, Any] | None): 页面显示结果时需要的查询参数
+        :return: 查询
+        """
+        with self._lock:
+            self._purge()
+            pending = sum(not job.done for job in self._jobs.values())
+            if pending >= self.max_pending:
+                self.rejected += 1
+                raise JobQueueFullError(self.max_pending)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="query-job"
+                )
+            job = Job(next(self._ids), kind, func, timeout, params)
+            self._jobs[job.id] = job
+            self.submitted += 1
+            self._executor.submit(job._run)
+        return job
+
+    def get(self, job_id: int | None) -> Job | None:
+        """
+        :param job_id(int | None): 查询编号
+        :return: 查询，不存在或已经过了保留时间时返回 None
+        """
+        if job_id is None:
+            return None
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _purge(self) -> None:
+        expired = time.time() - RETAIN_SECONDS
+        for job_id in [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.done and job.finished_at < expired
+        ]:
+            del self._jobs[job_id]
+
+    def entries(self) -> List[Dict[str, object]]:
+        """
+        :return: 保留中的所有查询的状态，最新的在前
+        """
+        with self._lock:
+            current = list(self._jobs.values())
+        return [job.snapshot() for job in reversed(current)]
+
+    def stats(self) -> Dict[str, object]:
+        """
+        :return: 各状态的查询数以及提交和拒绝的次数
+        """
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {
+            "执行线程数": self.workers,
+            "排队与执行上限": self.max_pending,
+            **{
+                status: statuses.count(status)
+                for status in (QUEUED, RUNNING, DONE, CANCELLED, TIMED_OUT, FAILED)
+            },
+            "累计提交": self.submitted,
+            "拒绝": self.rejected,
+        }
+
+
+def all_paths_job(
+    graph: TourGraph,
+    start_id: int,
+    target_id: int,
+    keep: int,
+    max_paths: int | None = None,
+    max_depth: int | None = None,
+) -> Callable[[Job], tuple]:
+    """
+    路径可能有成千上万条，查询只保留总距离最短的 keep 条，其余的只计数，
+    内存占用不随找到的路径数增长
+
+    :param keep(int): 保留的路径数
+    :param max_paths(int | None): 最多枚举的路径数
+    :param max_depth(int | None): 路径最多经过的边数
+    :return: 枚举所有简单路径的查询函数，返回 (找到的路径总数, 按总距离排序的最短 keep 条路径)，
+        停止时返回已经找到的部分
+    """
+
+    def run(job: Job) -> tuple:
+        total = 0
+        # 以 (-总距离, -序号) 为键的大根堆，堆顶是保留的路径中最长的；距离相同时保留先找到的
+        shortest: List[tuple] = []
+        paths = graph.iter_all_paths(
+            start_id, target_id, max_depth=max_depth, should_stop=job.checkpoint
+        )
+        with closing(paths):
+            for path in paths:
+                total += 1
+                entry = (-path[0], -total, path)
+                if len(shortest) < keep:
+                    heapq.heappush(shortest, entry)
+                elif entry > shortest[0]:
+                    heapq.heapreplace(shortest, entry)
+                if job.checkpoint({"已找到路径": total}) or total == max_paths:
+                    break
+        return total, [path for *_, path in sorted(shortest, reverse=True)]
+
+    return run
+
+
+def tour_job(
+    graph: TourGraph,
+    start_id: int,
+    target_id: int,
+    must_pass: List[int],
+    weight_type: Literal["distance", "duration"],
+    time_budget: float | None = None,
+) -> Callable[[Job], tuple]:
+    """
+    :param time_budget(float | None): 优化路线的秒数，None 表示只用贪心算法
+    :return: 规划游览路线的查询函数，返回 (总权重, 路径, 优化报告)，只用贪心算法时报告为 None
+    """
+
+    def run(job: Job) -> tuple:
+        if time_budget is None:
+            return (
+                *graph.tsp(
+                    start_id, target_id, must_pass, weight_type, should_stop=job.checkpoint
+                ),
+                None,
+            )
+        return graph.optimize_tour(
+            start_id,
+            target_id,
+            must_pass,
+            weight_type,
+            time_budget=time_budget,
+            should_stop=job.checkpoint,
+        )
+
+    return run
+
+
+jobs = JobManager(workers=int(os.environ.get("SCENIC_QUERY_WORKERS", "2")))
@@ -0,0 +1,589 @@
+from __future__ import annotations
+
+import os
+import random
+import threading
+import time
+import traceback
+
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, Tuple
+
+from context import get_workdir
+from models.graph import TourGraph
+from models.jobs import jobs
+
+if TYPE_CHECKING:
+    from streamlit.testing.v1 import AppTest
+
+    from models.data import ApplicationData
+
+__all__ = ["generate_graph", "percentile", "ContentionProbe", "LoadTest"]
+
+# 页面标题与脚本路径，标题与 pages/__init__.py 中一致
+PAGES = {
+    "查询景点": "pages/guest/find_spot.py",
+    "查询最短路径": "pages/guest/find_shortest_path.py",
+    "游览路线规划": "pages/guest/get_plan.py",
+    "修改道路": "pages/admin/modify_path.py",
+    "修改景点": "pages/admin/modify_spot.py",
+}
+# 每种会话中各个操作被选中的相对权重
+GUEST_MIX = {"查询景点": 4, "查询最短路径": 4, "游览路线规划": 2}
+ADMIN_MIX = {"修改道路": 3, "修改景点": 1}
+# 规划路线时随机选择的必经景点数
+PLAN_STOPS = 5
+
+# 页面中会用到的图方法，统计它们在多个会话之间的重叠情况
+READ_METHODS = (
+    "find_spot_by_name",
+    "find_path",
+    "neighbors",
+    "description",
+    "search",
+    "list_paths",
+    "dijkstra",
+    "tsp",
+    "optimize_tour",
+    # 后台保存在写入线程中序列化整个图
+    "model_dump_json",
+)
+WRITE_METHODS = (
+    "modify_node",
+    "modify_path",
+    "add_node",
+    "add_path",
+    "delete_node",
+    "delete_path",
+)
+
+_AREAS = ["东区", "西区", "南区", "北区", "湖畔", "山顶", "林间", "河谷"]
+_FEATURES = ["古树", "石桥", "瀑布", "花海", "观景台", "古塔", "竹林", "温泉"]
+
+
+def generate_graph(spots: int, degree: int = 3, seed: int = 0) -> TourGraph:
+    """
+    生成一个连通的随机景区，用于压力测试
+
+    相邻编号的景点之间一定有道路，保证所有景点连通，其余道路随机连接编号相近的景点，
+    使最短路径的长度与真实景区相近，而不是几步就能到达任何地方
+
+    :param spots(int): 景点数量
+    :param degree(int): 平均每个景点连接的道路数
+    :param seed(int): 随机数种子
+    :return: 生成的图
+    """
+    rng = random.Random(seed)
+    names = [
+        (
+            f"景点{i:05d}",
+            f"位于{rng.choice(_AREAS)}，以{rng.choice(_FEATURES)}和{rng.choice(_FEATURES)}闻名",
+        )
+        for i in range(spots)
+    ]
+    pairs = {(i, i + 1) for i in range(spots - 1)}
+    span = max(int(spots**0.5), 2)
+    target = max(spots * degree // 2, len(pairs))
+    attempts = 0
+    while len(pairs) < target and attempts < target * 10:
+        attempts += 1
+        a = rng.randrange(spots)
+        b = min(max(a + rng.randint(-span, span), 0), spots - 1)
+        if a != b:
+            pairs.add((min(a, b), max(a, b)))
+    paths = [
+        (a, b, rng.randint(50, 1500), rng.randint(1, 30)) for a, b in sorted(pairs)
+    ]
+    graph = TourGraph(spots=[])
+    graph.bulk_add(names, paths)
+    return graph
+
+
+def percentile(samples: List[float], q: float) -> float | None:
+    """
+    最近秩法求百分位数
+
+    :param samples(List[float]): 已排序的样本
+    :param q(float): 百分位，0 到 100
+    :return: 百分位数，没有样本时返回 None
+    """
+    if not samples:
+        return None
+    rank = max(int(len(samples) * q / 100 + 0.999999) - 1, 0)
+    return samples[min(rank, len(samples) - 1)]
+
+
+def _summary(samples: List[float]) -> Dict[str, float | None]:
+    samples = sorted(samples)
+    return {
+        "p50 (ms)": _round(percentile(samples, 50)),
+        "p95 (ms)": _round(percentile(samples, 95)),
+        "p99 (ms)": _round(percentile(samples, 99)),
+        "最大 (ms)": _round(samples[-1] if samples else None),
+    }
+
+
+def _round(value: float | None) -> float | None:
+    return None if value is None else round(value, 2)
+
+
+@contextmanager
+def _shared_runtime() -> Iterator[None]:
+    """
+    AppTest 每次执行结束时都会把全局的 Runtime 实例置空，多个会话并发执行时，
+    其他还在执行的页面会找不到 Runtime。测试期间让 Runtime 退回到最近一次创建的实例
+    """
+    from streamlit.runtime.runtime import Runtime
+
+    original_instance = Runtime.__dict__["instance"]
+    original_exists = Runtime.__dict__["exists"]
+    last: List[Runtime] = []
+
+    def instance(cls) -> Runtime:
+        if cls._instance is not None:
+            last[:] = [cls._instance]
+            return cls._instance
+        if last:
+            return last[0]
+        raise RuntimeError("Runtime hasn't been created!")
+
+    def exists(cls) -> bool:
+        return cls._instance is not None or bool(last)
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(exists)
+    try:
+        yield
+    finally:
+        Runtime.instance = original_instance
+        Runtime.exists = original_exists
+
+
+class ContentionProbe:
+    """
+    统计所有会话对共享的图对象的并发访问
+
+    在测试期间替换 TourGraph 上的读写方法，记录每次调用的耗时，以及调用开始时是否有其他会话正在使用同一个图。
+    图本身没有锁，多个会话的调用只能靠 GIL 交替执行，重叠越多单次调用越慢；
+    读和写重叠说明读者可能看到修改到一半的派生索引。同一线程中的嵌套调用（例如 tsp 内部的 dijkstra）只按最外层计算
+    """
+
+    def __init__(
+        self,
+        reads: Tuple[str, ...] = READ_METHODS,
+        writes: Tuple[str, ...] = WRITE_METHODS,
+    ) -> None:
+        """
+        :param reads(Tuple[str, ...]): 只读的方法名
+        :param writes(Tuple[str, ...]): 会修改图的方法名
+        """
+        self.reads = reads
+        self.writes = writes
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # 方法名 -> 类中原来的属性，不是直接定义在 TourGraph 中的为 None
+        self._originals: Dict[str, object] = {}
+        self._durations: Dict[str, List[float]] = {}
+        self._active_reads = 0
+        self._active_writes = 0
+        self.peak = 0
+        self.overlapped = 0
+        self.reads_during_write = 0
+        self.writes_during_read = 0
+
+    def __enter__(self) -> ContentionProbe:
+        self.install()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.uninstall()
+
+    def install(self) -> None:
+        for name in self.reads + self.writes:
+            self._originals[name] = TourGraph.__dict__.get(name)
+            setattr(
+                TourGraph,
+                name,
+                self._wrap(name, getattr(TourGraph, name), name in self.writes),
+            )
+
+    def uninstall(self) -> None:
+        for name, original in self._originals.items():
+            if original is None:
+                delattr(TourGraph, name)
+            else:
+                setattr(TourGraph, name, original)
+        self._originals.clear()
+
+    def _wrap(self, name: str, func: Callable, write: bool) -> Callable:
+        probe = self
+
+        def wrapper(graph, *args, **kwargs):
+            depth = getattr(probe._local, "depth", 0)
+            if depth:
+                return func(graph, *args, **kwargs)
+            probe._enter(write)
+            probe._local.depth = 1
+            start = time.perf_counter()
+            try:
+                result = func(graph, *args, **kwargs)
+                if name == "neighbors":
+                    # neighbors 是生成器，在这里取完才能计入遍历的耗时
+                    result = iter(list(result))
+                return result
+            finally:
+                elapsed = (time.perf_counter() - start) * 1000
+                probe._local.depth = 0
+                probe._leave(name, write, elapsed)
+
+        wrapper.__name__ = name
+        wrapper.__doc__ = func.__doc__
+        return wrapper
+
+    def _enter(self, write: bool) -> None:
+        with self._lock:
+            if write:
+                if self._active_reads:
+                    self.writes_during_read += 1
+                self._active_writes += 1
+            else:
+                if self._active_writes:
+                    self.reads_during_write += 1
+                self._active_reads += 1
+            in_flight = self._active_reads + self._active_writes
+            if in_flight > 1:
+                self.overlapped += 1
+            self.peak = max(self.peak, in_flight)
+
+    def _leave(self, name: str, write: bool, elapsed: float) -> None:
+        with self._lock:
+            if write:
+                self._active_writes -= 1
+            else:
+                self._active_reads -= 1
+            self._durations.setdefault(name, []).append(elapsed)
+
+    def total_ms(self) -> float:
+        with self._lock:
+            return sum(sum(samples) for samples in self._durations.values())
+
+    def stats(self) -> Dict[str, object]:
+        """
+        :return: 重叠调用的次数、最大并发数以及每个方法的调用次数和耗时分布
+        """
+        with self._lock:
+            calls = sum(len(samples) for samples in self._durations.values())
+            methods = {
+                name: {
+                    "调用次数": len(samples),
+                    "总耗时 (ms)": round(sum(samples), 1),
+                    **_summary(samples),
+                }
+                for name, samples in sorted(
+                    self._durations.items(), key=lambda item: -sum(item[1])
+                )
+            }
+            return {
+                "调用次数": calls,
+                "与其他会话重叠的调用": self.overlapped,
+                "重叠比例": round(self.overlapped / calls, 3) if calls else None,
+                "最大并发调用数": self.peak,
+                "写入期间开始的读取": self.reads_during_write,
+                "读取期间开始的写入": self.writes_during_read,
+                "各方法": methods,
+            }
+
+
+class _Session:
+    """
+    一个模拟的浏览器会话，每个页面各自持有一个 AppTest，会话状态在多次操作之间保留
+    """
+
+    def __init__(self, kind: str, index: int, seed: int) -> None:
+        self.kind = kind
+        self.mix = GUEST_MIX if kind == "guest" else ADMIN_MIX
+        self.random = random.Random(f"{seed}-{kind}-{index}")
+        self.apps: Dict[str, AppTest] = {}
+
+
+class LoadTest:
+    """
+    在进程内模拟多个并发的 Streamlit 会话，对真实页面施加压力
+
+    每个会话是一个线程，通过 streamlit.testing 的 AppTest 按脚本执行页面：游客会话查询景点、查询最短路径和规划路线，
+    管理员会话修改道路权重和景点简介，所有会话共享同一个 ApplicationData，与线上多个用户访问同一个 Streamlit 进程相同。
+    页面每执行一次（相当于浏览器中的一次交互）记为一个请求，统计每个页面的延迟分布和整体吞吐量，
+    并用 ContentionProbe 统计对共享图对象的并发访问
+    """
+
+    def __init__(
+        self,
+        app_data: ApplicationData,
+        guests: int = 8,
+        admins: int = 1,
+        duration: float = 30.0,
+        think_time: float = 0.0,
+        baseline: float = 5.0,
+        seed: int = 0,
+        timeout: float = 60.0,
+    ) -> None:
+        """
+        :param app_data(ApplicationData): 所有会话共享的数据，测试中的修改会写入它的数据文件
+        :param guests(int): 游客会话数
+        :param admins(int): 管理员会话数
+        :param duration(float): 并发测试的秒数
+        :param think_time(float): 两次操作之间的平均思考时间，单位为秒，0 表示操作完立即进行下一次
+        :param baseline(float): 正式测试之前，单个游客会话和单个管理员会话各自单独运行的总秒数，
+            用来计算并发时每个页面变慢了多少，0 表示不测
+        :param seed(int): 随机数种子
+        :param timeout(float): 页面单次执行的超时秒数
+        """
+        self.app_data = app_data
+        self.guests = guests
+        self.admins = admins
+        self.duration = duration
+        self.think_time = think_time
+        self.baseline = baseline
+        self.seed = seed
+        self.timeout = timeout
+        self._names: List[str] = []
+
+    def run(self) -> Dict[str, object]:
+        """
+        :return: 测试报告
+        """
+        graph = self.app_data.graph
+        self._names = [graph.spots[node_id].name for node_id in graph._live_ids]
+        if len(self._names) < PLAN_STOPS + 2:
+            raise ValueError(f"压力测试至少需要 {PLAN_STOPS + 2} 个景点")
+
+        # 真实应用中 app.py 已经导入了 pages，页面脚本再导入 pages.components 时不会重新声明页面
+        import pages  # noqa: F401
+
+        with _shared_runtime():
+            baseline_samples: Dict[str, List[float]] = {}
+            if self.baseline > 0:
+                for kind in ("guest", "admin"):
+                    samples, _, _ = self._phase(
+                        [_Session(kind, -1, self.seed)], self.baseline / 2
+                    )
+                    for page, elapsed, _ in samples:
+                        baseline_samples.setdefault(page, []).append(elapsed)
+
+            sessions = [
+                _Session("guest", index, self.seed) for index in range(self.guests)
+            ] + [_Session("admin", index, self.seed) for index in range(self.admins)]
+            with ContentionProbe() as probe:
+                samples, actions, wall = self._phase(sessions, self.duration)
+        return self._report(samples, actions, wall, baseline_samples, probe)
+
+    def _phase(
+        self, sessions: List[_Session], duration: float
+    ) -> Tuple[List[Tuple[str, float, bool]], int, float]:
+        """
+        :return: 每个请求的 (页面, 耗时毫秒, 是否出错)、完成的操作数以及实际持续的秒数
+        """
+        samples: List[Tuple[str, float, bool]] = []
+        actions = [0]
+        start = time.perf_counter()
+        stop_at = start + duration
+        threads = [
+            threading.Thread(
+                target=self._session_loop,
+                args=(session, stop_at, samples, actions),
+                name=f"loadtest-{session.kind}-{index}",
+                daemon=True,
+            )
+            for index, session in enumerate(sessions)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return samples, actions[0], time.perf_counter() - start
+
+    def _session_loop(
+        self,
+        session: _Session,
+        stop_at: float,
+        samples: List[Tuple[str, float, bool]],
+        actions: List[int],
+    ) -> None:
+        pages = list(session.mix)
+        weights = list(session.mix.values())
+        while time.perf_counter() < stop_at:
+            page = session.random.choices(pages, weights)[0]
+            at = session.apps.get(page)
+            if at is None:
+                at = self._open(page)
+                session.apps[page] = at
+
+            def request() -> None:
+                start = time.perf_counter()
+                at.run(timeout=self.timeout)
+                samples.append(
+                    (page, (time.perf_counter() - start) * 1000, bool(at.exception))
+                )
+
+            try:
+                _ACTIONS[page](self, at, session.random, request)
+                actions[0] += 1
+            except Exception:
+                # 页面结构与脚本不符（例如控件没有渲染出来），记一次错误并重新打开页面
+                traceback.print_exc()
+                samples.append((page, 0.0, True))
+                session.apps.pop(page, None)
+            if self.think_time > 0:
+                time.sleep(session.random.expovariate(1 / self.think_time))
+
+    def _open(self, page: str) -> AppTest:
+        # 只有运行压力测试时才需要 streamlit 的测试工具
+        from streamlit.testing.v1 import AppTest
+
+        at = AppTest.from_file(
+            os.path.join(get_workdir(), PAGES[page]), default_timeout=self.timeout
+        )
+        at.session_state.app_data = self.app_data
+        return at
+
+    def _find_spot(self, at: AppTest, rng: random.Random, request: Callable) -> None:
+        name = rng.choice(self._names)
+        at.session_state.queried_spot_name = None
+        request()
+        # 只输入名称的一部分，走模糊搜索
+        at.text_input(key="spot_search_query").input(name[2:])
+        request()
+        at.session_state.queried_spot_name = name
+        request()
+
+    def _shortest_path(
+        self, at: AppTest, rng: random.Random, request: Callable
+    ) -> None:
+        if not at.selectbox:
+            request()
+        start, target = rng.sample(self._names, 2)
+        at.selectbox(key="shortest_path_start_spot").set_value(start)
+        at.selectbox(key="shortest_path_target_spot").set_value(target)
+        at.radio(key="shortest_path_weight_type").set_value(rng.choice(["距离", "时间"]))
+        _button(at, "查询最短路径").click()
+        request()
+
+    def _plan(self, at: AppTest, rng: random.Random, request: Callable) -> None:
+        if not at.selectbox:
+            request()
+        start, target, *stops = rng.sample(self._names, PLAN_STOPS + 2)
+        at.selectbox(key="tsp_start_spot").set_value(start)
+        at.selectbox(key="tsp_target_spot").set_value(target)
+        at.multiselect(key="tsp_must_pass_spots").set_value(stops)
+        at.radio(key="tsp_weight_type").set_value(rng.choice(["最短距离", "最短时间"]))
+        _button(at, "开始规划").click()
+        request()
+        # 规划在后台执行，等它结束后再运行一次页面显示结果
+        if "tsp_job" in at.session_state:
+            job = jobs.get(at.session_state["tsp_job"])
+            if job is not None:
+                job.wait(self.timeout)
+        request()
+
+    def _modify_path(self, at: AppTest, rng: random.Random, request: Callable) -> None:
+        graph = self.app_data.graph
+        # 直接读索引挑选道路，不经过被统计的图方法
+        node_id = graph._name_index[rng.choice(self._names)]
+        edges = [
+            edge
+            for edge in graph._incidence[node_id]
+            if graph._is_valid_node(edge.from_id) and graph._is_valid_node(edge.to_id)
+        ]
+        if not edges:
+            return
+        path = rng.choice(edges)
+        at.session_state.editing_path_key = (
+            f"{graph.spots[path.from_id].name} <-> {graph.spots[path.to_id].name}"
+        )
+        request()
+        at.number_input[0].set_value(rng.randint(50, 1500))
+        at.number_input[1].set_value(rng.randint(1, 30))
+        _button(at, "保存修改").click()
+        request()
+
+    def _modify_spot(self, at: AppTest, rng: random.Random, request: Callable) -> None:
+        if not at.selectbox:
+            request()
+        # 先按名称搜索，再从当前页中选择；名称是其他名称的一部分时不一定在第一页，此时选第一个
+        name = rng.choice(self._names)
+        at.text_input(key="modify_spot_keyword").input(name)
+        request()
+        picker = at.selectbox(key="modify_spot_selected")
+        picker.set_value(name if name in picker.options else picker.options[0])
+        _button(at, "确认选择").click()
+        request()
+        at.text_input(key="new_spot_description").input(
+            f"位于{rng.choice(_AREAS)}，以{rng.choice(_FEATURES)}闻名"
+        )
+        _button(at, "保存").click()
+        request()
+
+    def _report(
+        self,
+        samples: List[Tuple[str, float, bool]],
+        actions: int,
+        wall: float,
+        baseline_samples: Dict[str, List[float]],
+        probe: ContentionProbe,
+    ) -> Dict[str, object]:
+        by_page: Dict[str, List[float]] = {}
+        errors: Dict[str, int] = {}
+        for page, elapsed, failed in samples:
+            by_page.setdefault(page, []).append(elapsed)
+            if failed:
+                errors[page] = errors.get(page, 0) + 1
+
+        pages = {}
+        for page, page_samples in by_page.items():
+            summary = {
+                "请求数": len(page_samples),
+                "出错": errors.get(page, 0),
+                **_summary(page_samples),
+            }
+            alone = percentile(sorted(baseline_samples.get(page, [])), 50)
+            if alone:
+                summary["单会话 p50 (ms)"] = round(alone, 2)
+                summary["p50 变慢倍数"] = round(summary["p50 (ms)"] / alone, 2)
+            pages[page] = summary
+
+        page_ms = sum(elapsed for _, elapsed, _ in samples)
+        contention = probe.stats()
+        contention["图方法耗时占页面耗时的比例"] = (
+            round(probe.total_ms() / page_ms, 3) if page_ms else None
+        )
+        return {
+            "景点数": self.app_data.graph.live_nodes,
+            "道路数": self.app_data.graph.paths,
+            "游客会话": self.guests,
+            "管理员会话": self.admins,
+            "持续时间 (s)": round(wall, 2),
+            "请求数": len(samples),
+            "操作数": actions,
+            "出错": sum(errors.values()),
+            "吞吐量 (请求/秒)": round(len(samples) / wall, 2) if wall else None,
+            "吞吐量 (操作/秒)": round(actions / wall, 2) if wall else None,
+            "各页面": pages,
+            "共享数据争用": contention,
+            "后台保存": self.app_data.save_metrics(),
+        }
+
+
+def _button(at: AppTest, label: str):
+    for button in at.button:
+        if button.label == label:
+            return button
+    raise LookupError(f"页面中没有按钮 {label}")
+
+
+_ACTIONS: Dict[str, Callable[[LoadTest, AppTest, random.Random, Callable], None]] = {
+    "查询景点": LoadTest._find_spot,
+    "查询最短路径": LoadTest._shortest_path,
+    "游览路线规划": LoadTest._plan,
+    "修改道路": LoadTest._modify_path,
+    "修改景点": LoadTest._modify_spot,
+}
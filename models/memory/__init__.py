@@ -0,0 +1,354 @@
+from __future__ import annotations
+
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+from array import array
+from collections import deque
+from types import BuiltinFunctionType, FunctionType, MethodType, ModuleType
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Set, Tuple, TypeVar
+
+from context import get_workdir
+from models.pathcache import path_trees
+
+if TYPE_CHECKING:
+    from models.graph import TourGraph
+
+__all__ = [
+    "deep_size",
+    "Footprint",
+    "graph_footprint",
+    "trace_allocations",
+    "trace_load",
+    "trace_query",
+]
+
+T = TypeVar("T")
+
+# 各组件的大小随什么增长，用于推算更大的景区
+PER_NODE = "景点"
+PER_EDGE = "道路"
+QUADRATIC = "景点²"
+BOUNDED = "有上限"
+
+# 不属于数据本身的对象，遇到时不计入也不继续遍历
+_SKIPPED_TYPES = (type, ModuleType, FunctionType, BuiltinFunctionType, MethodType)
+# 没有引用其他对象的类型
+_LEAF_TYPES = (str, bytes, int, float, complex, bool, array, range)
+
+
+def deep_size(obj: object, seen: Set[int] | None = None) -> int:
+    """
+    递归计算一个对象及其引用的所有对象占用的字节数
+
+    已经出现在 seen 中的对象不会重复计算，多个组件共用同一个 seen 时，
+    共享的对象（例如景点名称同时被名称索引引用）只计入最先统计的组件
+
+    :param obj(object): 要统计的对象
+    :param seen(Set[int] | None): 已经计算过的对象的 id，会被更新
+    :return: 字节数
+    """
+    if seen is None:
+        seen = set()
+    total = 0
+    stack = [obj]
+    while stack:
+        current = stack.pop()
+        if current is None or id(current) in seen or isinstance(current, _SKIPPED_TYPES):
+            continue
+        seen.add(id(current))
+        total += sys.getsizeof(current)
+        if isinstance(current, _LEAF_TYPES):
+            continue
+        try:
+            if isinstance(current, dict):
+                for key, value in list(current.items()):
+                    stack.append(key)
+                    stack.append(value)
+            elif isinstance(current, (list, tuple, set, frozenset, deque)):
+                stack.extend(list(current))
+            else:
+                stack.extend(_attributes(current))
+        except RuntimeError:
+            # 其他线程正在修改这个容器，这一次统计略偏小
+            continue
+    return total
+
+
+def _attributes(obj: object) -> List[object]:
+    """
+    :return: 对象的 __dict__ 以及 __slots__ 中的属性（包括 pydantic 的私有属性）
+    """
+    values = []
+    instance_dict = getattr(obj, "__dict__", None)
+    if isinstance(instance_dict, dict):
+        values.append(instance_dict)
+    for cls in type(obj).__mro__:
+        slots = cls.__dict__.get("__slots__", ())
+        if isinstance(slots, str):
+            slots = (slots,)
+        for slot in slots:
+            if slot in ("__dict__", "__weakref__"):
+                continue
+            values.append(getattr(obj, slot, None))
+    return values
+
+
+class Footprint:
+    """
+    一个景区在内存中各组成部分的实际大小
+
+    按列出的顺序统计，前面的组件已经计入的共享对象不会在后面重复计算，
+    例如道路对象计入“道路对象”，邻接表只计入列表本身。所有组件之和就是图及其派生数据占用的总内存
+    """
+
+    def __init__(self, nodes: int, edges: int, elapsed_ms: float) -> None:
+        """
+        :param nodes(int): 未删除的景点数量
+        :param edges(int): 未删除的道路数量
+        :param elapsed_ms(float): 统计耗时
+        """
+        self.nodes = nodes
+        self.edges = edges
+        self.elapsed_ms = elapsed_ms
+        # (组件, 字节数, 对象数, 增长方式)
+        self.components: List[Tuple[str, int, int | None, str]] = []
+
+    def add(self, name: str, size: int, count: int | None, growth: str) -> None:
+        self.components.append((name, size, count, growth))
+
+    @property
+    def total(self) -> int:
+        return sum(size for _, size, _, _ in self.components)
+
+    def _sum(self, growth: str) -> int:
+        return sum(size for _, size, _, kind in self.components if kind == growth)
+
+    def per_node(self) -> float | None:
+        """
+        :return: 随景点数增长的部分平均到每个未删除景点上的字节数
+        """
+        return self._sum(PER_NODE) / self.nodes if self.nodes else None
+
+    def per_edge(self) -> float | None:
+        """
+        :return: 随道路数增长的部分平均到每条未删除道路上的字节数
+        """
+        return self._sum(PER_EDGE) / self.edges if self.edges else None
+
+    def project(self, nodes: int, edges: int) -> Dict[str, int] | None:
+        """
+        按当前各部分的比例推算更大（或更小）景区的内存占用，已删除景点和道路的比例保持不变，
+        有上限的缓存按当前大小计算
+
+        :param nodes(int): 目标景点数量
+        :param edges(int): 目标道路数量
+        :return: 各增长方式对应的字节数以及总字节数，当前景区为空时返回 None
+        """
+        if not self.nodes or not self.edges:
+            return None
+        scale = nodes / self.nodes
+        projected = {
+            PER_NODE: int(self._sum(PER_NODE) * scale),
+            PER_EDGE: int(self._sum(PER_EDGE) * edges / self.edges),
+            QUADRATIC: int(self._sum(QUADRATIC) * scale * scale),
+            BOUNDED: self._sum(BOUNDED),
+        }
+        projected["合计"] = sum(projected.values())
+        return projected
+
+    def rows(self) -> List[Dict[str, object]]:
+        """
+        :return: 每个组件一行，用于展示
+        """
+        total = self.total or 1
+        return [
+            {
+                "组件": name,
+                "大小 (KB)": round(size / 1024, 1),
+                "占比": round(size / total, 3),
+                "对象数": count,
+                "随之增长": growth,
+            }
+            for name, size, count, growth in self.components
+        ]
+
+    def summary(self) -> Dict[str, object]:
+        per_node = self.per_node()
+        per_edge = self.per_edge()
+        return {
+            "总大小 (MB)": round(self.total / 2**20, 2),
+            "未删除的景点": self.nodes,
+            "未删除的道路": self.edges,
+            "每个景点 (字节)": None if per_node is None else round(per_node),
+            "每条道路 (字节)": None if per_edge is None else round(per_edge),
+            "统计耗时 (ms)": round(self.elapsed_ms, 1),
+        }
+
+
+def graph_footprint(graph: TourGraph) -> Footprint:
+    """
+    统计图的对象、派生索引以及属于它的缓存各占用多少内存
+
+    需要遍历所有对象，景点很多时要几秒钟，只应在调试时使用
+
+    :param graph(TourGraph): 要统计的图
+    :return: 各组成部分的大小
+    """
+    start = time.perf_counter()
+    # 派生索引中保存着对图的引用，不能顺着它把整个图算进去
+    seen: Set[int] = {id(graph)}
+    live_spots = [spot for spot in graph.spots if not spot.deleted]
+    deleted_spots = [spot for spot in graph.spots if spot.deleted]
+    live_edges = [edge for edge in graph.edges if not edge.deleted]
+    deleted_edges = [edge for edge in graph.edges if edge.deleted]
+
+    def measure(objects: Iterable[object]) -> int:
+        return sum(deep_size(obj, seen) for obj in objects)
+
+    def container(obj: object) -> int:
+        # 只计入容器本身，其中的元素由各自的组件统计
+        seen.add(id(obj))
+        return sys.getsizeof(obj)
+
+    footprint = Footprint(graph.live_nodes, len(live_edges), 0.0)
+    footprint.add("景点名称", measure(spot.name for spot in live_spots), len(live_spots), PER_NODE)
+    footprint.add(
+        "景点简介（图中）",
+        measure(spot.description for spot in live_spots),
+        sum(1 for spot in live_spots if spot.description),
+        PER_NODE,
+    )
+    footprint.add(
+        "景点对象 (Spot)",
+        container(graph.spots) + measure(live_spots),
+        len(live_spots),
+        PER_NODE,
+    )
+    footprint.add("已删除的景点", measure(deleted_spots), len(deleted_spots), PER_NODE)
+    footprint.add(
+        "道路对象 (Path)",
+        container(graph.edges) + measure(live_edges),
+        len(live_edges),
+        PER_EDGE,
+    )
+    footprint.add("已删除的道路", measure(deleted_edges), len(deleted_edges), PER_EDGE)
+
+    indexes = [
+        ("名称索引", graph._name_index, PER_NODE),
+        ("未删除景点列表", graph._live_ids, PER_NODE),
+        ("道路索引", graph._edge_index, PER_EDGE),
+        ("邻接表", graph._incidence, PER_EDGE),
+        ("简介存储的索引与缓存", graph._descriptions, PER_NODE),
+        ("搜索索引", graph._search_index, PER_NODE),
+        ("连通分量索引", graph._components, PER_NODE),
+        ("空间索引", graph._spatial, PER_NODE),
+        ("距离矩阵", graph._distance_matrices, QUADRATIC),
+        ("分区与覆盖图", (graph._partition, graph._overlays), PER_EDGE),
+        ("修改事件历史", graph._events, BOUNDED),
+        ("最短路径树缓存", path_trees.trees(graph._uid), BOUNDED),
+    ]
+    for name, index, growth in indexes:
+        footprint.add(name, deep_size(index, seen), None, growth)
+
+    footprint.elapsed_ms = (time.perf_counter() - start) * 1000
+    return footprint
+
+
+def _location(filename: str, lineno: int) -> str:
+    workdir = get_workdir()
+    if filename.startswith(workdir):
+        filename = os.path.relpath(filename, workdir)
+    return f"{filename}:{lineno}"
+
+
+def trace_allocations(func: Callable[[], T], top: int = 10) -> Tuple[T, Dict[str, object]]:
+    """
+    用 tracemalloc 记录一次调用前后的内存快照，比较新增的内存分配
+
+    tracemalloc 会让调用慢好几倍，得到的耗时只能用来相互比较
+
+    :param func(Callable[[], T]): 要跟踪的调用
+    :param top(int): 列出新增内存最多的前几个代码位置
+    :return: 调用的返回值，以及净增加、峰值和新增最多的代码位置
+    """
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    try:
+        ignore = (tracemalloc.Filter(False, tracemalloc.__file__),)
+        before = tracemalloc.take_snapshot().filter_traces(ignore)
+        current_before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        result = func()
+        elapsed = (time.perf_counter() - start) * 1000
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot().filter_traces(ignore)
+    finally:
+        if started:
+            tracemalloc.stop()
+
+    stats = after.compare_to(before, "lineno")
+    return result, {
+        "净增加 (KB)": round(sum(stat.size_diff for stat in stats) / 1024, 1),
+        "峰值增加 (KB)": round((peak - current_before) / 1024, 1),
+        "耗时 (ms)": round(elapsed, 1),
+        "新增最多的位置": [
+            {
+                "位置": _location(stat.traceback[0].filename, stat.traceback[0].lineno),
+                "增加 (KB)": round(stat.size_diff / 1024, 1),
+                "新增对象数": stat.count_diff,
+            }
+            for stat in stats[:top]
+        ],
+    }
+
+
+def trace_load(filepath: str, lazy_descriptions: bool = True, top: int = 10) -> Dict[str, object]:
+    """
+    跟踪从数据文件重新加载一份景区时的内存分配，净增加的部分就是一个景区加载后常驻的内存
+
+    :param filepath(str): 数据文件路径
+    :param lazy_descriptions(bool): 是否使用单独的简介存储
+    :param top(int): 列出新增内存最多的前几个代码位置
+    :return: 跟踪结果
+    """
+    from models.data import ApplicationData
+
+    def load() -> ApplicationData:
+        app_data = ApplicationData(file=filepath, lazy_descriptions=lazy_descriptions)
+        app_data.read()
+        return app_data
+
+    copy, report = trace_allocations(load, top)
+    if copy.graph._descriptions is not None:
+        copy.graph._descriptions.close()
+    report["景点数"] = copy.graph.live_nodes
+    report["道路数"] = copy.graph.paths
+    return report
+
+
+def trace_query(graph: TourGraph, weight_type: str = "distance", top: int = 10) -> Dict[str, object]:
+    """
+    跟踪一次随机两点间最短路径查询的内存分配，包括查询期间的峰值与查询结束后留在缓存中的部分
+
+    :param graph(TourGraph): 要查询的图
+    :param weight_type(str): 权重类型
+    :param top(int): 列出新增内存最多的前几个代码位置
+    :return: 跟踪结果
+    """
+    live = list(graph._live_ids)
+    if len(live) < 2:
+        raise ValueError("至少需要两个景点才能查询")
+    start_id, target_id = random.sample(live, 2)
+    (total, path), report = trace_allocations(
+        lambda: graph.dijkstra(start_id, target_id, weight_type), top
+    )
+    report["查询"] = f"{graph.spots[start_id].name} -> {graph.spots[target_id].name}"
+    report["结果"] = total
+    report["经过的景点数"] = len(path)
+    return report
@@ -0,0 +1,782 @@
+from __future__ import annotations
+
+import heapq
+import time
+
+from typing import TYPE_CHECKING, Dict, Iterable, List, Literal, Set, Tuple
+
+if TYPE_CHECKING:
+    from models.graph import Path, TourGraph
+
+__all__ = ["Partition", "Overlay"]
+
+INF = float("inf")
+# 各层单元最多包含的景点数，景点数不超过某一层的上限时不再建立更高的层
+LEVEL_SIZES = (16, 128, 1024, 8192, 65536)
+# 分区之后新增的景点和道路超过景点数的这个比例时重新分区
+REPARTITION_RATIO = 0.1
+REPARTITION_MIN = 64
+# 小于上限这个比例的零碎单元会并入相邻单元，合并后允许超出上限的比例
+SMALL_CELL_RATIO = 0.25
+MERGE_SLACK = 1.5
+# 边界景点超过这个数量的单元修改后不立即重新定制，而是标记为待定制，查询时改用它内部下一层的捷径
+EAGER_BOUNDARY = 128
+# 一次修改之后同步重新定制最多花费的秒数，超出时剩下的单元也标记为待定制，修改不会因为大单元而卡住
+EAGER_SECONDS = 0.05
+# 跨越第 2 层单元（不超过 128 个景点）的道路占全部道路的比例超过这个值时，分区切开的道路太多，
+# 捷径组成的团比原来的道路还要稠密，覆盖图查询不比 dijkstra 快，改用 dijkstra。
+# 实测网格状的景区约为 0.10 ~ 0.13，查询快 1.3 ~ 2.3 倍；随机连接较远景点的景区约为 0.16 ~ 0.33，
+# 查询只快 0 ~ 20%，甚至慢一倍
+MAX_CUT_RATIO = 0.15
+
+
+def _grow_cells(
+    weights: List[int],
+    adjacency: List[Dict[int, int]],
+    cap: int,
+) -> List[int]:
+    """
+    贪心地把图划分为若干个连通的单元，每个单元的总权重不超过 cap
+
+    从一个种子开始，每次把与当前单元连接最紧密的相邻项加入单元，直到单元装满，
+    下一个种子从刚装满的单元边上选取，使单元之间的切边尽量少
+
+    :param weights(List[int]): 每一项的权重，即包含的景点数
+    :param adjacency(List[Dict[int, int]]): 每一项的相邻项 -> 连接的道路数
+    :param cap(int): 单元的权重上限
+    :return: 每一项所属的单元编号
+    """
+    count = len(weights)
+    cell_of = [-1] * count
+    cells = 0
+    next_unassigned = 0
+    seeds: List[int] = []
+    while True:
+        seed = -1
+        while seeds:
+            candidate = seeds.pop()
+            if cell_of[candidate] == -1:
+                seed = candidate
+                break
+        if seed == -1:
+            while next_unassigned < count and cell_of[next_unassigned] != -1:
+                next_unassigned += 1
+            if next_unassigned == count:
+                return cell_of
+            seed = next_unassigned
+
+        cell = cells
+        cells += 1
+        size = 0
+        connection: Dict[int, int] = {}
+        # 连接数相同时先加入较早发现的项，单元按广度优先的顺序向外扩展，形状比较紧凑
+        discovered = {seed: 0}
+        frontier = [(0, 0, seed)]
+        while frontier:
+            _, _, item = heapq.heappop(frontier)
+            if cell_of[item] != -1:
+                continue
+            if size + weights[item] > cap:
+                if size > 0:
+                    seeds.append(item)
+                    continue
+            cell_of[item] = cell
+            size += weights[item]
+            if size >= cap:
+                break
+            for neighbor, edges in adjacency[item].items():
+                if cell_of[neighbor] == -1:
+                    order = discovered.setdefault(neighbor, len(discovered))
+                    connection[neighbor] = connection.get(neighbor, 0) + edges
+                    heapq.heappush(frontier, (-connection[neighbor], order, neighbor))
+        for _, _, item in frontier:
+            if cell_of[item] == -1:
+                seeds.append(item)
+
+
+def _merge_small_cells(
+    cell_of: List[int],
+    weights: List[int],
+    adjacency: List[Dict[int, int]],
+    cap: int,
+) -> List[int]:
+    """
+    贪心划分时被周围单元包住的零碎项会各自成为很小的单元，把它们并入连接最紧密的相邻单元
+
+    :param cell_of(List[int]): 每一项所属的单元编号
+    :param weights(List[int]): 每一项的权重
+    :param adjacency(List[Dict[int, int]]): 每一项的相邻项 -> 连接的道路数
+    :param cap(int): 单元的权重上限
+    :return: 合并并重新编号后每一项所属的单元编号
+    """
+    count = max(cell_of, default=-1) + 1
+    sizes = [0] * count
+    links: List[Dict[int, int]] = [{} for _ in range(count)]
+    for item, cell in enumerate(cell_of):
+        sizes[cell] += weights[item]
+        for neighbor, edges in adjacency[item].items():
+            other = cell_of[neighbor]
+            if other != cell:
+                links[cell][other] = links[cell].get(other, 0) + edges
+
+    merged_into = list(range(count))
+
+    def find(cell: int) -> int:
+        while merged_into[cell] != cell:
+            merged_into[cell] = merged_into[merged_into[cell]]
+            cell = merged_into[cell]
+        return cell
+
+    for cell in sorted(range(count), key=lambda c: sizes[c]):
+        if find(cell) != cell or sizes[cell] >= cap * SMALL_CELL_RATIO:
+            continue
+        best, best_edges = -1, 0
+        for other, edges in links[cell].items():
+            other = find(other)
+            if other == cell or sizes[cell] + sizes[other] > cap * MERGE_SLACK:
+                continue
+            if edges > best_edges:
+                best, best_edges = other, edges
+        if best == -1:
+            continue
+        merged_into[cell] = best
+        sizes[best] += sizes[cell]
+        for other, edges in links[cell].items():
+            if other != best:
+                links[best][other] = links[best].get(other, 0) + edges
+
+    labels: Dict[int, int] = {}
+    return [labels.setdefault(find(cell), len(labels)) for cell in cell_of]
+
+
+class Partition:
+    """
+    与权重无关的多层分区
+
+    第 1 层把景点划分为不超过 LEVEL_SIZES[0] 个景点的连通单元，第 l 层再把第 l-1 层的单元合并为更大的单元，
+    每一层的单元都完整地包含在上一层的某个单元中。
+    一条道路的切分层级是两端景点所属单元不同的最高层，0 表示两端在同一个第 1 层单元中；
+    有切分层级不低于 l 的道路的景点是第 l 层的边界景点。
+    分区只依赖图的连接关系，修改道路的权重不需要重新分区。
+    切开的道路太多时（见 MAX_CUT_RATIO）覆盖图没有收益，worthwhile 为 False
+    """
+
+    def __init__(self, graph: TourGraph) -> None:
+        self.graph = graph
+        # cells[l][景点索引] 为景点所属的第 l 层单元，cells[0] 不使用
+        self.cells: List[List[int]] = [[]]
+        # boundary[l][单元] 为第 l 层单元的边界景点，boundary[0] 不使用
+        self.boundary: List[List[List[int]]] = [[]]
+        # 每条道路的切分层级，按道路索引排列
+        self.edge_levels: List[int] = []
+        # 分区之后新增的景点和道路数量，过多时分区质量下降，需要重新分区
+        self.structural_changes = 0
+        self.build_seconds = 0.0
+        # 在这个分区上建立覆盖图查询是否可能比 dijkstra 快：至少要有两层，并且第 2 层切开的道路不能太多，
+        # 分区时判断一次，之后的增量修改不改变结论
+        self.worthwhile = False
+        self._build()
+
+    @property
+    def levels(self) -> int:
+        return len(self.cells) - 1
+
+    @property
+    def stale(self) -> bool:
+        """
+        分区之后的增量修改是否已经多到应当重新分区
+        """
+        limit = max(REPARTITION_MIN, int(self.graph.nodes * REPARTITION_RATIO))
+        return self.structural_changes > limit
+
+    def cut_ratio(self, level: int) -> float:
+        """
+        :param level(int): 层
+        :return: 跨越第 level 层不同单元的道路占全部未删除道路的比例，超出已有的层数时为 0
+        """
+        total = cut = 0
+        for edge in self.graph.edges:
+            if not edge.deleted:
+                total += 1
+                if self.edge_levels[edge.id] >= level:
+                    cut += 1
+        return cut / total if total else 0.0
+
+    def _build(self) -> None:
+        start = time.perf_counter()
+        graph = self.graph
+        n = graph.nodes
+
+        weights = [1] * n
+        adjacency: List[Dict[int, int]] = [{} for _ in range(n)]
+        for node_id in range(n):
+            for edge in graph._incidence[node_id]:
+                neighbor = edge.other(node_id)
+                adjacency[node_id][neighbor] = adjacency[node_id].get(neighbor, 0) + 1
+        # 每个景点所属的当前层单元，划分第 1 层之前每个景点各自为一项
+        member_cell = list(range(n))
+        for cap in LEVEL_SIZES:
+            if n <= cap:
+                break
+            item_cell = _merge_small_cells(
+                _grow_cells(weights, adjacency, cap), weights, adjacency, cap
+            )
+            count = max(item_cell, default=-1) + 1
+            if count == 1 or count == len(weights):
+                break  # 只剩一个单元，或者已经没有可以合并的单元（各个连通分量互不相连）
+            member_cell = [item_cell[item] for item in member_cell]
+            self.cells.append(member_cell)
+
+            # 把这一层的单元作为下一层划分的项
+            next_weights = [0] * count
+            next_adjacency: List[Dict[int, int]] = [{} for _ in range(count)]
+            for item, cell in enumerate(item_cell):
+                next_weights[cell] += weights[item]
+                links = next_adjacency[cell]
+                for neighbor, edges in adjacency[item].items():
+                    other = item_cell[neighbor]
+                    if other != cell:
+                        links[other] = links.get(other, 0) + edges
+            weights, adjacency = next_weights, next_adjacency
+
+        self.edge_levels = [self._cut_level(e.from_id, e.to_id) for e in graph.edges]
+        # 最高几层可能只是把互不相连的连通分量合并在一起，没有任何道路跨越，去掉这些层
+        top = max(
+            (level for edge, level in zip(graph.edges, self.edge_levels) if not edge.deleted),
+            default=0,
+        )
+        del self.cells[top + 1 :]
+        self.boundary = [[]]
+        for level in range(1, self.levels + 1):
+            cells = self.cells[level]
+            boundary: List[Set[int]] = [set() for _ in range(max(cells, default=-1) + 1)]
+            for edge in graph.edges:
+                if not edge.deleted and self.edge_levels[edge.id] >= level:
+                    boundary[cells[edge.from_id]].add(edge.from_id)
+                    boundary[cells[edge.to_id]].add(edge.to_id)
+            self.boundary.append([sorted(nodes) for nodes in boundary])
+        self.worthwhile = self.levels >= 2 and self.cut_ratio(2) <= MAX_CUT_RATIO
+        self.build_seconds = time.perf_counter() - start
+
+    def _cut_level(self, u: int, v: int) -> int:
+        for level in range(self.levels, 0, -1):
+            cells = self.cells[level]
+            if cells[u] != cells[v]:
+                return level
+        return 0
+
+    def node_added(self, node_id: int) -> None:
+        """
+        新增的景点还没有道路，在每一层都单独作为一个单元
+
+        :param node_id(int): 新景点的索引
+        """
+        for level in range(1, self.levels + 1):
+            self.cells[level].append(len(self.boundary[level]))
+            self.boundary[level].append([])
+        self.structural_changes += 1
+
+    def edge_added(self, edge: Path) -> int:
+        """
+        记录新道路的切分层级，并把两端加入相应各层的边界景点
+
+        :param edge(Path): 新道路
+        :return: 新道路的切分层级
+        """
+        level = self._cut_level(edge.from_id, edge.to_id)
+        self.edge_levels.append(level)
+        for low in range(1, level + 1):
+            for node_id in (edge.from_id, edge.to_id):
+                boundary = self.boundary[low][self.cells[low][node_id]]
+                if node_id not in boundary:
+                    boundary.append(node_id)
+                    boundary.sort()
+        self.structural_changes += 1
+        return level
+
+    def stats(self) -> Dict[str, object]:
+        """
+        :return: 每一层的单元数与边界景点数
+        """
+        return {
+            "层数": self.levels,
+            "使用覆盖图": self.worthwhile,
+            "分区耗时 (ms)": round(self.build_seconds * 1000, 1),
+            "分区后新增的景点和道路": self.structural_changes,
+            "各层": [
+                {
+                    "层": level,
+                    "单元数": len(self.boundary[level]),
+                    "边界景点数": sum(len(nodes) for nodes in self.boundary[level]),
+                    "切开的道路比例": round(self.cut_ratio(level), 3),
+                    "最多边界景点": max(
+                        (len(nodes) for nodes in self.boundary[level]), default=0
+                    ),
+                }
+                for level in range(1, self.levels + 1)
+            ],
+        }
+
+
+class Overlay:
+    """
+    按某种权重定制的多层覆盖图（CRP）
+
+    对第 l 层的每个单元，预先算出它的边界景点两两之间只经过单元内部的最短距离，作为第 l 层的捷径。
+    计算第 l 层单元的捷径时只需要在第 l-1 层的边界景点上搜索，边为第 l-1 层的捷径以及切分层级为 l-1 的道路。
+    查询时离起点和终点越远的景点使用越高层的捷径，搜索的景点数远少于直接 dijkstra。
+
+    修改道路权重后只重新定制包含这条道路的各层单元，并且在每个单元中只重新计算可能受影响的边界景点：
+    先从变化的边的所有端点同时搜索一次，只有经过变化的边可能不长于原来捷径的边界景点才需要重新计算，
+    每个受影响的边界景点也只搜索到下界不长于原来捷径的那些边界景点为止，而不是整个单元的所有边界景点。
+    变化的捷径再作为上一层单元中变化的边继续向上，某一层的捷径不再变化时就停止。
+    边界景点很多的大单元重新定制一次要很久，修改时只把它标记为待定制；同步定制超过 EAGER_SECONDS 时，
+    正在定制的单元和更高层的单元也标记为待定制。查询仍然正确，只是在这些单元中走低一层的捷径，
+    之后可以在空闲时调用 refresh 统一重新定制
+    """
+
+    def __init__(
+        self,
+        graph: TourGraph,
+        partition: Partition,
+        weight_type: Literal["distance", "duration"],
+    ) -> None:
+        self.graph = graph
+        self.partition = partition
+        self.weight_type = weight_type
+        # shortcuts[l][边界景点] 为第 l 层的捷径 {同单元的另一个边界景点: 距离}，shortcuts[0] 不使用
+        self.shortcuts: List[Dict[int, Dict[int, int]]] = [{}]
+        # stale[l] 为第 l 层中捷径已经过期、等待重新定制的单元，包含某个过期单元的上层单元也都是过期的
+        self.stale: List[Set[int]] = [set()]
+        # 最近一次定制重新计算的单元数、从边界景点出发的搜索次数与耗时，便于观察定制的开销
+        self.last_customized_cells = 0
+        self.last_customize_searches = 0
+        self.last_customize_seconds = 0.0
+        self._searches = 0
+        # 同步定制的截止时间，None 表示不限时
+        self._deadline: float | None = None
+        self.customize()
+
+    def customize(self) -> None:
+        """
+        从头定制所有层的捷径
+        """
+        start = time.perf_counter()
+        self._searches = 0
+        self.shortcuts = [{} for _ in range(self.partition.levels + 1)]
+        self.stale = [set() for _ in range(self.partition.levels + 1)]
+        cells = 0
+        for level in range(1, self.partition.levels + 1):
+            for cell in range(len(self.partition.boundary[level])):
+                self._customize_cell(level, cell)
+                cells += 1
+        self._finish(start, cells)
+
+    def refresh(self, budget: float | None = None) -> None:
+        """
+        从低层到高层重新定制待定制的单元
+
+        :param budget(float | None): 最多花费的秒数，用完时还没有开始定制的单元继续保持待定制，None 表示全部定制
+        """
+        start = time.perf_counter()
+        self._searches = 0
+        cells = 0
+        for level in range(1, self.partition.levels + 1):
+            for cell in sorted(self.stale[level]):
+                if budget is not None and time.perf_counter() - start > budget:
+                    self._finish(start, cells)
+                    return
+                self._customize_cell(level, cell)
+                self.stale[level].discard(cell)
+                cells += 1
+        self._finish(start, cells)
+
+    def _defer(self, level: int, node_id: int) -> bool:
+        """
+        边界景点过多的单元不立即重新定制，把它和包含它的上层单元都标记为待定制
+
+        :param level(int): 单元所在的层
+        :param node_id(int): 单元中的一个景点
+        :return: 是否已经标记为待定制
+        """
+        cell = self.partition.cells[level][node_id]
+        if cell not in self.stale[level]:
+            if len(self.partition.boundary[level][cell]) <= EAGER_BOUNDARY:
+                return False
+            self._mark_stale(level, node_id)
+        return True
+
+    def _mark_stale(self, level: int, node_id: int) -> None:
+        """
+        把包含给定景点的第 level 层及以上各层单元标记为待定制
+        """
+        for upper in range(level, self.partition.levels + 1):
+            self.stale[upper].add(self.partition.cells[upper][node_id])
+
+    def _begin(self) -> float:
+        start = time.perf_counter()
+        self._searches = 0
+        self._deadline = start + EAGER_SECONDS
+        return start
+
+    def _finish(self, start: float, cells: int) -> None:
+        self._deadline = None
+        self.last_customized_cells = cells
+        self.last_customize_searches = self._searches
+        self.last_customize_seconds = time.perf_counter() - start
+
+    def update(self, nodes: Iterable[int], low: int = 1, high: int = 1) -> None:
+        """
+        完整地重新定制包含给定景点的各层单元，用于新增道路、删除景点等改变了边界景点的修改
+
+        从第 low 层开始逐层向上，至少定制到第 high 层；之后某一层的捷径都没有变化时，
+        更高层也不会变化，直接停止
+
+        :param nodes(Iterable[int]): 发生变化的景点
+        :param low(int): 最低需要重新定制的层
+        :param high(int): 无论捷径是否变化都要重新定制到的层
+        """
+        start = self._begin()
+        nodes = list(nodes)
+        cells = 0
+        for level in range(max(low, 1), self.partition.levels + 1):
+            level_cells = {
+                self.partition.cells[level][node_id]
+                for node_id in nodes
+                if not self._defer(level, node_id)
+            }
+            changed = False
+            for cell in sorted(level_cells):
+                result = self._customize_cell(level, cell)
+                cells += 1
+                if result is None:
+                    # 超时，这一层剩下的单元以及更高层都留给 refresh
+                    for node_id in nodes:
+                        self._mark_stale(level, node_id)
+                    self._finish(start, cells)
+                    return
+                changed |= result
+            if level >= high and not changed:
+                break
+        self._finish(start, cells)
+
+    def edge_changed(self, edge: Path, old_weight: int) -> None:
+        """
+        道路的权重变化或被删除后增量地重新定制
+
+        :param edge(Path): 发生变化的道路
+        :param old_weight(int): 道路修改前的权重
+        """
+        start = self._begin()
+        new_weight = old_weight if edge.deleted else getattr(edge, self.weight_type)
+        # 变化的边 -> 修改前后权重中较小的一个
+        changed = {_pair(edge.from_id, edge.to_id): min(old_weight, new_weight)}
+        cells = 0
+        for level in range(self.partition.edge_levels[edge.id] + 1, self.partition.levels + 1):
+            if self._defer(level, edge.from_id):
+                break
+            cell = self.partition.cells[level][edge.from_id]
+            changed = self._refresh_cell(level, cell, changed)
+            cells += 1
+            if changed is None:
+                self._mark_stale(level, edge.from_id)
+                break
+            if not changed:
+                break
+        self._finish(start, cells)
+
+    def _customize_cell(self, level: int, cell: int) -> bool | None:
+        """
+        重新计算一个单元的所有捷径
+
+        :return: 这个单元的捷径是否发生了变化，超过同步定制的截止时间时返回 None，此时捷径没有被修改
+        """
+        boundary = self.partition.boundary[level][cell]
+        shortcuts = self.shortcuts[level]
+        spots = self.graph.spots
+        # 道路是双向的，i 到 j 与 j 到 i 的距离相同，从第 i 个边界景点出发只需要求到排在它后面的边界景点
+        table: Dict[int, Dict[int, int]] = {node_id: {} for node_id in boundary}
+        for index, node_id in enumerate(boundary):
+            if spots[node_id].deleted:
+                continue
+            goals = boundary[index + 1 :]
+            if not goals:
+                break
+            if self._out_of_time():
+                return None
+            weights, _ = self._search(level, [node_id], goals=goals)
+            for other in goals:
+                weight = weights.get(other)
+                if weight is not None:
+                    table[node_id][other] = weight
+                    table[other][node_id] = weight
+        changed = False
+        for node_id, arcs in table.items():
+            if shortcuts.get(node_id) != arcs:
+                shortcuts[node_id] = arcs
+                changed = True
+        return changed
+
+    def _refresh_cell(
+        self, level: int, cell: int, changed: Dict[Tuple[int, int], int]
+    ) -> Dict[Tuple[int, int], int] | None:
+        """
+        单元内部的一些边变化后，只重新计算可能受影响的捷径
+
+        把变化的边取修改前后较小的权重，从它们的所有端点同时出发搜索，得到各边界景点到最近端点的距离 m，
+        边界景点 b 到 b' 的路径只要经过变化的边，长度就不小于 m[b] + w + m[b']（w 为变化的边中最小的权重）。
+        这个下界大于原来的捷径时，无论修改前后 b 到 b' 的最短路径都不经过变化的边，这条捷径不会变化，
+        因此从 b 出发只需要搜索到下界不大于原来捷径的那些 b' 为止
+
+        :param level(int): 单元所在的层
+        :param cell(int): 单元编号
+        :param changed(Dict[Tuple[int, int], int]): 变化的边 -> 修改前后较小的权重
+        :return: 这个单元中变化的捷径 -> 修改前后较小的权重，超过同步定制的截止时间时返回 None
+        """
+        boundary = self.partition.boundary[level][cell]
+        shortcuts = self.shortcuts[level]
+        spots = self.graph.spots
+        extra: Dict[int, List[Tuple[int, int]]] = {}
+        for (x, y), weight in changed.items():
+            extra.setdefault(x, []).append((y, weight))
+            extra.setdefault(y, []).append((x, weight))
+
+        nearest, _ = self._search(level, list(extra), goals=boundary, extra=extra)
+        lightest = min(changed.values())
+        # 边界景点 -> 可能变化的捷径的另一端，两个方向各记一次
+        candidates: Dict[int, Set[int]] = {}
+        for node_id in boundary:
+            head = nearest.get(node_id)
+            if head is None:
+                continue  # 到不了任何变化的边
+            head += lightest
+            row = shortcuts.get(node_id, {})
+            for other in boundary:
+                tail = nearest.get(other)
+                if other != node_id and tail is not None and head + tail <= row.get(other, INF):
+                    candidates.setdefault(node_id, set()).add(other)
+                    candidates.setdefault(other, set()).add(node_id)
+
+        result: Dict[Tuple[int, int], int] = {}
+        for node_id in sorted(candidates):
+            others = candidates[node_id]
+            if not others:
+                continue  # 都已经在另一端的搜索中重新计算过
+            if spots[node_id].deleted:
+                weights: Dict[int, int] = {}
+            else:
+                if self._out_of_time():
+                    return None
+                weights, _ = self._search(level, [node_id], goals=sorted(others))
+            row = shortcuts.setdefault(node_id, {})
+            for other in others:
+                old_weight = row.get(other, INF)
+                new_weight = INF if spots[other].deleted else weights.get(other, INF)
+                candidates[other].discard(node_id)
+                if old_weight == new_weight:
+                    continue
+                result[_pair(node_id, other)] = min(old_weight, new_weight)
+                # 同步另一个方向
+                if new_weight == INF:
+                    row.pop(other, None)
+                    shortcuts.get(other, {}).pop(node_id, None)
+                else:
+                    row[other] = new_weight
+                    shortcuts.setdefault(other, {})[node_id] = new_weight
+        return result
+
+    def _out_of_time(self) -> bool:
+        return self._deadline is not None and time.perf_counter() > self._deadline
+
+    def _search(
+        self,
+        level: int,
+        sources: List[int],
+        goals: List[int] | None = None,
+        target: int | None = None,
+        extra: Dict[int, List[Tuple[int, int]]] | None = None,
+    ) -> Tuple[Dict[int, int], Dict[int, Tuple[int, int]]]:
+        """
+        在第 level 层的某个单元内部做 dijkstra，边为第 level-1 层的捷径以及切分层级为 level-1 的道路
+
+        :param level(int): 单元所在的层
+        :param sources(List[int]): 起点，多个起点时求到最近起点的距离，必须是第 level-1 层的边界景点（第 1 层时可以是任意景点）
+        :param goals(List[int] | None): 全部确定最短距离后就停止的景点
+        :param target(int | None): 确定最短距离后就停止的景点，同时记录前驱用于展开捷径
+        :param extra(Dict[int, List[Tuple[int, int]]] | None): 额外的边，用于增量定制时按修改前后较小的权重搜索
+        :return: 最短距离，以及前驱 (前一个景点, 所经过的边的层级，0 表示道路)
+        """
+        spots = self.graph.spots
+        incidence = self.graph._incidence
+        edge_levels = self.partition.edge_levels
+        weight_type = self.weight_type
+        below = self.shortcuts[level - 1] if level >= 2 else {}
+        inner = level - 1
+        record = target is not None
+        if extra is None:
+            extra = {}
+        self._searches += 1
+
+        weights: Dict[int, int] = {source: 0 for source in sources}
+        previous: Dict[int, Tuple[int, int]] = {}
+        remaining = len(goals) if goals is not None else -1
+        goal_set = set(goals) if goals is not None else ()
+        settled = set()
+        # 队列中的第三项表示是否经捷径到达，同一单元的捷径两两之间已经是最短距离，
+        # 经捷径到达的景点不需要再沿同一单元的捷径扩展
+        pq = [(0, source, False) for source in weights]
+        while pq:
+            current_weight, current_id, by_shortcut = heapq.heappop(pq)
+            if current_id in settled:
+                continue
+            settled.add(current_id)
+            if current_id == target:
+                break
+            if current_id in goal_set:
+                remaining -= 1
+                if remaining == 0:
+                    break
+            if not by_shortcut:
+                for neighbor, weight in below.get(current_id, {}).items():
+                    new_weight = current_weight + weight
+                    if new_weight < weights.get(neighbor, INF):
+                        weights[neighbor] = new_weight
+                        if record:
+                            previous[neighbor] = (current_id, inner)
+                        heapq.heappush(pq, (new_weight, neighbor, True))
+            for edge in incidence[current_id]:
+                if edge_levels[edge.id] != inner:
+                    continue
+                neighbor = edge.to_id if edge.from_id == current_id else edge.from_id
+                if spots[neighbor].deleted:
+                    continue
+                new_weight = current_weight + getattr(edge, weight_type)
+                if new_weight < weights.get(neighbor, INF):
+                    weights[neighbor] = new_weight
+                    if record:
+                        previous[neighbor] = (current_id, 0)
+                    heapq.heappush(pq, (new_weight, neighbor, False))
+            for neighbor, weight in extra.get(current_id, ()):
+                new_weight = current_weight + weight
+                if new_weight < weights.get(neighbor, INF):
+                    weights[neighbor] = new_weight
+                    heapq.heappush(pq, (new_weight, neighbor, False))
+        return weights, previous
+
+    def _unpack(self, level: int, from_id: int, to_id: int) -> List[int]:
+        """
+        把第 level 层的一条捷径展开为原图中的景点序列，不包括起点
+
+        :param level(int): 捷径所在的层
+        :param from_id(int): 捷径的起点
+        :param to_id(int): 捷径的终点
+        :return: 捷径经过的景点索引列表
+        """
+        _, previous = self._search(level, [from_id], target=to_id)
+        return self._trace(previous, from_id, to_id)
+
+    def _trace(
+        self, previous: Dict[int, Tuple[int, int]], from_id: int, to_id: int
+    ) -> List[int]:
+        hops = []
+        current = to_id
+        while current != from_id:
+            prev_id, arc_level = previous[current]
+            hops.append((prev_id, current, arc_level))
+            current = prev_id
+        sequence = []
+        for prev_id, node_id, arc_level in reversed(hops):
+            if arc_level == 0:
+                sequence.append(node_id)
+            else:
+                sequence.extend(self._unpack(arc_level, prev_id, node_id))
+        return sequence
+
+    def query(self, start_id: int, target_id: int) -> Tuple[int, List[int]]:
+        """
+        在多层覆盖图上求最短路径
+
+        起点或终点所在的第 l 层单元内部使用第 l-1 层的边，其余景点使用不包含起点和终点的最高层单元的捷径
+
+        :param start_id(int): 起始景点索引
+        :param target_id(int): 目标景点索引
+        :return: 与 dijkstra 相同的 (总权重, 路径经过的景点索引列表)，不可达返回 (-1, [])
+        """
+        partition = self.partition
+        cells = partition.cells
+        levels = partition.levels
+        shortcuts = self.shortcuts
+        spots = self.graph.spots
+        incidence = self.graph._incidence
+        edge_levels = partition.edge_levels
+        weight_type = self.weight_type
+        stale = self.stale
+        start_cells = [level_cells[start_id] if level_cells else -1 for level_cells in cells]
+        target_cells = [level_cells[target_id] if level_cells else -1 for level_cells in cells]
+
+        weights: Dict[int, int] = {start_id: 0}
+        previous: Dict[int, Tuple[int, int]] = {}
+        settled = set()
+        pq = [(0, start_id, False)]
+        while pq:
+            current_weight, current_id, by_shortcut = heapq.heappop(pq)
+            if current_id in settled:
+                continue
+            settled.add(current_id)
+            if current_id == target_id:
+                break
+
+            # 不包含起点和终点、并且捷径没有过期的最高层单元
+            query_level = 0
+            for level in range(levels, 0, -1):
+                cell = cells[level][current_id]
+                if (
+                    cell != start_cells[level]
+                    and cell != target_cells[level]
+                    and cell not in stale[level]
+                ):
+                    query_level = level
+                    break
+
+            if query_level and not by_shortcut:
+                for neighbor, weight in shortcuts[query_level].get(current_id, {}).items():
+                    new_weight = current_weight + weight
+                    if new_weight < weights.get(neighbor, INF):
+                        weights[neighbor] = new_weight
+                        previous[neighbor] = (current_id, query_level)
+                        heapq.heappush(pq, (new_weight, neighbor, True))
+            for edge in incidence[current_id]:
+                # 只走离开当前单元的道路，单元内部已经由捷径代替
+                if edge_levels[edge.id] < query_level:
+                    continue
+                neighbor = edge.to_id if edge.from_id == current_id else edge.from_id
+                if spots[neighbor].deleted:
+                    continue
+                new_weight = current_weight + getattr(edge, weight_type)
+                if new_weight < weights.get(neighbor, INF):
+                    weights[neighbor] = new_weight
+                    previous[neighbor] = (current_id, 0)
+                    heapq.heappush(pq, (new_weight, neighbor, False))
+
+        if target_id not in settled:
+            return -1, []
+        return weights[target_id], [start_id] + self._trace(previous, start_id, target_id)
+
+    def stats(self) -> Dict[str, object]:
+        """
+        :return: 捷径数量以及最近一次定制的开销
+        """
+        return {
+            "权重类型": self.weight_type,
+            "捷径数": sum(
+                len(arcs) for level in self.shortcuts[1:] for arcs in level.values()
+            ),
+            "待定制的单元数": sum(len(cells) for cells in self.stale),
+            "最近一次定制的单元数": self.last_customized_cells,
+            "最近一次定制的搜索次数": self.last_customize_searches,
+            "最近一次定制耗时 (ms)": round(self.last_customize_seconds * 1000, 2),
+        }
+
+
+def _pair(u: int, v: int) -> Tuple[int, int]:
+    return (u, v) if u < v else (v, u)
@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import os
+import sys
+import threading
+
+from collections import OrderedDict
+from typing import Callable, Dict, List, Tuple
+
+__all__ = ["PathTreeCache", "path_trees"]
+
+# 同一个起点在缓存中没有结果时，第几次查询才求完整的最短路径树并放入缓存
+# 只查询过一次的起点仍然使用可以提前结束的 dijkstra，避免冷门起点占用缓存
+ADMIT_AFTER = 2
+# 记录未命中次数的起点个数上限
+MISS_HISTORY = 4096
+# 每个景点在一棵树中的大致开销：两个字典各一项，以及距离整数对象
+ENTRY_BYTES = 32
+
+Tree = Tuple[Dict[int, int], Dict[int, int | None]]
+
+
+def tree_bytes(tree: Tree) -> int:
+    """
+    估计一棵最短路径树占用的字节数
+
+    :param tree(Tree): 最短距离与前驱景点
+    :return: 估计的字节数
+    """
+    weights, previous_nodes = tree
+    return (
+        sys.getsizeof(weights)
+        + sys.getsizeof(previous_nodes)
+        + ENTRY_BYTES * len(weights)
+    )
+
+
+class PathTreeCache:
+    """
+    进程内共享的单源最短路径树缓存
+
+    逻辑上的键为 (图, 起点, 权重类型, 图的修订号)，同一个图对象被所有会话共用，因此缓存也在会话之间共享。
+    修订号在图每次被修改时递增，查到的树修订号与当前不同、并且调用方无法确认期间的修改不影响最短路径时视为过期并丢弃，
+    所以每个 (图, 起点, 权重类型) 最多只保留一棵树。所有树的估计大小超过 memory_budget 时按最近最少使用的顺序淘汰
+    """
+
+    def __init__(self, memory_budget: int) -> None:
+        """
+        :param memory_budget(int): 缓存的内存预算，单位为字节
+        """
+        self.memory_budget = memory_budget
+        self._lock = threading.Lock()
+        # (图编号, 起点, 权重类型) -> (修订号, 树, 估计字节数)
+        self._trees: OrderedDict[Tuple[int, int, str], Tuple[int, Tree, int]] = (
+            OrderedDict()
+        )
+        self._bytes = 0
+        # (图编号, 起点, 权重类型) -> (修订号, 未命中次数)，用来决定是否放入缓存
+        self._misses_by_source: OrderedDict[Tuple[int, int, str], Tuple[int, int]] = (
+            OrderedDict()
+        )
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def get(
+        self,
+        graph_id: int,
+        source: int,
+        weight_type: str,
+        revision: int,
+        still_valid: Callable[[int], bool] | None = None,
+    ) -> Tree | None:
+        """
+        :param graph_id(int): 图的编号
+        :param source(int): 起点索引
+        :param weight_type(str): 权重类型
+        :param revision(int): 图当前的修订号
+        :param still_valid(Callable[[int], bool] | None): 修订号不同时调用，参数为缓存的树的修订号，
+            返回 True 表示这之后的修改不影响最短路径（例如只修改了景点名称），树仍然可以使用
+        :return: 缓存的最短路径树，没有或已过期时返回 None，返回的字典不能修改
+        """
+        key = (graph_id, source, weight_type)
+        with self._lock:
+            entry = self._trees.get(key)
+            if entry is not None:
+                if (
+                    entry[0] != revision
+                    and still_valid is not None
+                    and still_valid(entry[0])
+                ):
+                    entry = (revision, entry[1], entry[2])
+                    self._trees[key] = entry
+                if entry[0] == revision:
+                    self._trees.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._trees[key]
+                self._bytes -= entry[2]
+                self.expired += 1
+            self.misses += 1
+            return None
+
+    def should_admit(self, graph_id: int, source: int, weight_type: str, revision: int) -> bool:
+        """
+        登记一次未命中，判断这个起点是否已经查询得足够频繁，值得求完整的树放入缓存
+
+        :param graph_id(int): 图的编号
+        :param source(int): 起点索引
+        :param weight_type(str): 权重类型
+        :param revision(int): 图当前的修订号
+        :return: 是否应该求完整的树并调用 put
+        """
+        key = (graph_id, source, weight_type)
+        with self._lock:
+            seen_revision, count = self._misses_by_source.pop(key, (revision, 0))
+            count = count + 1 if seen_revision == revision else 1
+            if count >= ADMIT_AFTER:
+                return True
+            self._misses_by_source[key] = (revision, count)
+            while len(self._misses_by_source) > MISS_HISTORY:
+                self._misses_by_source.popitem(last=False)
+            return False
+
+    def put(
+        self, graph_id: int, source: int, weight_type: str, revision: int, tree: Tree
+    ) -> None:
+        """
+        :param graph_id(int): 图的编号
+        :param source(int): 起点索引
+        :param weight_type(str): 权重类型
+        :param revision(int): 求这棵树时图的修订号
+        :param tree(Tree): 最短距离与前驱景点，放入缓存后不能再修改
+        """
+        size = tree_bytes(tree)
+        if size > self.memory_budget:
+            return
+        key = (graph_id, source, weight_type)
+        with self._lock:
+            old = self._trees.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._trees[key] = (revision, tree, size)
+            self._bytes += size
+            while self._bytes > self.memory_budget:
+                _, (_, _, evicted) = self._trees.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+
+    def forget(self, graph_id: int) -> None:
+        """
+        丢弃一个图的所有缓存，用于景区被换出时
+
+        :param graph_id(int): 图的编号
+        """
+        with self._lock:
+            for key in [key for key in self._trees if key[0] == graph_id]:
+                self._bytes -= self._trees.pop(key)[2]
+            for key in [key for key in self._misses_by_source if key[0] == graph_id]:
+                del self._misses_by_source[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._trees.clear()
+            self._misses_by_source.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, object]:
+        """
+        :return: 缓存的树数量、估计内存占用以及命中情况
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "缓存的树": len(self._trees),
+                "估计内存 (MB)": round(self._bytes / 2**20, 2),
+                "内存预算 (MB)": round(self.memory_budget / 2**20, 2),
+                "命中": self.hits,
+                "未命中": self.misses,
+                "命中率": round(self.hits / lookups, 3) if lookups else None,
+                "因图被修改而过期": self.expired,
+                "淘汰": self.evictions,
+            }
+
+    def trees(self, graph_id: int) -> List[Tree]:
+        """
+        :param graph_id(int): 图的编号
+        :return: 这个图当前缓存的所有树，不能修改
+        """
+        with self._lock:
+            return [
+                tree for key, (_, tree, _) in self._trees.items() if key[0] == graph_id
+            ]
+
+    def entries(self) -> List[Dict[str, object]]:
+        """
+        :return: 每棵缓存的树的起点、权重类型和大小，最近使用的排在最后
+        """
+        with self._lock:
+            return [
+                {
+                    "图编号": graph_id,
+                    "起点": source,
+                    "权重类型": weight_type,
+                    "修订号": revision,
+                    "景点数量": len(tree[0]),
+                    "估计大小 (KB)": round(size / 1024, 1),
+                }
+                for (graph_id, source, weight_type), (revision, tree, size) in self._trees.items()
+            ]
+
+
+path_trees = PathTreeCache(
+    memory_budget=int(os.environ.get("SCENIC_PATH_CACHE_MB", "64")) * 2**20,
+)
@@ -0,0 +1,281 @@
+from __future__ import annotations
+
+import os
+import stat
+import statistics
+import tempfile
+import threading
+import time
+
+from collections import deque
+from typing import Callable, Deque, Dict
+
+__all__ = ["atomic_write", "SnapshotWriter"]
+
+# 写入耗时只保留最近若干次，用于计算分位数
+LATENCY_SAMPLES = 100
+
+# 进程的 umask，新建文件时按它计算权限；只能通过设置再恢复来读取，因此在导入时读取一次
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def atomic_write(filepath: str, content: str | bytes) -> None:
+    """
+    先写入同目录下的临时文件并刷到磁盘，再原子地替换目标文件，最后把目录刷到磁盘让替换本身持久化
+    写到一半崩溃时目标文件仍然是上一次的完整内容
+
+    临时文件创建时只有当前用户可以读写，替换前改为与原来的文件相同的权限，
+    目标文件不存在时按 umask 使用普通新建文件的权限
+
+    :param filepath(str): 目标文件路径
+    :param content(str | bytes): 文件内容，字符串按 UTF-8 编码写入
+    """
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    directory = os.path.dirname(os.path.abspath(filepath))
+    os.makedirs(directory, exist_ok=True)
+    try:
+        mode = stat.S_IMODE(os.stat(filepath).st_mode)
+    except FileNotFoundError:
+        mode = 0o666 & ~_UMASK
+    fd, tmp_path = tempfile.mkstemp(
+        prefix=f".{os.path.basename(filepath)}.", suffix=".tmp", dir=directory
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    _fsync_directory(directory)
+
+
+def _fsync_directory(directory: str) -> None:
+    """
+    把目录项刷到磁盘，rename 之后不刷目录时断电可能丢失这次替换
+    Windows 上不能打开目录，替换由文件系统自行保证
+
+    :param directory(str): 目录路径
+    """
+    if os.name != "posix":
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class SnapshotWriter:
+    """
+    在后台线程中保存数据快照
+
+    每次修改只需要调用 request 登记一次保存请求，写入线程会等到连续 debounce 秒没有新的请求
+    （但最多等待 max_delay 秒）后只写一次，把一连串修改合并为一次写入。
+    快照由 serialize 在写入线程中生成，写入使用 atomic_write；
+    serialize 需要自己保证得到一致的快照，例如与修改方持有同一把锁（见 TourGraph.dump_json）
+    """
+
+    def __init__(
+        self,
+        serialize: Callable[[], str],
+        filepath: Callable[[], str],
+        debounce: float = 1.0,
+        max_delay: float = 10.0,
+    ) -> None:
+        """
+        :param serialize(Callable[[], str]): 生成快照内容的函数
+        :param filepath(Callable[[], str]): 返回目标文件路径的函数
+        :param debounce(float): 最后一次请求之后等待的秒数
+        :param max_delay(float): 第一次请求之后最多等待的秒数，避免修改不断时一直不写入
+        """
+        self.serialize = serialize
+        self.filepath = filepath
+        self.debounce = debounce
+        self.max_delay = max_delay
+
+        self._cond = threading.Condition()
+        self._thread: threading.Thread | None = None
+        self._stopping = False
+        self._flush_requested = False
+        # 请求与写入都按序号计数，写入的序号不小于某次请求的序号，说明这次请求的修改已经落盘
+        self._requested = 0
+        self._written = 0
+        self._first_pending: float | None = None
+        self._last_request = 0.0
+        self._last_error: Exception | None = None
+
+        self._writes = 0
+        self._bytes = 0
+        self._last_write_at: float | None = None
+        self._serialize_ms: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self._write_ms: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        # 从第一次请求到写入完成的等待时间，包含防抖等待
+        self._delay_ms: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+
+    def start(self) -> None:
+        """
+        启动写入线程，重复调用不会重复启动
+        """
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping = False
+            self._thread = threading.Thread(
+                target=self._run, name="snapshot-writer", daemon=True
+            )
+            self._thread.start()
+
+    def request(self) -> None:
+        """
+        登记一次保存请求，立即返回
+        """
+        self.start()
+        with self._cond:
+            now = time.perf_counter()
+            self._requested += 1
+            if self._first_pending is None:
+                self._first_pending = now
+            self._last_request = now
+            self._cond.notify_all()
+
+    @property
+    def pending(self) -> bool:
+        """
+        是否有尚未写入的请求
+        """
+        with self._cond:
+            return self._written < self._requested
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """
+        跳过防抖等待，立即写入目前为止的所有请求，并等待写入完成
+
+        :param timeout(float | None): 最长等待秒数，None 表示一直等待
+        :return: 是否已经全部写入，超时返回 False
+        """
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        with self._cond:
+            target = self._requested
+            if self._written >= target:
+                return True
+            self._flush_requested = True
+            self._cond.notify_all()
+            while self._written < target:
+                if self._last_error is not None and not self._flush_requested:
+                    raise self._last_error
+                remaining = None if deadline is None else deadline - time.perf_counter()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def stop(self, timeout: float | None = None) -> bool:
+        """
+        写入所有未完成的请求后结束写入线程
+
+        :param timeout(float | None): 最长等待秒数，None 表示一直等待
+        :return: 是否已经全部写入
+        """
+        try:
+            flushed = self.flush(timeout)
+        finally:
+            with self._cond:
+                self._stopping = True
+                self._cond.notify_all()
+                thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        return flushed
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while self._written >= self._requested and not self._stopping:
+                    self._cond.wait()
+                if self._written >= self._requested:
+                    return  # 正在停止且没有待写入的请求
+                # 防抖：等到一段时间内没有新的请求，或者已经等了足够久，或者被要求立即写入
+                while not (self._flush_requested or self._stopping):
+                    now = time.perf_counter()
+                    deadline = min(
+                        self._last_request + self.debounce,
+                        self._first_pending + self.max_delay,
+                    )
+                    if now >= deadline:
+                        break
+                    self._cond.wait(deadline - now)
+                target = self._requested
+                first_pending = self._first_pending
+                self._first_pending = None
+                self._flush_requested = False
+
+            try:
+                start = time.perf_counter()
+                text = self.serialize()
+                serialized = time.perf_counter()
+                atomic_write(self.filepath(), text)
+                finished = time.perf_counter()
+            except Exception as e:
+                with self._cond:
+                    self._last_error = e
+                    self._cond.notify_all()
+                    if self._stopping:
+                        # 停止时不再跳过防抖反复重试，放弃写入，未写入的请求保留在 pending 中
+                        return
+                    # 保留请求，等下一次防抖后重试
+                    if self._first_pending is None:
+                        self._first_pending = time.perf_counter()
+                    self._last_request = time.perf_counter()
+                continue
+
+            with self._cond:
+                self._written = target
+                self._last_error = None
+                self._writes += 1
+                self._bytes = len(text.encode("utf-8"))
+                self._last_write_at = time.time()
+                self._serialize_ms.append((serialized - start) * 1000)
+                self._write_ms.append((finished - serialized) * 1000)
+                self._delay_ms.append((finished - first_pending) * 1000)
+                self._cond.notify_all()
+
+    def metrics(self) -> Dict[str, object]:
+        """
+        :return: 写入次数、合并掉的请求数以及最近若干次写入的耗时，单位为毫秒
+        """
+
+        def summary(samples: Deque[float]) -> Dict[str, float]:
+            if not samples:
+                return {"最近": 0.0, "p50": 0.0, "最大": 0.0}
+            return {
+                "最近": round(samples[-1], 1),
+                "p50": round(statistics.median(samples), 1),
+                "最大": round(max(samples), 1),
+            }
+
+        with self._cond:
+            return {
+                "保存请求次数": self._requested,
+                "实际写入次数": self._writes,
+                "合并的请求数": self._written - self._writes,
+                "待写入": self._written < self._requested,
+                "最近写入大小 (字节)": self._bytes,
+                "最近写入时间": (
+                    time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self._last_write_at))
+                    if self._last_write_at is not None
+                    else None
+                ),
+                "最近错误": None if self._last_error is None else str(self._last_error),
+                "序列化耗时 (ms)": summary(self._serialize_ms),
+                "写入耗时 (ms)": summary(self._write_ms),
+                "请求到落盘 (ms)": summary(self._delay_ms),
+            }
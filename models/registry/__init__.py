@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import os
+import re
+import threading
+
+from collections import OrderedDict
+from typing import Dict, List
+
+from context import get_workdir
+from models.data import ApplicationData
+from models.pathcache import path_trees
+
+__all__ = ["GraphRegistry", "registry", "DEFAULT_PARK"]
+
+# 默认景区，对应原来的 data/graph.json
+DEFAULT_PARK = "默认景区"
+# 内存占用的粗略估计，单位为字节，按 pydantic 对象加上派生索引实测得到
+SPOT_BYTES = 1000
+EDGE_BYTES = 1200
+# 景区名称只允许文字、数字、下划线和连字符，同时也是文件名
+PARK_NAME_PATTERN = re.compile(r"^[\w\-]+$")
+
+
+def estimate_bytes(app_data: ApplicationData) -> int:
+    """
+    粗略估计一个景区在内存中占用的字节数，包括已经建立的距离矩阵
+
+    :param app_data(ApplicationData): 景区数据
+    :return: 估计的字节数
+    """
+    graph = app_data.graph
+    total = graph.nodes * SPOT_BYTES + len(graph.edges) * EDGE_BYTES
+    for matrix in graph._distance_matrices.values():
+        total += graph.nodes * graph.nodes * 8
+    return total
+
+
+class GraphRegistry:
+    """
+    同一个进程中按名称管理多个景区的图数据
+
+    每个景区是 directory 下的一个 <名称>.json 文件，默认景区仍然使用原来的 data/graph.json。
+    景区在第一次被使用时才加载，所有已加载景区的估计内存占用超过 memory_budget 时，
+    按最近最少使用的顺序换出：先把未保存的修改写完，再写一份紧凑快照，之后重新加载时直接读取快照；
+    换出的对象不能再修改，仍在使用它的会话修改时会得到 GraphRetiredError
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        default_file: str,
+        memory_budget: int,
+    ) -> None:
+        """
+        :param directory(str): 存放各景区数据文件的目录
+        :param default_file(str): 默认景区的数据文件路径
+        :param memory_budget(int): 已加载景区的内存预算，单位为字节
+        """
+        self.directory = directory
+        self.default_file = default_file
+        self.memory_budget = memory_budget
+        self._lock = threading.RLock()
+        self._loaded: OrderedDict[str, ApplicationData] = OrderedDict()
+        # 加载与换出的次数
+        self.loads = 0
+        self.evictions = 0
+
+    def path(self, name: str) -> str:
+        """
+        :param name(str): 景区名称
+        :return: 景区的数据文件路径
+        """
+        if name == DEFAULT_PARK:
+            return self.default_file
+        return os.path.join(self.directory, f"{name}.json")
+
+    def names(self) -> List[str]:
+        """
+        :return: 所有景区的名称，默认景区排在最前面
+        """
+        names = set()
+        if os.path.isdir(self.directory):
+            for filename in os.listdir(self.directory):
+                stem, ext = os.path.splitext(filename)
+                if ext == ".json" and PARK_NAME_PATTERN.match(stem):
+                    names.add(stem)
+        with self._lock:
+            names.update(self._loaded)
+        names.discard(DEFAULT_PARK)
+        return [DEFAULT_PARK] + sorted(names)
+
+    def create(self, name: str) -> ApplicationData:
+        """
+        新建一个空的景区
+
+        :param name(str): 景区名称
+        :return: 新景区的数据
+        """
+        if not PARK_NAME_PATTERN.match(name):
+            raise ValueError(f"景区名称 {name} 只能包含文字、数字、下划线和连字符")
+        if name in self.names():
+            raise ValueError(f"景区 {name} 已存在")
+        app_data = self.get(name)
+        app_data.save()
+        return app_data
+
+    def get(self, name: str, background: bool = False) -> ApplicationData:
+        """
+        获取景区数据，没有加载时先加载，并把它标记为最近使用
+
+        :param name(str): 景区名称
+        :param background(bool): 是否在后台线程中加载，调用方需要通过 loaded / wait_until_loaded 等待
+        :return: 景区数据
+        """
+        with self._lock:
+            app_data = self._loaded.get(name)
+            if app_data is not None:
+                self._loaded.move_to_end(name)
+            else:
+                if name != DEFAULT_PARK and not PARK_NAME_PATTERN.match(name):
+                    raise ValueError(f"景区名称 {name} 无效")
+                app_data = ApplicationData(file=self.path(name))
+                self._loaded[name] = app_data
+                self.loads += 1
+                app_data.read_in_background()
+
+        if not background:
+            app_data.wait_until_loaded()
+        self._evict(keep=name)
+        return app_data
+
+    def _evict(self, keep: str) -> None:
+        """
+        内存占用超过预算时按最近最少使用的顺序换出景区
+
+        :param keep(str): 刚刚使用的景区，不会被换出
+        """
+        while True:
+            with self._lock:
+                if self.resident_bytes() <= self.memory_budget:
+                    return
+                victim = next(
+                    (
+                        name
+                        for name, app_data in self._loaded.items()
+                        if name != keep and app_data.loaded
+                    ),
+                    None,
+                )
+                if victim is None:
+                    return
+                app_data = self._loaded.pop(victim)
+                self.evictions += 1
+            # 正在使用这个对象的会话还能查询路线，但不能再修改或保存，
+            # 否则它会另起写入线程覆盖重新加载的数据；下次重跑时会重新从注册表获取
+            app_data.retire()
+            # 换出由任意一个会话的 get 触发，失败只打印出来，不能抛给这个无关的会话，清理也要照常进行
+            try:
+                app_data.close()
+            except Exception as e:
+                print(f"Background save of {app_data.file} failed: {e}")
+            finally:
+                try:
+                    app_data.write_compact()
+                except Exception as e:
+                    print(f"Writing snapshot of {app_data.file} failed: {e}")
+                path_trees.forget(app_data.graph._uid)
+
+    def resident_bytes(self) -> int:
+        """
+        :return: 所有已加载景区的估计内存占用
+        """
+        with self._lock:
+            return sum(
+                estimate_bytes(app_data)
+                for app_data in self._loaded.values()
+                if app_data.loaded
+            )
+
+    def close(self) -> None:
+        """
+        保存所有已加载景区的修改，用于程序退出前
+        """
+        with self._lock:
+            loaded = list(self._loaded.values())
+        for app_data in loaded:
+            if app_data.loaded:
+                try:
+                    flushed = app_data.close(timeout=30)
+                except Exception as e:
+                    print(f"Background save of {app_data.file} failed: {e}")
+                    flushed = False
+                if not flushed:
+                    app_data.save()
+
+    def stats(self) -> List[Dict[str, object]]:
+        """
+        :return: 已加载景区的使用顺序与估计内存占用，最近使用的排在最后
+        """
+        with self._lock:
+            return [
+                {
+                    "景区": name,
+                    "已加载": app_data.loaded,
+                    "景点数量": app_data.graph.live_nodes if app_data.loaded else None,
+                    "估计内存 (MB)": (
+                        round(estimate_bytes(app_data) / 2**20, 2)
+                        if app_data.loaded
+                        else None
+                    ),
+                }
+                for name, app_data in self._loaded.items()
+            ]
+
+
+registry = GraphRegistry(
+    directory=os.path.join(get_workdir(), "data/parks"),
+    default_file=os.path.join(get_workdir(), "data/graph.json"),
+    memory_budget=int(os.environ.get("SCENIC_MEMORY_BUDGET_MB", "512")) * 2**20,
+)
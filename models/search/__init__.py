@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import math
+import unicodedata
+
+from typing import Dict, FrozenSet, Iterable, List, Set, Tuple
+
+__all__ = ["SearchIndex", "normalize", "ngrams"]
+
+# 名称匹配的权重高于简介匹配
+NAME_WEIGHT = 3.0
+DESCRIPTION_WEIGHT = 1.0
+# 命中的 n-gram 至少要占查询的这个比例才算匹配，允许少量错字
+MIN_MATCH_RATIO = 0.4
+# 候选集合的上限，超过之后剩下的 n-gram 只给已有候选加分，不再引入新的候选
+MAX_CANDIDATES = 2000
+
+
+def normalize(text: str) -> str:
+    """
+    统一全角半角与大小写，并去掉空白和标点，只保留文字和数字
+
+    :param text(str): 原始文本
+    :return: 规范化后的文本
+    """
+    text = unicodedata.normalize("NFKC", text).lower()
+    return "".join(ch for ch in text if ch.isalnum())
+
+
+def ngrams(text: str, unigrams: bool = False) -> FrozenSet[str]:
+    """
+    把文本切分为字符二元组，中文不需要分词
+
+    :param text(str): 规范化后的文本
+    :param unigrams(bool): 是否同时包含单个字符，只有一个字的查询需要用到
+    :return: n-gram 集合
+    """
+    grams = {text[i : i + 2] for i in range(len(text) - 1)}
+    if unigrams or len(text) == 1:
+        grams.update(text)
+    return frozenset(grams)
+
+
+class SearchIndex:
+    """
+    景点名称与简介的 n-gram 倒排索引
+
+    名称按单字和二元组索引，简介只按二元组索引。查询同样切分为 n-gram，
+    按命中 n-gram 的稀有程度（idf）和所在字段加权打分，名称完全相同或以查询开头的额外加分。
+    一两个错字只会让少量 n-gram 失配，因此仍然能找到结果。
+    索引随景点的增删改增量更新，不需要重建
+    """
+
+    def __init__(self) -> None:
+        self._name_postings: Dict[str, Set[int]] = {}
+        self._description_postings: Dict[str, Set[int]] = {}
+        # 景点索引 -> (规范化后的名称, 名称的 n-gram)，用于计算名称相似度以及删除时找到旧的 n-gram
+        self._names: Dict[int, Tuple[str, FrozenSet[str]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    @staticmethod
+    def _index(postings: Dict[str, Set[int]], grams: Iterable[str], node_id: int) -> None:
+        for gram in grams:
+            docs = postings.get(gram)
+            if docs is None:
+                postings[gram] = {node_id}
+            else:
+                docs.add(node_id)
+
+    @staticmethod
+    def _unindex(postings: Dict[str, Set[int]], grams: Iterable[str], node_id: int) -> None:
+        for gram in grams:
+            docs = postings.get(gram)
+            if docs is None:
+                continue
+            docs.discard(node_id)
+            if not docs:
+                del postings[gram]
+
+    def add(self, node_id: int, name: str, description: str) -> None:
+        """
+        :param node_id(int): 景点索引
+        :param name(str): 景点名称
+        :param description(str): 景点简介
+        """
+        normalized = normalize(name)
+        name_grams = ngrams(normalized, unigrams=True)
+        self._names[node_id] = (normalized, name_grams)
+        self._index(self._name_postings, name_grams, node_id)
+        self._index(self._description_postings, ngrams(normalize(description)), node_id)
+
+    def remove(self, node_id: int, description: str) -> None:
+        """
+        :param node_id(int): 景点索引
+        :param description(str): 景点当前的简介，用来找到需要删除的 n-gram
+        """
+        entry = self._names.pop(node_id, None)
+        if entry is None:
+            return
+        self._unindex(self._name_postings, entry[1], node_id)
+        self._unindex(self._description_postings, ngrams(normalize(description)), node_id)
+
+    def update(
+        self,
+        node_id: int,
+        name: str | None = None,
+        old_description: str | None = None,
+        description: str | None = None,
+    ) -> None:
+        """
+        只更新发生变化的 n-gram
+
+        :param node_id(int): 景点索引
+        :param name(str | None): 新的名称，None 表示不变
+        :param old_description(str | None): 原来的简介，修改简介时必须提供
+        :param description(str | None): 新的简介，None 表示不变
+        """
+        if node_id not in self._names:
+            return
+        if name is not None:
+            old_grams = self._names[node_id][1]
+            normalized = normalize(name)
+            new_grams = ngrams(normalized, unigrams=True)
+            self._unindex(self._name_postings, old_grams - new_grams, node_id)
+            self._index(self._name_postings, new_grams - old_grams, node_id)
+            self._names[node_id] = (normalized, new_grams)
+        if description is not None and old_description is not None:
+            old_grams = ngrams(normalize(old_description))
+            new_grams = ngrams(normalize(description))
+            self._unindex(self._description_postings, old_grams - new_grams, node_id)
+            self._index(self._description_postings, new_grams - old_grams, node_id)
+
+    def name_candidates(self, keyword: str) -> Set[int] | None:
+        """
+        名称可能包含关键字的景点：名称中必须出现关键字规范化之后的所有单字和二元组，
+        结果是名称包含关键字的景点的超集，调用方还需要逐个核对
+
+        :param keyword(str): 关键字
+        :return: 候选景点索引，关键字中没有文字或数字、无法用索引缩小范围时返回 None
+        """
+        normalized = normalize(keyword)
+        if not normalized:
+            return None
+        postings = []
+        for gram in ngrams(normalized, unigrams=True):
+            docs = self._name_postings.get(gram)
+            if not docs:
+                return set()
+            postings.append(docs)
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for docs in postings[1:]:
+            candidates &= docs
+            if not candidates:
+                break
+        return candidates
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[int, float]]:
+        """
+        :param query(str): 查询文本
+        :param limit(int): 最多返回的结果数
+        :return: 按得分从高到低排列的 (景点索引, 得分)
+        """
+        normalized = normalize(query)
+        if not normalized:
+            return []
+        grams = ngrams(normalized)
+        total = max(len(self._names), 1)
+
+        # 按 (字段, n-gram) 展开并从最稀有的开始处理，稀有的 n-gram 区分度高，优先用来产生候选
+        lookups = []
+        for gram in grams:
+            for postings, weight in (
+                (self._name_postings, NAME_WEIGHT),
+                (self._description_postings, DESCRIPTION_WEIGHT),
+            ):
+                docs = postings.get(gram)
+                if docs:
+                    idf = math.log(1 + total / len(docs))
+                    lookups.append((len(docs), gram, docs, weight * idf))
+        lookups.sort(key=lambda item: item[0])
+
+        scores: Dict[int, float] = {}
+        matched: Dict[int, Set[str]] = {}
+        for _, gram, docs, score in lookups:
+            # 先给已有候选加分，候选不足上限时再从倒排表中引入新的候选
+            if len(docs) > len(scores):
+                for node_id in scores:
+                    if node_id in docs:
+                        scores[node_id] += score
+                        matched[node_id].add(gram)
+            else:
+                for node_id in docs:
+                    if node_id in scores:
+                        scores[node_id] += score
+                        matched[node_id].add(gram)
+            if len(scores) >= MAX_CANDIDATES:
+                continue
+            for node_id in docs:
+                if node_id not in scores:
+                    scores[node_id] = score
+                    matched[node_id] = {gram}
+                    if len(scores) >= MAX_CANDIDATES:
+                        break
+
+        required = max(1, math.ceil(len(grams) * MIN_MATCH_RATIO))
+        results = []
+        for node_id, score in scores.items():
+            if len(matched[node_id]) < required:
+                continue
+            name, name_grams = self._names[node_id]
+            if name == normalized:
+                score += 10 * NAME_WEIGHT
+            elif name.startswith(normalized):
+                score += 3 * NAME_WEIGHT
+            # 名称与查询的 Dice 相似度，越接近完整名称得分越高
+            overlap = len(grams & name_grams)
+            score += NAME_WEIGHT * 2 * overlap / (len(grams) + len(name_grams))
+            results.append((node_id, score))
+        results.sort(key=lambda item: (-item[1], item[0]))
+        return results[:limit]
@@ -0,0 +1,322 @@
+from __future__ import annotations
+
+import heapq
+import math
+import time
+
+from typing import TYPE_CHECKING, Dict, List, Tuple
+
+if TYPE_CHECKING:
+    from models.graph import Path, TourGraph
+
+__all__ = ["SpatialIndex"]
+
+# 平均每个格子中的景点数，越大格子越少、每个格子里要比较的景点越多
+POINTS_PER_CELL = 2.0
+# 景点数比建立网格时增长了多少倍之后重新划分格子
+REGRID_GROWTH = 4
+
+Position = Tuple[float, float]
+
+
+class SpatialIndex:
+    """
+    有坐标的景点的均匀网格索引
+
+    按所有景点的外接矩形把平面划分为大小相同的正方形格子，使平均每个格子中约有 POINTS_PER_CELL 个景点。
+    新增、移动和删除景点只修改一个格子，都是 O(1)；最近邻查询从查询点所在的格子开始一圈一圈向外扩展，
+    第 k 近的景点比下一圈格子还近时停止，景点分布不太极端时只需要检查附近的几个格子，与景点总数无关。
+
+    同时维护 A* 使用的下界系数：所有两端都有坐标的道路中，权重与两端直线距离之比的最小值。
+    任意两个景点之间的最短路径权重都不小于 系数 × 直线距离，因此它是可采纳且一致的启发函数
+    """
+
+    def __init__(self, graph: TourGraph) -> None:
+        """
+        :param graph(TourGraph): 建立索引的图
+        """
+        self.graph = graph
+        self._positions: Dict[int, Position] = {}
+        self._cells: Dict[Tuple[int, int], List[int]] = {}
+        self._cell_size = 1.0
+        # 有景点的格子的范围 (最小列, 最小行, 最大列, 最大行)，删除景点时不缩小
+        self._cell_bounds: Tuple[int, int, int, int] | None = None
+        self._grid_points = 0
+        # 未删除但没有坐标的景点数，为 0 时才能使用 A*
+        self.missing = 0
+        # 权重类型 -> 下界系数，第一次使用时计算
+        self._ratios: Dict[str, float] = {}
+        self.build_ms = 0.0
+        self.regrids = 0
+        self.queries = 0
+        self.rebuild()
+
+    def rebuild(self) -> None:
+        """
+        按图中所有未删除景点的坐标从头建立网格
+        """
+        start = time.perf_counter()
+        positions: Dict[int, Position] = {}
+        missing = 0
+        for node_id in self.graph._live_ids:
+            position = self.graph.spots[node_id].position
+            if position is None:
+                missing += 1
+            else:
+                positions[node_id] = position
+        self._positions = positions
+        self.missing = missing
+        self._ratios = {}
+        self._regrid()
+        self.build_ms = (time.perf_counter() - start) * 1000
+
+    def _regrid(self) -> None:
+        """
+        按当前景点的分布重新选择格子大小并放入所有景点
+        """
+        positions = self._positions
+        if positions:
+            xs = [x for x, _ in positions.values()]
+            ys = [y for _, y in positions.values()]
+            width = max(xs) - min(xs)
+            height = max(ys) - min(ys)
+            area = max(width, 1e-9) * max(height, 1e-9)
+            cell_size = math.sqrt(area * POINTS_PER_CELL / len(positions))
+            # 景点几乎排成一条直线时面积接近 0，按长边分配
+            self._cell_size = max(
+                cell_size, max(width, height) * POINTS_PER_CELL / len(positions), 1e-6
+            )
+        else:
+            self._cell_size = 1.0
+        self._cells = {}
+        self._cell_bounds = None
+        for node_id, (x, y) in positions.items():
+            self._insert(node_id, x, y)
+        self._grid_points = len(positions)
+        self.regrids += 1
+
+    def _cell(self, x: float, y: float) -> Tuple[int, int]:
+        return math.floor(x / self._cell_size), math.floor(y / self._cell_size)
+
+    def _insert(self, node_id: int, x: float, y: float) -> None:
+        key = self._cell(x, y)
+        self._cells.setdefault(key, []).append(node_id)
+        gx, gy = key
+        if self._cell_bounds is None:
+            self._cell_bounds = (gx, gy, gx, gy)
+        else:
+            min_x, min_y, max_x, max_y = self._cell_bounds
+            self._cell_bounds = (
+                min(min_x, gx),
+                min(min_y, gy),
+                max(max_x, gx),
+                max(max_y, gy),
+            )
+
+    def node_added(self, node_id: int, position: Position | None) -> None:
+        """
+        :param node_id(int): 新景点的索引
+        :param position(Position | None): 新景点的坐标
+        """
+        if position is None:
+            self.missing += 1
+            return
+        self._positions[node_id] = position
+        self._insert(node_id, *position)
+        if len(self._positions) > max(self._grid_points, 16) * REGRID_GROWTH:
+            self._regrid()
+
+    def node_deleted(self, node_id: int) -> None:
+        """
+        :param node_id(int): 被删除的景点
+        """
+        position = self._positions.pop(node_id, None)
+        if position is None:
+            self.missing -= 1
+            return
+        key = self._cell(*position)
+        cell = self._cells[key]
+        cell.remove(node_id)
+        if not cell:
+            del self._cells[key]
+
+    def node_moved(self, node_id: int, position: Position) -> None:
+        """
+        设置或修改景点的坐标
+
+        :param node_id(int): 未删除的景点
+        :param position(Position): 新的坐标
+        """
+        if node_id in self._positions:
+            self.node_deleted(node_id)
+        else:
+            self.missing -= 1
+        self._positions[node_id] = position
+        self._insert(node_id, *position)
+        # 相连道路的直线距离变了，下界系数需要重新检查这些道路
+        for _, edge in self.graph.neighbors(node_id):
+            self.edge_changed(edge)
+
+    def edge_changed(self, edge: Path) -> None:
+        """
+        新增道路或者修改道路权重之后调用，删除道路不会让下界失效，不需要调用
+
+        :param edge(Path): 两端都未删除的道路
+        """
+        if not self._ratios:
+            return
+        length = self._length(edge)
+        if not length:
+            return
+        for weight_type, ratio in self._ratios.items():
+            self._ratios[weight_type] = min(ratio, getattr(edge, weight_type) / length)
+
+    def _length(self, edge: Path) -> float | None:
+        a = self._positions.get(edge.from_id)
+        b = self._positions.get(edge.to_id)
+        if a is None or b is None:
+            return None
+        return math.hypot(a[0] - b[0], a[1] - b[1])
+
+    def position(self, node_id: int) -> Position | None:
+        return self._positions.get(node_id)
+
+    def lower_bound(self, weight_type: str) -> float | None:
+        """
+        :param weight_type(str): 权重类型
+        :return: 下界系数，存在没有坐标的景点时返回 None，此时不能使用 A*
+        """
+        if self.missing or not self._positions:
+            return None
+        ratio = self._ratios.get(weight_type)
+        if ratio is None:
+            ratio = math.inf
+            for edge in self.graph.iter_edges():
+                length = self._length(edge)
+                if length:
+                    ratio = min(ratio, getattr(edge, weight_type) / length)
+            # 所有道路两端都重合时直线距离提供不了任何信息
+            ratio = 0.0 if ratio == math.inf else ratio
+            self._ratios[weight_type] = ratio
+        return ratio
+
+    def nearest(self, x: float, y: float, k: int = 1) -> List[Tuple[int, float]]:
+        """
+        :param x(float): 查询点的横坐标
+        :param y(float): 查询点的纵坐标
+        :param k(int): 返回的景点数
+        :return: 按直线距离从近到远排列的 (景点索引, 距离)
+        """
+        self.queries += 1
+        if k <= 0 or not self._positions:
+            return []
+        k = min(k, len(self._positions))
+        cells, positions, size = self._cells, self._positions, self._cell_size
+        cx, cy = self._cell(x, y)
+        min_x, min_y, max_x, max_y = self._cell_bounds
+        # 查询点在所有景点的范围之外时，离它更近的圈里不可能有景点
+        ring = max(min_x - cx, cx - max_x, min_y - cy, cy - max_y, 0)
+        last_ring = max(cx - min_x, max_x - cx, cy - min_y, max_y - cy)
+        # 大小为 k 的最大堆，保存目前最近的 k 个景点的 (-距离平方, 景点索引)
+        best: List[Tuple[float, int]] = []
+        while ring <= last_ring:
+            for key in _ring_cells(cx, cy, ring, min_x, min_y, max_x, max_y):
+                for node_id in cells.get(key, ()):
+                    px, py = positions[node_id]
+                    d2 = (px - x) ** 2 + (py - y) ** 2
+                    if len(best) < k:
+                        heapq.heappush(best, (-d2, node_id))
+                    elif d2 < -best[0][0]:
+                        heapq.heapreplace(best, (-d2, node_id))
+            # 下一圈格子里的景点与查询点的距离至少是 ring 个格子的宽度
+            if len(best) == k and -best[0][0] <= (ring * size) ** 2:
+                break
+            ring += 1
+        return sorted(
+            ((node_id, math.sqrt(-d2)) for d2, node_id in best),
+            key=lambda item: (item[1], item[0]),
+        )
+
+    def within(
+        self, min_x: float, min_y: float, max_x: float, max_y: float
+    ) -> List[int]:
+        """
+        :return: 坐标落在矩形范围内（包括边界）的景点索引，按索引升序排列
+        """
+        self.queries += 1
+        if min_x > max_x or min_y > max_y or not self._positions:
+            return []
+        positions = self._positions
+        low_x, low_y = self._cell(min_x, min_y)
+        high_x, high_y = self._cell(max_x, max_y)
+        bound_min_x, bound_min_y, bound_max_x, bound_max_y = self._cell_bounds
+        low_x, low_y = max(low_x, bound_min_x), max(low_y, bound_min_y)
+        high_x, high_y = min(high_x, bound_max_x), min(high_y, bound_max_y)
+        if low_x > high_x or low_y > high_y:
+            return []
+        if (high_x - low_x + 1) * (high_y - low_y + 1) > len(self._cells):
+            # 范围覆盖的格子比有景点的格子还多，直接检查所有景点
+            candidates = positions.keys()
+        else:
+            candidates = [
+                node_id
+                for gx in range(low_x, high_x + 1)
+                for gy in range(low_y, high_y + 1)
+                for node_id in self._cells.get((gx, gy), ())
+            ]
+        return sorted(
+            node_id
+            for node_id in candidates
+            if min_x <= positions[node_id][0] <= max_x
+            and min_y <= positions[node_id][1] <= max_y
+        )
+
+    def bounds(self) -> Tuple[float, float, float, float] | None:
+        """
+        :return: 所有有坐标的景点的外接矩形 (最小横坐标, 最小纵坐标, 最大横坐标, 最大纵坐标)，没有时返回 None
+        """
+        if not self._positions:
+            return None
+        xs = [x for x, _ in self._positions.values()]
+        ys = [y for _, y in self._positions.values()]
+        return min(xs), min(ys), max(xs), max(ys)
+
+    def stats(self) -> Dict[str, object]:
+        """
+        :return: 有坐标的景点数、格子的大小与数量以及查询次数
+        """
+        return {
+            "有坐标的景点": len(self._positions),
+            "没有坐标的景点": self.missing,
+            "格子边长": round(self._cell_size, 3),
+            "有景点的格子": len(self._cells),
+            "每格平均景点数": (
+                round(len(self._positions) / len(self._cells), 2) if self._cells else 0
+            ),
+            "重新划分次数": self.regrids,
+            "最近一次建立耗时 (ms)": round(self.build_ms, 2),
+            "A* 下界系数": {
+                weight_type: round(ratio, 6) for weight_type, ratio in self._ratios.items()
+            },
+            "查询次数": self.queries,
+        }
+
+
+def _ring_cells(
+    cx: int, cy: int, ring: int, min_x: int, min_y: int, max_x: int, max_y: int
+) -> List[Tuple[int, int]]:
+    """
+    :return: 与 (cx, cy) 的切比雪夫距离恰好为 ring、并且在有景点的范围内的格子
+    """
+    if ring == 0:
+        return [(cx, cy)]
+    keys = []
+    left, right = max(cx - ring, min_x), min(cx + ring, max_x)
+    for gy in (cy - ring, cy + ring):
+        if min_y <= gy <= max_y:
+            keys.extend((gx, gy) for gx in range(left, right + 1))
+    bottom, top = max(cy - ring + 1, min_y), min(cy + ring - 1, max_y)
+    for gx in (cx - ring, cx + ring):
+        if min_x <= gx <= max_x:
+            keys.extend((gx, gy) for gy in range(bottom, top + 1))
+    return keys
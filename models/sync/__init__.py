@@ -0,0 +1,565 @@
+"""
+在多个实例之间同步图的增量修改
+
+各个入口的离线实例原本只能复制整个数据文件来获得管理员的修改。这里把一段时间内的修改导出为一个增量修改集，
+其中只包含新增、修改或删除过的景点和道路的完整新记录，在其他实例上应用即可得到相同的数据：
+
+    changes = export_changes(graph, revision)     # 运行中的实例，导出某个修订号之后的修改
+    changes = diff_graphs(base_graph, graph)      # 对比两份数据
+    apply_changes(kiosk_graph, changes)
+
+修订号只在一个进程内有效，因此增量修改集用图内容的版本号（见 fingerprint）标识基准和结果：
+应用时当前数据必须与基准一致，已经是结果时什么也不做，所以同一个修改集重复应用是安全的
+"""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+import weakref
+
+from datetime import datetime
+from functools import partial
+from pydantic import BaseModel, Field
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Literal, Tuple
+
+from models.events import (
+    GraphEvent,
+    GraphReset,
+    PathAdded,
+    PathDeleted,
+    PathModified,
+    SpotAdded,
+    SpotDeleted,
+    SpotModified,
+)
+from models.graph import Path, Spot, _edge_key
+from exceptions import (
+    ChangeSetConflictError,
+    ChangeSetInvalidError,
+    ChangeSetUnavailableError,
+)
+
+if TYPE_CHECKING:
+    from models.graph import TourGraph
+
+__all__ = [
+    "ChangeSet",
+    "fingerprint",
+    "export_changes",
+    "diff_graphs",
+    "apply_changes",
+]
+
+# 各条记录的摘要按模 2^64 相加，与记录的顺序无关，修改一条记录只需要减去旧摘要、加上新摘要（见 _RunningDigest）
+_MODULUS = 2**64
+
+# (索引, 名称, 是否删除, 简介, 横坐标, 纵坐标)
+SpotRecord = Tuple[int, str, bool, str, float | None, float | None]
+# (索引, 一端景点索引, 另一端景点索引, 距离, 时间, 是否删除)
+PathRecord = Tuple[int, int, int, int, int, bool]
+
+
+class ChangeSet(BaseModel):
+    """
+    增量修改集
+
+    :param base(str): 基准数据的版本号
+    :param target(str): 应用之后数据的版本号
+    :param spots(List[Spot]): 有变化的景点的完整新记录（包括简介），按索引升序排列
+    :param edges(List[Path]): 有变化的道路的完整新记录，按索引升序排列
+    :param created_at(datetime): 导出的时间
+    """
+
+    format: Literal[1] = Field(default=1, description="修改集格式的版本")
+    base: str = Field(..., description="基准数据的版本号")
+    target: str = Field(..., description="应用之后数据的版本号")
+    spots: List[Spot] = Field(default_factory=list, description="有变化的景点")
+    edges: List[Path] = Field(default_factory=list, description="有变化的道路")
+    created_at: datetime = Field(default_factory=datetime.now, description="导出的时间")
+
+    @property
+    def empty(self) -> bool:
+        return not self.spots and not self.edges
+
+    def summary(self) -> Dict[str, object]:
+        """
+        :return: 修改集的基准、结果以及包含的记录数
+        """
+        return {
+            "基准版本": self.base,
+            "结果版本": self.target,
+            "景点记录": len(self.spots),
+            "道路记录": len(self.edges),
+            "导出时间": self.created_at.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+
+
+def _digest(record: SpotRecord | PathRecord) -> int:
+    data = repr(record).encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+
+def _spot_record(spot: Spot, description: str) -> SpotRecord:
+    return (spot.id, spot.name, spot.deleted, description, spot.x, spot.y)
+
+
+def _path_record(edge: Path) -> PathRecord:
+    return (
+        edge.id,
+        edge.from_id,
+        edge.to_id,
+        edge.distance,
+        edge.duration,
+        edge.deleted,
+    )
+
+
+def _version(nodes: int, edges: int, total: int) -> str:
+    return f"{nodes}-{edges}-{total % _MODULUS:016x}"
+
+
+def _parse_version(version: str) -> Tuple[int, int, int]:
+    try:
+        nodes, edges, total = version.split("-")
+        return int(nodes), int(edges), int(total, 16)
+    except ValueError:
+        raise ChangeSetInvalidError(f"版本号 {version} 的格式不正确")
+
+
+def _graph_digest(graph: TourGraph) -> int:
+    descriptions = graph.all_descriptions()
+    total = 0
+    for spot in graph.spots:
+        total += _digest(_spot_record(spot, descriptions[spot.id]))
+    for edge in graph.edges:
+        total += _digest(_path_record(edge))
+    return total
+
+
+class _RunningDigest:
+    """
+    一个图所有记录摘要之和：第一次使用时完整计算一次，之后订阅图的修改事件，
+    每次提交只对被修改的记录减去旧摘要、加上新摘要，导出和应用修改集的耗时只与修改的记录数有关
+    图被整体替换（重新加载、清空、批量导入）或者事件已经不完整时失效，下次使用时重新完整计算
+    """
+
+    def __init__(self, graph: TourGraph) -> None:
+        """
+        :param graph(TourGraph): 图，调用方持有图的写锁
+        """
+        # 只持有弱引用，不会让换出的图无法回收
+        self._graph = weakref.ref(graph)
+        self.revision = graph.revision
+        self.total = _graph_digest(graph)
+        self.valid = True
+        self._unsubscribe = graph.subscribe(self._on_event)
+
+    def _invalidate(self) -> None:
+        self.valid = False
+        self._unsubscribe()
+
+    def _on_event(self, event: GraphEvent) -> None:
+        if isinstance(event, GraphReset):
+            self._invalidate()
+        else:
+            self.catch_up()
+
+    def catch_up(self) -> None:
+        """
+        把修订号之后的修改计入摘要之和，应在修改图的线程中或者持有图的写锁时调用
+        同一次提交的事件都已经记录，收到其中第一个事件时一起处理，之后的事件直接跳过
+        """
+        graph = self._graph()
+        if graph is None:
+            self._invalidate()
+            return
+        if not self.valid or graph.revision == self.revision:
+            return
+        try:
+            events = graph.changes_since(self.revision)
+            if events is None or any(isinstance(e, GraphReset) for e in events):
+                self._invalidate()
+                return
+            base_spots, base_edges = _base_records(graph, events)
+            delta = 0
+            for node_id, base in base_spots.items():
+                record = _spot_record(graph.spots[node_id], graph.description(node_id))
+                delta += _digest(record) - (0 if base is None else _digest(base))
+            for edge_id, base in base_edges.items():
+                record = _path_record(graph.edges[edge_id])
+                delta += _digest(record) - (0 if base is None else _digest(base))
+        except Exception:
+            self._invalidate()
+            raise
+        self.total += delta
+        self.revision = graph.revision
+
+
+# 图的编号 -> 它的摘要之和，图被回收时删除
+_digests: Dict[int, _RunningDigest] = {}
+_digests_lock = threading.Lock()
+
+
+def _current_digest(graph: TourGraph) -> int:
+    """
+    :param graph(TourGraph): 图，调用方持有图的写锁
+    :return: 图当前所有记录的摘要之和
+    """
+    with _digests_lock:
+        digest = _digests.get(graph._uid)
+    if digest is not None:
+        digest.catch_up()
+    if digest is None or not digest.valid:
+        if digest is None:
+            weakref.finalize(graph, _forget_digest, graph._uid)
+        digest = _RunningDigest(graph)
+        with _digests_lock:
+            _digests[graph._uid] = digest
+    return digest.total
+
+
+def _forget_digest(uid: int) -> None:
+    with _digests_lock:
+        _digests.pop(uid, None)
+
+
+def fingerprint(graph: TourGraph) -> str:
+    """
+    图内容的版本号，由景点数、道路数（都包括已删除的）和所有记录摘要之和组成
+    内容相同的图在任何实例上都得到相同的版本号。第一次计算需要遍历所有景点和道路（包括读取所有简介），
+    之后按修改事件增量维护
+
+    :param graph(TourGraph): 图
+    :return: 版本号
+    """
+    with graph._write_lock:
+        total = _current_digest(graph)
+        return _version(len(graph.spots), len(graph.edges), total)
+
+
+def _check_spot(base: SpotRecord | None, record: SpotRecord) -> None:
+    # 程序中没有恢复已删除景点的操作，增量修改也不支持
+    if base is not None and base[2] and not record[2]:
+        raise ChangeSetUnavailableError(f"景点 ID {record[0]} 被删除后又恢复")
+
+
+def _check_path(base: PathRecord | None, record: PathRecord) -> None:
+    if base is None:
+        return
+    if base[1:3] != record[1:3]:
+        raise ChangeSetUnavailableError(f"道路 ID {record[0]} 的两端景点不同")
+    if base[5] and not record[5]:
+        raise ChangeSetUnavailableError(f"道路 ID {record[0]} 被删除后又恢复")
+
+
+def _changed_records(
+    graph: TourGraph,
+    base_spots: Dict[int, SpotRecord | None],
+    base_edges: Dict[int, PathRecord | None],
+) -> Tuple[List[Spot], List[Path], int]:
+    """
+    :param graph(TourGraph): 当前的图
+    :param base_spots(Dict[int, SpotRecord | None]): 可能有变化的景点在基准中的记录，None 表示基准中还没有这个景点
+    :param base_edges(Dict[int, PathRecord | None]): 可能有变化的道路在基准中的记录
+    :return: 确实有变化的景点和道路的新记录，以及从基准到现在摘要之和的变化
+    """
+    delta = 0
+    spots: List[Spot] = []
+    for node_id in sorted(base_spots):
+        spot = graph.spots[node_id]
+        description = graph.description(node_id)
+        record = _spot_record(spot, description)
+        base = base_spots[node_id]
+        if record == base:
+            continue
+        _check_spot(base, record)
+        delta += _digest(record) - (0 if base is None else _digest(base))
+        spots.append(spot.model_copy(update={"description": description}))
+    edges: List[Path] = []
+    for edge_id in sorted(base_edges):
+        edge = graph.edges[edge_id]
+        record = _path_record(edge)
+        base = base_edges[edge_id]
+        if record == base:
+            continue
+        _check_path(base, record)
+        delta += _digest(record) - (0 if base is None else _digest(base))
+        edges.append(edge.model_copy())
+    return spots, edges, delta
+
+
+def export_changes(graph: TourGraph, revision: int) -> ChangeSet:
+    """
+    根据修改事件导出某个修订号之后的修改，只读取被修改过的景点和道路，
+    基准中这些记录原来的内容由事件中的旧值倒推得到；导出期间持有图的写锁，不会夹杂其他线程的修改
+
+    修订号之后的事件已经不在保留范围内，或者期间发生过整体替换（重新加载、清空、批量导入）时无法倒推，
+    会抛出 ChangeSetUnavailableError，这时可以改用 diff_graphs 对比两份数据
+
+    :param graph(TourGraph): 运行中的图
+    :param revision(int): 基准的修订号，例如加载数据文件时的修订号
+    :return: 增量修改集
+    """
+    with graph._write_lock:
+        events = graph.changes_since(revision)
+        if events is None:
+            raise ChangeSetUnavailableError(f"修订号 {revision} 之后的修改记录已经不完整")
+        if any(isinstance(event, GraphReset) for event in events):
+            raise ChangeSetUnavailableError("期间图被整体替换过")
+        base_spots, base_edges = _base_records(graph, events)
+        new_spots, new_edges, delta = _changed_records(graph, base_spots, base_edges)
+        total = _current_digest(graph)
+        base_nodes = len(graph.spots) - sum(record is None for record in base_spots.values())
+        base_paths = len(graph.edges) - sum(record is None for record in base_edges.values())
+        return ChangeSet(
+            base=_version(base_nodes, base_paths, total - delta),
+            target=_version(len(graph.spots), len(graph.edges), total),
+            spots=new_spots,
+            edges=new_edges,
+        )
+
+
+def _base_records(
+    graph: TourGraph, events: List[GraphEvent]
+) -> Tuple[Dict[int, SpotRecord | None], Dict[int, PathRecord | None]]:
+    """
+    从现在的记录出发，按相反的顺序撤销每个事件，得到被修改过的记录在这些事件之前的内容
+
+    :param graph(TourGraph): 图
+    :param events(List[GraphEvent]): 某个修订号之后的所有事件，其中没有 GraphReset
+    :return: 被修改过的景点和道路原来的记录，None 表示那时还没有这个景点或道路
+    """
+    spots: Dict[int, list | None] = {}
+    edges: Dict[int, list | None] = {}
+    for event in reversed(events):
+        if isinstance(event, (SpotAdded, SpotModified, SpotDeleted)):
+            node_id = event.spot_id
+            if node_id not in spots:
+                spot = graph.spots[node_id]
+                spots[node_id] = list(_spot_record(spot, graph.description(node_id)))
+            record = spots[node_id]
+            if isinstance(event, SpotAdded):
+                spots[node_id] = None
+            elif isinstance(event, SpotDeleted):
+                record[2] = False
+            else:
+                if event.old_name is not None:
+                    record[1] = event.old_name
+                if event.old_description is not None:
+                    record[3] = event.old_description
+                if event.old_position is not None or event.new_position is not None:
+                    record[4:6] = event.old_position or (None, None)
+        elif isinstance(event, (PathAdded, PathModified, PathDeleted)):
+            edge_id = event.path_id
+            if edge_id not in edges:
+                edges[edge_id] = list(_path_record(graph.edges[edge_id]))
+            record = edges[edge_id]
+            if isinstance(event, PathAdded):
+                if event.restored:
+                    record[5] = True
+                else:
+                    edges[edge_id] = None
+            elif isinstance(event, PathDeleted):
+                record[1:6] = [event.from_id, event.to_id, event.distance, event.duration, False]
+            else:
+                record[3] = event.old_distance
+                record[4] = event.old_duration
+
+    base_spots = {
+        node_id: None if record is None else tuple(record)
+        for node_id, record in spots.items()
+    }
+    base_edges = {
+        edge_id: None if record is None else tuple(record)
+        for edge_id, record in edges.items()
+    }
+    return base_spots, base_edges
+
+
+def diff_graphs(base: TourGraph, graph: TourGraph) -> ChangeSet:
+    """
+    对比两份数据得到增量修改，不依赖修改事件，适合基准是之前分发出去的数据文件的情况
+    后一份数据必须是在前一份的基础上修改得到的（景点和道路只增不减）
+
+    :param base(TourGraph): 基准数据
+    :param graph(TourGraph): 修改之后的数据
+    :return: 增量修改集
+    """
+    if len(graph.spots) < len(base.spots) or len(graph.edges) < len(base.edges):
+        raise ChangeSetUnavailableError("修改之后的景点或道路比基准更少")
+    base_spots: Dict[int, SpotRecord | None] = {}
+    for spot in graph.spots:
+        old = base.spots[spot.id] if spot.id < len(base.spots) else None
+        old_record = None if old is None else _spot_record(old, base.description(old.id))
+        if old_record != _spot_record(spot, graph.description(spot.id)):
+            base_spots[spot.id] = old_record
+    base_edges: Dict[int, PathRecord | None] = {}
+    for edge in graph.edges:
+        old = base.edges[edge.id] if edge.id < len(base.edges) else None
+        old_record = None if old is None else _path_record(old)
+        if old_record != _path_record(edge):
+            base_edges[edge.id] = old_record
+    spots, edges, _ = _changed_records(graph, base_spots, base_edges)
+    return ChangeSet(
+        base=fingerprint(base), target=fingerprint(graph), spots=spots, edges=edges
+    )
+
+
+def apply_changes(graph: TourGraph, changes: ChangeSet) -> bool:
+    """
+    应用增量修改：逐项调用图的增删改方法，派生索引只对修改的景点和道路增量维护，
+    订阅者收到与逐项修改相同的事件，版本号按事件增量维护，耗时只与修改的记录数有关
+    当前数据已经是修改集的结果时什么也不做；既不是基准也不是结果时抛出 ChangeSetConflictError，不做任何修改
+
+    整个过程持有图的写锁，后台保存的快照不会包含应用了一半的修改；
+    改名互换等无法逐项重放的修改集改为在一个事务中整体写入
+
+    :param graph(TourGraph): 要修改的图
+    :param changes(ChangeSet): 增量修改集
+    :return: 是否修改了图，重复应用时为 False
+    """
+    with graph._write_lock:
+        graph._check_resident()
+        total = _current_digest(graph)
+        current = _version(len(graph.spots), len(graph.edges), total)
+        if current == changes.target:
+            return False
+        if current != changes.base:
+            raise ChangeSetConflictError(changes.base, current)
+        try:
+            _verify(graph, changes, total)
+        except ChangeSetUnavailableError as e:
+            raise ChangeSetInvalidError(e.reason)
+        steps = _replay_steps(graph, changes)
+        if steps is not None:
+            for step in steps:
+                step()
+            return True
+        with graph.transaction() as tx:
+            # 新增的景点按索引顺序追加，写入道路时两端的景点都已经存在
+            for spot in sorted(changes.spots, key=lambda spot: spot.id):
+                tx.put_spot(spot)
+            for edge in sorted(changes.edges, key=lambda edge: edge.id):
+                tx.put_path(edge)
+    return True
+
+
+def _replay_steps(graph: TourGraph, changes: ChangeSet) -> List[Callable[[], None]] | None:
+    """
+    把修改集转换为图上的逐项修改，先在名称和道路的暂存状态上检查每一步都不会失败，
+    因此开始执行之后不会停在修改了一半的状态
+
+    按 删除景点、修改景点、新增景点、修改和删除道路、新增道路 的顺序，让被删除的景点和道路先让出名称和两端景点
+
+    :param graph(TourGraph): 与修改集基准一致的图，调用方持有图的写锁
+    :param changes(ChangeSet): 已经核对过的增量修改集
+    :return: 依次执行的修改，有某一步无法用图的方法完成时返回 None
+    """
+    # 暂存状态下名称与道路的占用情况，只记录与图中不同的部分
+    names: Dict[str, bool] = {}
+    keys: Dict[Tuple[int, int], bool] = {}
+
+    def name_taken(name: str) -> bool:
+        return names.get(name, name in graph._name_index)
+
+    def key_taken(key: Tuple[int, int]) -> bool:
+        return keys.get(key, key in graph._edge_index)
+
+    deletions: List[Callable[[], None]] = []
+    modifications: List[Callable[[], None]] = []
+    additions: List[Callable[[], None]] = []
+    nodes = len(graph.spots)
+    for spot in sorted(changes.spots, key=lambda spot: spot.id):
+        if spot.id >= nodes:
+            # 新景点的索引由 add_node 按顺序分配
+            if spot.id != nodes or name_taken(spot.name):
+                return None
+            nodes += 1
+            additions.append(partial(graph.add_node, spot))
+            if spot.deleted:
+                additions.append(partial(graph.delete_node, spot.id))
+            else:
+                names[spot.name] = True
+            continue
+        old = graph.spots[spot.id]
+        if spot.deleted and not old.deleted:
+            deletions.append(partial(graph.delete_node, spot.id))
+            if graph._name_index.get(old.name) == spot.id:
+                names[old.name] = False
+        fields: Dict[str, Any] = {}
+        if spot.name != old.name:
+            if name_taken(spot.name):
+                return None
+            fields["name"] = spot.name
+            if not spot.deleted:
+                names[old.name] = False
+                names[spot.name] = True
+        if spot.description != graph.description(spot.id):
+            fields["description"] = spot.description
+        if spot.position != old.position:
+            if spot.position is None:
+                return None  # modify_node 不能清除坐标
+            fields["position"] = spot.position
+        if fields:
+            modifications.append(partial(graph.modify_node, spot.id, **fields))
+    steps = deletions + modifications + additions
+
+    edges = len(graph.edges)
+    new_edges: List[Callable[[], None]] = []
+    for edge in sorted(changes.edges, key=lambda edge: edge.id):
+        key = _edge_key(edge.from_id, edge.to_id)
+        if edge.id >= edges:
+            if edge.id != edges or key_taken(key):
+                return None
+            edges += 1
+            new_edges.append(
+                partial(graph.add_path, edge.from_id, edge.to_id, edge.distance, edge.duration)
+            )
+            if edge.deleted:
+                new_edges.append(partial(graph.delete_path, edge.from_id, edge.to_id))
+            else:
+                keys[key] = True
+            continue
+        old = graph.edges[edge.id]
+        if old.deleted:
+            return None  # 已删除的道路不能再修改
+        if (edge.distance, edge.duration) != (old.distance, old.duration):
+            steps.append(
+                partial(graph.modify_path, edge.from_id, edge.to_id, edge.distance, edge.duration)
+            )
+        if edge.deleted:
+            steps.append(partial(graph.delete_path, edge.from_id, edge.to_id))
+            keys[key] = False
+    return steps + new_edges
+
+
+def _verify(graph: TourGraph, changes: ChangeSet, total: int) -> None:
+    """
+    用摘要核对修改集的内容与结果版本号一致，避免应用被截断或手工改动过的文件
+
+    :param graph(TourGraph): 与修改集基准一致的图
+    :param changes(ChangeSet): 增量修改集
+    :param total(int): 图当前所有记录的摘要之和
+    """
+    target_nodes, target_edges, _ = _parse_version(changes.target)
+    for spot in changes.spots:
+        if not (0 <= spot.id < target_nodes):
+            raise ChangeSetInvalidError(f"景点 ID {spot.id} 超出范围")
+        record = _spot_record(spot, spot.description)
+        if spot.id < len(graph.spots):
+            old = _spot_record(graph.spots[spot.id], graph.description(spot.id))
+            _check_spot(old, record)
+            total -= _digest(old)
+        total += _digest(record)
+    for edge in changes.edges:
+        if not (0 <= edge.id < target_edges):
+            raise ChangeSetInvalidError(f"道路 ID {edge.id} 超出范围")
+        record = _path_record(edge)
+        if edge.id < len(graph.edges):
+            old = _path_record(graph.edges[edge.id])
+            _check_path(old, record)
+            total -= _digest(old)
+        total += _digest(record)
+    if _version(target_nodes, target_edges, total) != changes.target:
+        raise ChangeSetInvalidError("记录的内容与结果版本号不符")
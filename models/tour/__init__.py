@@ -0,0 +1,299 @@
+from __future__ import annotations
+
+import math
+import random
+import time
+
+from typing import Callable, Dict, List, Tuple
+
+__all__ = ["greedy_tour", "tour_cost", "TourOptimizer"]
+
+# 每个景点只考虑距离最近的若干个景点作为新的相邻景点，局部搜索的每一轮是 O(n·k) 而不是 O(n²)
+NEIGHBORS = 10
+# Or-opt 每次移动的连续景点数上限
+OR_OPT_SEGMENT = 3
+# 模拟退火的初始温度，相对于贪心路线中每一段的平均权重
+INITIAL_TEMPERATURE = 0.05
+
+
+def greedy_tour(table: List[List[float]], stops: List[int]) -> List[int]:
+    """
+    最近邻贪心：从起点出发每次前往最近的未访问必经点，最后前往终点
+
+    :param table(List[List[float]]): 距离表，0 为起点，1 为终点
+    :param stops(List[int]): 必经点在距离表中的下标
+    :return: 以 0 开头、以 1 结尾的路线
+    """
+    tour = [0]
+    remaining = set(stops)
+    current = 0
+    while remaining:
+        row = table[current]
+        current = min(remaining, key=lambda j: (row[j], j))
+        remaining.remove(current)
+        tour.append(current)
+    tour.append(1)
+    return tour
+
+
+def tour_cost(table: List[List[float]], tour: List[int]) -> float:
+    """
+    :param table(List[List[float]]): 距离表
+    :param tour(List[int]): 路线
+    :return: 路线的总权重
+    """
+    return sum(table[a][b] for a, b in zip(tour, tour[1:]))
+
+
+class TourOptimizer:
+    """
+    起点和终点固定、经过所有必经点的路线的随时可停优化器
+
+    从给定的路线（通常是贪心路线）出发，交替使用两种基于近邻表的局部搜索：
+    - 2-opt：删去两段、反转中间的一段后重新连接
+    - Or-opt：把连续的 1 到 3 个必经点整体（可以反向）挪到别处
+    到达局部最优之后用 double-bridge 扰动跳出，并按模拟退火的规则决定是否接受扰动后的路线，
+    温度随已用时间线性下降。任何时候停止都返回目前为止最好的路线
+    """
+
+    def __init__(
+        self, table: List[List[float]], tour: List[int], seed: int | None = 0
+    ) -> None:
+        """
+        :param table(List[List[float]]): 对称的距离表
+        :param tour(List[int]): 初始路线，第一个和最后一个景点固定不动
+        :param seed(int | None): 随机数种子，相同的种子和时间预算下结果可以复现
+        """
+        self.table = table
+        self.tour = list(tour)
+        self.cost = tour_cost(table, self.tour)
+        self.initial_cost = self.cost
+        self.best = list(self.tour)
+        self.best_cost = self.cost
+        self._random = random.Random(seed)
+        self._pos = [0] * len(table)
+        self._index_positions()
+        self.near = [
+            sorted((j for j in range(len(table)) if j != i), key=row.__getitem__)[
+                :NEIGHBORS
+            ]
+            for i, row in enumerate(table)
+        ]
+        self.two_opt_moves = 0
+        self.or_opt_moves = 0
+        self.kicks = 0
+        self.accepted_worse = 0
+        # (距开始的毫秒数, 最好路线的总权重)，每次找到更好的路线时记录一次
+        self.history: List[Tuple[float, float]] = []
+        self.elapsed_ms = 0.0
+
+    def _index_positions(self) -> None:
+        for index, node in enumerate(self.tour):
+            self._pos[node] = index
+
+    def _reverse(self, i: int, j: int) -> None:
+        """
+        反转路线中第 i 到第 j 个景点
+        """
+        tour = self.tour
+        tour[i : j + 1] = tour[i : j + 1][::-1]
+        for index in range(i, j + 1):
+            self._pos[tour[index]] = index
+
+    def _two_opt(self, deadline: float) -> bool:
+        """
+        :param deadline(float): 截止时刻
+        :return: 这一轮是否有改进
+        """
+        table, tour, pos, near = self.table, self.tour, self._pos, self.near
+        last = len(tour) - 1
+        improved = False
+        for i in range(last):
+            if time.perf_counter() > deadline:
+                break
+            a, b = tour[i], tour[i + 1]
+            d_ab = table[a][b]
+            for c in near[a]:
+                d_ac = table[a][c]
+                if d_ac >= d_ab:
+                    break  # 近邻按距离排序，之后的都不会更短
+                j = pos[c]
+                if i + 1 < j < last:
+                    # a b ... c d -> a c ... b d
+                    d = tour[j + 1]
+                    delta = d_ac + table[b][d] - d_ab - table[c][d]
+                    if delta < 0:
+                        self._reverse(i + 1, j)
+                        self.cost += delta
+                        self.two_opt_moves += 1
+                        improved = True
+                        break
+                elif j < i:
+                    # c e ... a b -> c a ... e b
+                    e = tour[j + 1]
+                    delta = d_ac + table[e][b] - table[c][e] - d_ab
+                    if delta < 0:
+                        self._reverse(j + 1, i)
+                        self.cost += delta
+                        self.two_opt_moves += 1
+                        improved = True
+                        break
+        return improved
+
+    def _or_opt(self, deadline: float) -> bool:
+        """
+        :param deadline(float): 截止时刻
+        :return: 这一轮是否有改进
+        """
+        table, near = self.table, self.near
+        improved = False
+        for length in range(1, OR_OPT_SEGMENT + 1):
+            i = 1
+            while i + length < len(self.tour):
+                if time.perf_counter() > deadline:
+                    return improved
+                tour, pos = self.tour, self._pos
+                p, first = tour[i - 1], tour[i]
+                last, n = tour[i + length - 1], tour[i + length]
+                gain = table[p][first] + table[last][n] - table[p][n]
+                best_delta, best_move = 0.0, None
+                for end in (first, last):
+                    for c in near[end]:
+                        if table[end][c] >= gain:
+                            break
+                        k = pos[c]
+                        # c 左右两侧的道路，下标为道路左端景点的位置，不能与这一段相接
+                        for edge in (k - 1, k):
+                            if edge < 0 or edge >= len(tour) - 1:
+                                continue
+                            if i - 1 <= edge <= i + length - 1:
+                                continue
+                            x, y = tour[edge], tour[edge + 1]
+                            forward = table[x][first] + table[last][y]
+                            backward = table[x][last] + table[first][y]
+                            delta = min(forward, backward) - table[x][y] - gain
+                            if delta < best_delta:
+                                best_delta = delta
+                                best_move = (edge, backward < forward)
+                if best_move is None:
+                    i += 1
+                    continue
+                edge, reverse = best_move
+                segment = tour[i : i + length]
+                if reverse:
+                    segment.reverse()
+                if edge < i:
+                    self.tour = (
+                        tour[: edge + 1]
+                        + segment
+                        + tour[edge + 1 : i]
+                        + tour[i + length :]
+                    )
+                else:
+                    self.tour = (
+                        tour[:i]
+                        + tour[i + length : edge + 1]
+                        + segment
+                        + tour[edge + 1 :]
+                    )
+                self._index_positions()
+                self.cost += best_delta
+                self.or_opt_moves += 1
+                improved = True
+        return improved
+
+    def local_search(self, deadline: float) -> None:
+        """
+        反复使用 2-opt 和 Or-opt，直到都不能改进或者到达截止时刻
+
+        :param deadline(float): 截止时刻
+        """
+        while time.perf_counter() < deadline:
+            improved = self._two_opt(deadline)
+            improved = self._or_opt(deadline) or improved
+            if not improved:
+                break
+
+    def _kick(self) -> None:
+        """
+        double-bridge 扰动：把中间切成三段并交换后两段的顺序，2-opt 和 Or-opt 很难一步撤销
+        """
+        tour = self.tour
+        p1, p2, p3 = sorted(self._random.sample(range(1, len(tour) - 1), 3))
+        self.tour = tour[:p1] + tour[p2:p3] + tour[p1:p2] + tour[p3:]
+        self._index_positions()
+        self.cost = tour_cost(self.table, self.tour)
+        self.kicks += 1
+
+    def _remember_best(self, start: float) -> None:
+        if self.cost < self.best_cost:
+            self.best = list(self.tour)
+            self.best_cost = self.cost
+            self.history.append(
+                (round((time.perf_counter() - start) * 1000, 1), self.best_cost)
+            )
+
+    def run(
+        self,
+        time_budget: float,
+        should_stop: Callable[[Dict[str, object]], bool] | None = None,
+    ) -> List[int]:
+        """
+        在时间预算内优化路线
+
+        :param time_budget(float): 秒数
+        :param should_stop(Callable | None): 每次扰动之前以当前进度调用，返回 True 时提前结束
+        :return: 目前为止最好的路线
+        """
+        start = time.perf_counter()
+        deadline = start + time_budget
+        self.local_search(deadline)
+        self._remember_best(start)
+
+        # 中间的必经点少于 3 个时无法扰动，局部搜索的结果已经是最优的
+        if len(self.tour) >= 5:
+            legs = max(len(self.tour) - 1, 1)
+            initial_temperature = INITIAL_TEMPERATURE * self.initial_cost / legs
+            while time.perf_counter() < deadline:
+                if should_stop is not None and should_stop(
+                    {"目前最好的总权重": self.best_cost, "扰动次数": self.kicks}
+                ):
+                    break
+                previous, previous_cost = list(self.tour), self.cost
+                self._kick()
+                self.local_search(deadline)
+                self._remember_best(start)
+                if self.cost <= previous_cost:
+                    continue
+                progress = (time.perf_counter() - start) / time_budget
+                temperature = initial_temperature * max(0.0, 1 - progress)
+                if temperature > 0 and self._random.random() < math.exp(
+                    (previous_cost - self.cost) / temperature
+                ):
+                    self.accepted_worse += 1
+                    continue
+                self.tour, self.cost = previous, previous_cost
+                self._index_positions()
+
+        self.elapsed_ms = (time.perf_counter() - start) * 1000
+        return self.best
+
+    def report(self) -> Dict[str, object]:
+        """
+        :return: 相对初始路线的改进以及各种移动的次数
+        """
+        improvement = self.initial_cost - self.best_cost
+        return {
+            "初始路线总权重": self.initial_cost,
+            "优化后总权重": self.best_cost,
+            "改进": improvement,
+            "改进比例": (
+                round(improvement / self.initial_cost, 4) if self.initial_cost else 0.0
+            ),
+            "优化耗时 (ms)": round(self.elapsed_ms, 1),
+            "2-opt 次数": self.two_opt_moves,
+            "Or-opt 次数": self.or_opt_moves,
+            "扰动次数": self.kicks,
+            "接受的较差路线": self.accepted_worse,
+            "改进记录": self.history,
+        }
@@ -0,0 +1,425 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any, Dict, List, Tuple, Type
+
+from models.events import (
+    GraphEvent,
+    PathAdded,
+    PathDeleted,
+    PathModified,
+    SpotAdded,
+    SpotDeleted,
+    SpotModified,
+)
+from models.graph import Path, Spot, _edge_key, _path_fields
+from exceptions import (
+    SpotIdInvalidError,
+    SpotNameDuplicateError,
+    PathDuplicateError,
+    PathInvalidError,
+    TransactionClosedError,
+    TransactionConflictError,
+)
+
+if TYPE_CHECKING:
+    from models.graph import TourGraph
+
+__all__ = ["GraphTransaction"]
+
+
+class GraphTransaction:
+    """
+    TourGraph 的批量修改事务，由 TourGraph.transaction() 创建
+
+    事务中的每次操作都在暂存区上立即校验（名称、道路是否重复，索引是否有效），
+    被修改的景点和道路按写时复制的方式暂存，图本身在提交前保持不变。
+    提交时一次性换上新的景点和道路列表并只重建一次派生索引；
+    任何一次操作失败或者 with 块中抛出异常，整个事务都会被丢弃
+
+    各操作的参数与行为和 TourGraph 上的同名方法一致
+    """
+
+    def __init__(self, graph: TourGraph) -> None:
+        self.graph = graph
+        self._base_revision = graph.revision
+        self._base_nodes = len(graph.spots)
+        self._base_edges = len(graph.edges)
+        # 暂存区：被修改过的已有景点 / 道路的副本，以及新增的景点 / 道路
+        self._spots: Dict[int, Spot] = {}
+        self._edges: Dict[int, Path] = {}
+        self._new_spots: List[Spot] = []
+        self._new_edges: List[Path] = []
+        # 新增或修改过的景点简介，提交时一并写入
+        self._descriptions: Dict[int, str] = {}
+        # 暂存状态下的名称索引与道路索引
+        self._name_index: Dict[str, int] = dict(graph._name_index)
+        self._edge_index: Dict[Tuple[int, int], int] = dict(graph._edge_index)
+        self._closed = False
+        # 事务中的操作次数
+        self.operations = 0
+
+    def __enter__(self) -> GraphTransaction:
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+
+    def _check_open(self) -> None:
+        if self._closed:
+            raise TransactionClosedError()
+        self.operations += 1
+
+    @property
+    def nodes(self) -> int:
+        """
+        暂存状态下的景点数量，包括已删除的景点
+        """
+        return self._base_nodes + len(self._new_spots)
+
+    def spot(self, node_id: int) -> Spot:
+        """
+        :param node_id(int): 景点索引
+        :return: 暂存状态下的景点，只读
+        """
+        if node_id >= self._base_nodes:
+            return self._new_spots[node_id - self._base_nodes]
+        return self._spots.get(node_id) or self.graph.spots[node_id]
+
+    def _writable_spot(self, node_id: int) -> Spot:
+        if not (0 <= node_id < self.nodes):
+            raise SpotIdInvalidError(node_id)
+        if node_id >= self._base_nodes:
+            return self._new_spots[node_id - self._base_nodes]
+        spot = self._spots.get(node_id)
+        if spot is None:
+            spot = self._spots[node_id] = self.graph.spots[node_id].model_copy()
+        return spot
+
+    def _writable_edge(self, edge_id: int) -> Path:
+        if edge_id >= self._base_edges:
+            return self._new_edges[edge_id - self._base_edges]
+        edge = self._edges.get(edge_id)
+        if edge is None:
+            edge = self._edges[edge_id] = self.graph.edges[edge_id].model_copy()
+        return edge
+
+    def add_node(
+        self,
+        name: str,
+        description: str,
+        position: Tuple[float, float] | None = None,
+    ) -> int:
+        """
+        添加一个新的景点
+
+        :param name(str): 景点名称
+        :param description(str): 景点简介
+        :param position(Tuple[float, float] | None): 景点坐标
+        :return: 新景点的索引
+        """
+        self._check_open()
+        if name in self._name_index:
+            raise SpotNameDuplicateError(name)
+        node_id = self.nodes
+        self._new_spots.append(
+            Spot(
+                id=node_id,
+                name=name,
+                description=description,
+                x=position[0] if position else None,
+                y=position[1] if position else None,
+            )
+        )
+        self._descriptions[node_id] = description
+        self._name_index[name] = node_id
+        return node_id
+
+    def add_path(self, from_id: int, to_id: int, distance: int, duration: int) -> None:
+        """
+        为两个景点之间添加一条道路
+
+        :param from_id(int): 起始景点索引
+        :param to_id(int): 目标景点索引
+        :param distance(int): 路径长度
+        :param duration(int): 所需时间
+        """
+        self._check_open()
+        if not (0 <= from_id < self.nodes):
+            raise SpotIdInvalidError(from_id)
+        if not (0 <= to_id < self.nodes):
+            raise SpotIdInvalidError(to_id)
+        key = _edge_key(from_id, to_id)
+        if key in self._edge_index:
+            raise PathDuplicateError(from_id, to_id)
+        edge_id = self._base_edges + len(self._new_edges)
+        self._new_edges.append(
+            Path(
+                id=edge_id,
+                from_id=from_id,
+                to_id=to_id,
+                distance=distance,
+                duration=duration,
+            )
+        )
+        self._edge_index[key] = edge_id
+
+    def modify_node(
+        self,
+        target_id: int,
+        name: str | None = None,
+        description: str | None = None,
+        position: Tuple[float, float] | None = None,
+    ) -> None:
+        """
+        修改景点信息
+
+        :param target_id(int): 目标景点索引
+        :param name(str | None): 新的景点名称
+        :param description(str | None): 新的景点简介
+        :param position(Tuple[float, float] | None): 新的坐标
+        """
+        self._check_open()
+        spot = self._writable_spot(target_id)
+        if name is not None and name != spot.name:
+            if name in self._name_index:
+                raise SpotNameDuplicateError(name)
+            if not spot.deleted:
+                self._name_index.pop(spot.name, None)
+                self._name_index[name] = target_id
+            spot.name = name
+        if description is not None:
+            spot.description = description
+            self._descriptions[target_id] = description
+        if position is not None:
+            spot.x, spot.y = float(position[0]), float(position[1])
+
+    def delete_node(self, target_id: int) -> None:
+        """
+        删除景点
+
+        :param target_id(int): 目标景点索引
+        """
+        self._check_open()
+        spot = self._writable_spot(target_id)
+        if spot.deleted:
+            return
+        spot.deleted = True
+        if self._name_index.get(spot.name) == target_id:
+            del self._name_index[spot.name]
+
+    def modify_path(
+        self,
+        from_id: int,
+        to_id: int,
+        distance: int | None = None,
+        duration: int | None = None,
+    ) -> None:
+        """
+        修改道路信息
+
+        :param from_id(int): 起始景点索引
+        :param to_id(int): 目标景点索引
+        :param distance(int | None): 新的路径长度
+        :param duration(int | None): 新的所需时间
+        """
+        self._check_open()
+        edge_id = self._edge_index.get(_edge_key(from_id, to_id))
+        if edge_id is None:
+            raise PathInvalidError(from_id, to_id)
+        edge = self._writable_edge(edge_id)
+        if distance is not None:
+            edge.distance = distance
+        if duration is not None:
+            edge.duration = duration
+
+    def delete_path(self, from_id: int, to_id: int) -> None:
+        """
+        删除道路
+
+        :param from_id(int): 起始景点索引
+        :param to_id(int): 目标景点索引
+        """
+        self._check_open()
+        edge_id = self._edge_index.pop(_edge_key(from_id, to_id), None)
+        if edge_id is None:
+            return
+        self._writable_edge(edge_id).deleted = True
+
+    def put_spot(self, spot: Spot) -> None:
+        """
+        按索引整体写入一个景点的记录（包括简介），索引等于当前景点数量时为新增，用于同步其他实例导出的增量修改
+        不做重名检查，调用方需要保证这些记录来自与图当前内容一致的基准
+
+        :param spot(Spot): 完整的景点记录
+        """
+        self._check_open()
+        # 提交时简介会被移入简介存储并清空，不能修改调用方的对象
+        spot = spot.model_copy()
+        if spot.id == self.nodes:
+            self._new_spots.append(spot)
+        else:
+            old = self._writable_spot(spot.id)
+            if not old.deleted and self._name_index.get(old.name) == spot.id:
+                del self._name_index[old.name]
+            if spot.id >= self._base_nodes:
+                self._new_spots[spot.id - self._base_nodes] = spot
+            else:
+                self._spots[spot.id] = spot
+        if not spot.deleted:
+            self._name_index[spot.name] = spot.id
+        self._descriptions[spot.id] = spot.description
+
+    def put_path(self, edge: Path) -> None:
+        """
+        按索引整体写入一条道路的记录，索引等于当前道路数量时为新增，用于同步其他实例导出的增量修改
+
+        :param edge(Path): 完整的道路记录
+        """
+        self._check_open()
+        edge = edge.model_copy()
+        edges = self._base_edges + len(self._new_edges)
+        if edge.id > edges:
+            raise PathInvalidError(edge.from_id, edge.to_id)
+        for node_id in (edge.from_id, edge.to_id):
+            if not (0 <= node_id < self.nodes):
+                raise SpotIdInvalidError(node_id)
+        if edge.id == edges:
+            self._new_edges.append(edge)
+        else:
+            old = self._writable_edge(edge.id)
+            if not old.deleted:
+                self._edge_index.pop(_edge_key(old.from_id, old.to_id), None)
+            if edge.id >= self._base_edges:
+                self._new_edges[edge.id - self._base_edges] = edge
+            else:
+                self._edges[edge.id] = edge
+        if not edge.deleted:
+            self._edge_index[_edge_key(edge.from_id, edge.to_id)] = edge.id
+
+    def commit(self) -> None:
+        """
+        把暂存的修改一次性写入图中，只重建一次派生索引
+        """
+        if self._closed:
+            raise TransactionClosedError()
+        self._closed = True
+        if not (self._spots or self._edges or self._new_spots or self._new_edges):
+            return
+        graph = self.graph
+        # 检查冲突到替换完成之间不能有其他线程修改图
+        with graph._write_lock:
+            if graph.revision != self._base_revision:
+                # 事务期间有修改绕过了事务直接作用在图上，暂存区已经过期
+                raise TransactionConflictError()
+
+            spots = list(graph.spots)
+            for node_id, spot in self._spots.items():
+                spots[node_id] = spot
+            spots.extend(self._new_spots)
+            edges = list(graph.edges)
+            for edge_id, edge in self._edges.items():
+                edges[edge_id] = edge
+            edges.extend(self._new_edges)
+            graph._replace(spots, edges, self._descriptions, self._changes())
+
+    def _changes(self) -> List[Tuple[Type[GraphEvent], Dict[str, Any]]]:
+        """
+        对比暂存区与图中原来的景点和道路，得到这个事务包含的逐项修改
+        按 新增景点、修改景点、改接前的道路、新增道路、修改道路、删除道路、删除景点 的顺序排列，依次重放即可得到提交后的图；
+        两端景点变化的道路先按原来的两端删除，再按新的两端添加，恢复已删除的道路也发布添加事件，
+        最短路径树缓存等订阅者都能看到这些路线的变化
+
+        :return: (事件类型, 除修订号以外的字段) 列表
+        """
+        graph = self.graph
+        added_spots, modified_spots, deleted_spots = [], [], []
+        for spot in self._new_spots:
+            added_spots.append(
+                (
+                    SpotAdded,
+                    {
+                        "spot_id": spot.id,
+                        "name": spot.name,
+                        "description": self._descriptions.get(spot.id, ""),
+                        "position": spot.position,
+                    },
+                )
+            )
+            if spot.deleted:
+                deleted_spots.append(
+                    (SpotDeleted, {"spot_id": spot.id, "name": spot.name})
+                )
+        for node_id, spot in sorted(self._spots.items()):
+            old = graph.spots[node_id]
+            fields: Dict[str, Any] = {"spot_id": node_id}
+            if spot.name != old.name:
+                fields.update(old_name=old.name, new_name=spot.name)
+            if node_id in self._descriptions:
+                fields.update(
+                    old_description=graph.description(node_id),
+                    new_description=self._descriptions[node_id],
+                )
+            if spot.position != old.position:
+                fields.update(old_position=old.position, new_position=spot.position)
+            if len(fields) > 1:
+                modified_spots.append((SpotModified, fields))
+            if spot.deleted and not old.deleted:
+                deleted_spots.append(
+                    (SpotDeleted, {"spot_id": node_id, "name": spot.name})
+                )
+
+        moved_paths, added_paths, modified_paths, deleted_paths = [], [], [], []
+        for edge in self._new_edges:
+            added_paths.append((PathAdded, _path_fields(edge)))
+            if edge.deleted:
+                deleted_paths.append((PathDeleted, _path_fields(edge)))
+        for edge_id, edge in sorted(self._edges.items()):
+            old = graph.edges[edge_id]
+            moved = (edge.from_id, edge.to_id) != (old.from_id, old.to_id)
+            if moved and not old.deleted:
+                moved_paths.append((PathDeleted, _path_fields(old)))
+            if (moved or old.deleted) and not edge.deleted:
+                added_paths.append((PathAdded, {**_path_fields(edge), "restored": True}))
+                continue
+            if moved:
+                continue  # 原来的两端之间的道路已经删除，新记录也是删除状态，不影响路线
+            if (edge.distance, edge.duration) != (old.distance, old.duration):
+                modified_paths.append(
+                    (
+                        PathModified,
+                        {
+                            "path_id": edge_id,
+                            "from_id": edge.from_id,
+                            "to_id": edge.to_id,
+                            "old_distance": old.distance,
+                            "new_distance": edge.distance,
+                            "old_duration": old.duration,
+                            "new_duration": edge.duration,
+                        },
+                    )
+                )
+            if edge.deleted and not old.deleted:
+                deleted_paths.append((PathDeleted, _path_fields(edge)))
+        return (
+            added_spots
+            + modified_spots
+            + moved_paths
+            + added_paths
+            + modified_paths
+            + deleted_paths
+            + deleted_spots
+        )
+
+    def rollback(self) -> None:
+        """
+        丢弃暂存的所有修改
+        """
+        self._closed = True
+        self._spots.clear()
+        self._edges.clear()
+        self._new_spots.clear()
+        self._new_edges.clear()
+        self._descriptions.clear()
@@ -10,6 +10,9 @@ GUEST_FIND_ALL_SIMPLE_PATH_PAGE = Page(
     "pages/guest/find_all_simple_path.py", title="查询所有简单路径"
 )
 GUEST_GET_PLAN_PAGE = Page("pages/guest/get_plan.py", title="游览路线规划")
+GUEST_FIND_REACHABLE_PAGE = Page(
+    "pages/guest/find_reachable.py", title="查询可达范围"
+)
 GUEST_VIEW_MAP_PAGE = Page("pages/guest/view_map.py", title="景区地图")
 
 ADMIN_ADD_SPOT_PAGE = Page("pages/admin/add_spot.py", title="添加景点")
@@ -18,6 +21,8 @@ ADMIN_MODIFY_SPOT_PAGE = Page("pages/admin/modify_spot.py", title="修改景点"
 ADMIN_ADD_PATH_PAGE = Page("pages/admin/add_path.py", title="添加道路")
 ADMIN_MODIFY_PATH_PAGE = Page("pages/admin/modify_path.py", title="修改道路")
 ADMIN_REMOVE_PATH_PAGE = Page("pages/admin/remove_path.py", title="删除道路")
+ADMIN_BULK_IMPORT_PAGE = Page("pages/admin/bulk_import.py", title="批量导入")
+ADMIN_SYNC_PAGE = Page("pages/admin/sync.py", title="同步修改")
 
 DEBUG_DATA_VIEW_PAGE = Page("pages/debug/data_view.py", title="数据查看")
 DEBUG_GENERATE_DATA_PAGE = Page("pages/debug/generate_data.py", title="生成测试数据")
@@ -28,6 +33,7 @@ __all__ = [
     "GUEST_FIND_SHORTEST_PATH_PAGE",
     "GUEST_FIND_ALL_SIMPLE_PATH_PAGE",
     "GUEST_GET_PLAN_PAGE",
+    "GUEST_FIND_REACHABLE_PAGE",
     "GUEST_VIEW_MAP_PAGE",
     "ADMIN_ADD_SPOT_PAGE",
     "ADMIN_REMOVE_SPOT_PAGE",
@@ -35,6 +41,8 @@ __all__ = [
     "ADMIN_ADD_PATH_PAGE",
     "ADMIN_MODIFY_PATH_PAGE",
     "ADMIN_REMOVE_PATH_PAGE",
+    "ADMIN_BULK_IMPORT_PAGE",
+    "ADMIN_SYNC_PAGE",
     "DEBUG_DATA_VIEW_PAGE",
     "DEBUG_GENERATE_DATA_PAGE",
 ]
\ No newline at end of file
@@ -1,5 +1,7 @@
 import streamlit as st
 
+from pages.components import paged_search, spot_picker
+
 # 从 session_state 获取数据模型实例
 data = st.session_state.app_data
 
@@ -7,24 +9,16 @@ if "message" in st.session_state:
     st.toast(st.session_state.message, icon="✔️")
     del st.session_state.message
 
-available_spots = [spot for spot in data.graph.spots if not spot.deleted]
-spot_names = [spot.name for spot in available_spots]
-
-if len(spot_names) < 2:
+if data.graph.live_nodes < 2:
     st.warning("系统中至少需要有两个有效景点才能添加道路")
 else:
     st.write("请选择需要连接的两个景点，并提供道路信息")
 
     col1, col2 = st.columns(2)
     with col1:
-        from_spot_name = st.selectbox(
-            "起始景点", options=spot_names, key="path_from_spot_name", index=0
-        )
+        from_spot = spot_picker("path_from_spot", "起始景点", data.graph.list_spots)
     with col2:
-        default_index = 1 if len(spot_names) > 1 else 0
-        to_spot_name = st.selectbox(
-            "目标景点", options=spot_names, key="path_to_spot_name", index=default_index
-        )
+        to_spot = spot_picker("path_to_spot", "目标景点", data.graph.list_spots)
 
     distance = st.number_input(
         "道路距离 (米)", min_value=1, step=1, key="path_distance"
@@ -33,7 +27,8 @@ else:
         "所需时间 (分钟)", min_value=1, step=1, key="path_duration"
     )
 
-    if st.button("确认添加道路"):
+    if st.button("确认添加道路", disabled=from_spot is None or to_spot is None):
+        from_spot_name, to_spot_name = from_spot.name, to_spot.name
         if from_spot_name == to_spot_name:
             st.error("起始景点和目标景点不能是同一个")
         else:
@@ -48,7 +43,7 @@ else:
                     duration=duration,
                 )
 
-                data.save()
+                data.schedule_save()
 
                 st.session_state.message = (
                     f"成功添加从 {from_spot_name} 到 {to_spot_name} 的道路！"
@@ -62,19 +57,22 @@ else:
 st.divider()
 st.subheader("当前已存在的道路")
 
-path_exists = False
-processed_paths = set()
-for spot in data.graph.spots:
-    if not spot.deleted:
-        for path in spot.paths:
-            pair_key = tuple(sorted((spot.id, path.target_id)))
-            if pair_key not in processed_paths:
-                target_spot = data.graph.spots[path.target_id]
-                st.write(
-                    f"- **{spot.name}** <-> **{target_spot.name}** (距离: {path.distance}米, 时间: {path.duration}分钟)"
-                )
-                processed_paths.add(pair_key)
-                path_exists = True
-
-if not path_exists:
+if data.graph.paths == 0:
     st.info("当前系统中还没有任何道路")
+else:
+    paths = paged_search("add_path_list", data.graph.list_paths)
+    if paths:
+        st.dataframe(
+            [
+                {
+                    "景点": from_spot.name,
+                    "另一端景点": to_spot.name,
+                    "距离 (米)": path.distance,
+                    "时间 (分钟)": path.duration,
+                }
+                for from_spot, to_spot, path in paths
+            ],
+            hide_index=True,
+        )
+    else:
+        st.info("没有找到符合条件的道路")
@@ -1,6 +1,7 @@
 import streamlit as st
 
 from models.graph import Spot
+from pages.components import paged_search
 
 data = st.session_state.app_data
 
@@ -8,24 +9,40 @@ if "message" in st.session_state:
     st.toast(st.session_state.message, icon="✔️")
     del st.session_state.message
 
-st.write("当前景点信息如下")
-for spot in data.graph.spots:
-    if not spot.deleted:
-        st.write(f"- 名称: {spot.name} \n   - 简介: {spot.description}")
+st.write(f"当前共有 {data.graph.live_nodes} 个景点")
+spots = paged_search("add_spot_list", data.graph.list_spots)
+if spots:
+    st.dataframe(
+        [
+            {"名称": spot.name, "简介": data.graph.description(spot.id)}
+            for spot in spots
+        ],
+        hide_index=True,
+    )
+else:
+    st.info("没有找到符合条件的景点")
 
 st.text_input("景点名称", key="spot_name")
 st.text_input("景点简介", key="spot_description")
+# 坐标可选，所有景点都有坐标时地图按坐标绘制，最短路径查询也会更快
+if st.checkbox("设置坐标", key="spot_has_position"):
+    col1, col2 = st.columns(2)
+    col1.number_input("横坐标 (米)", value=0.0, key="spot_x")
+    col2.number_input("纵坐标 (米)", value=0.0, key="spot_y")
 
 if st.button("添加景点"):
+    has_position = st.session_state.spot_has_position
     spot = Spot(
         id=len(data.graph.spots),
         name=st.session_state.spot_name,
         description=st.session_state.spot_description,
         deleted=False,
+        x=st.session_state.spot_x if has_position else None,
+        y=st.session_state.spot_y if has_position else None,
     )
     try:
         data.graph.add_node(spot=spot)
-        data.save()
+        data.schedule_save()
         st.session_state.message = f"景点 {spot.name} 添加成功！"
         st.rerun()
     except Exception as e:
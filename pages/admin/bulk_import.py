@@ -0,0 +1,69 @@
+import io
+
+import streamlit as st
+
+from models.importer import detect_format, import_records, read_records
+
+data = st.session_state.app_data
+
+st.write(
+    "上传 CSV、JSON 或 JSON Lines 文件，一次性导入大量景点和道路。"
+    "所有记录校验完成后一次性写入，并只保存一次数据文件。"
+)
+with st.expander("查看记录格式"):
+    st.markdown(
+        """
+- `type`：记录类型，`spot` 或 `path`，缺省时根据是否有 `from` 字段判断
+- 景点：`name` 名称，`description` 简介（可选）
+- 道路：`from`、`to` 两端的景点名称，`distance` 距离 (米)，`duration` 时间 (分钟)
+
+道路两端可以是已有景点，也可以是同一文件中的新景点。JSON 文件可以是记录数组，
+也可以是 `{"spots": [...], "paths": [...]}`。
+"""
+    )
+    st.code(
+        "type,name,description,from,to,distance,duration\n"
+        "spot,北门,景区北入口,,,,\n"
+        "spot,湖心亭,,,,,\n"
+        "path,,,北门,湖心亭,350,6\n",
+        language="csv",
+    )
+
+uploaded = st.file_uploader("记录文件", type=["csv", "json", "jsonl"])
+strict = st.checkbox("存在无效记录时不导入任何数据", value=False)
+
+if uploaded is not None and st.button("开始导入", type="primary"):
+    stream = io.TextIOWrapper(uploaded, encoding="utf-8-sig", newline="")
+    try:
+        report = import_records(
+            data.graph, read_records(stream, detect_format(uploaded.name)), strict
+        )
+        if report.applied:
+            data.schedule_save()
+        st.session_state.import_report = report
+    except Exception as e:
+        st.error(f"导入失败: {e}")
+    finally:
+        stream.detach()  # 不关闭上传的文件对象
+
+report = st.session_state.get("import_report")
+if report is not None:
+    st.divider()
+    if report.applied:
+        st.success(
+            f"已导入 {report.spots_added} 个景点、{report.paths_added} 条道路"
+        )
+    else:
+        st.error(f"存在 {len(report.errors)} 条无效记录，未导入任何数据")
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("新增景点", report.spots_added)
+    col2.metric("新增道路", report.paths_added)
+    col3.metric("无效记录", len(report.errors))
+
+    if report.errors:
+        st.subheader("无效记录")
+        st.dataframe(
+            [{"行号": error.line, "原因": error.message} for error in report.errors],
+            hide_index=True,
+        )
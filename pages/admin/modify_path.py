@@ -1,5 +1,7 @@
 import streamlit as st
 
+from pages.components import paged_search
+
 data = st.session_state.app_data
 
 if "message" in st.session_state:
@@ -15,12 +17,11 @@ if st.session_state.editing_path_key:
     try:
         from_spot_name, to_spot_name = st.session_state.editing_path_key.split(" <-> ")
         from_spot = data.graph.find_spot_by_name(from_spot_name)
+        to_spot = data.graph.find_spot_by_name(to_spot_name)
 
-        current_path = next(
-            p
-            for p in from_spot.paths
-            if p.target_id == data.graph.find_spot_by_name(to_spot_name).id
-        )
+        current_path = data.graph.find_path(from_spot.id, to_spot.id)
+        if current_path is None:
+            raise ValueError(f"道路 {from_spot_name} <-> {to_spot_name} 不存在")
 
         st.info(f"正在修改道路: **{from_spot_name}** <-> **{to_spot_name}**")
 
@@ -35,11 +36,11 @@ if st.session_state.editing_path_key:
             try:
                 data.graph.modify_path(
                     from_id=from_spot.id,
-                    to_id=current_path.target_id,
+                    to_id=to_spot.id,
                     distance=new_distance,
                     duration=new_duration,
                 )
-                data.save()
+                data.schedule_save()
                 st.session_state.message = (
                     f"道路 {from_spot_name} <-> {to_spot_name} 修改成功！"
                 )
@@ -56,16 +57,12 @@ if st.session_state.editing_path_key:
 else:
     st.write("请先选择一条需要修改的道路")
 
-    path_options = []
-    processed_paths = set()
-    for spot in data.graph.spots:
-        if not spot.deleted:
-            for path in spot.paths:
-                pair_key = tuple(sorted((spot.id, path.target_id)))
-                if pair_key not in processed_paths:
-                    target_spot = data.graph.spots[path.target_id]
-                    path_options.append(f"{spot.name} <-> {target_spot.name}")
-                    processed_paths.add(pair_key)
+    path_options = [
+        f"{from_spot.name} <-> {to_spot.name}"
+        for from_spot, to_spot, _ in paged_search(
+            "modify_path_list", data.graph.list_paths
+        )
+    ]
 
     if not path_options:
         st.warning("当前没有可供修改的道路")
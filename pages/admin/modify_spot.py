@@ -1,6 +1,7 @@
 import streamlit as st
 
 from models.graph import Spot
+from pages.components import spot_picker
 
 data = st.session_state.app_data
 
@@ -8,13 +9,10 @@ if "message" in st.session_state:
     st.toast(st.session_state.message, icon="✔️")
     del st.session_state.message
 
-st.selectbox(
-    "选择需要修改的景点",
-    options=[spot.name for spot in data.graph.spots if not spot.deleted],
-    key="spot_name",
-)
+selected = spot_picker("modify_spot", "选择需要修改的景点", data.graph.list_spots)
 
-if st.button("确认选择"):
+if st.button("确认选择", disabled=selected is None):
+    st.session_state.spot_name = selected.name
     st.session_state.selected_spot_to_modify = True
     st.rerun()
 
@@ -22,23 +20,41 @@ if (
     hasattr(st.session_state, "selected_spot_to_modify")
     and st.session_state.selected_spot_to_modify
 ):
-    spot_to_modify: Spot = next(
-        spot
-        for spot in data.graph.spots
-        if spot.name == st.session_state.spot_name and not spot.deleted
-    )
+    spot_to_modify: Spot = data.graph.find_spot_by_name(st.session_state.spot_name)
     st.text_input("景点名称", value=spot_to_modify.name, key="new_spot_name")
     st.text_input(
-        "景点简介", value=spot_to_modify.description, key="new_spot_description"
+        "景点简介",
+        value=data.graph.description(spot_to_modify.id),
+        key="new_spot_description",
     )
+    position = spot_to_modify.position
+    # 已有的坐标只能修改不能清除
+    if st.checkbox(
+        "设置坐标",
+        value=position is not None,
+        disabled=position is not None,
+        key="new_spot_has_position",
+    ):
+        col1, col2 = st.columns(2)
+        col1.number_input(
+            "横坐标 (米)", value=position[0] if position else 0.0, key="new_spot_x"
+        )
+        col2.number_input(
+            "纵坐标 (米)", value=position[1] if position else 0.0, key="new_spot_y"
+        )
     if st.button("保存"):
         try:
             data.graph.modify_node(
                 target_id=spot_to_modify.id,
                 name=st.session_state.new_spot_name,
                 description=st.session_state.new_spot_description,
+                position=(
+                    (st.session_state.new_spot_x, st.session_state.new_spot_y)
+                    if st.session_state.new_spot_has_position
+                    else None
+                ),
             )
-            data.save()
+            data.schedule_save()
             st.session_state.message = f"景点 {spot_to_modify.name} 修改成功！"
             st.session_state.selected_spot_to_modify = False
             st.rerun()
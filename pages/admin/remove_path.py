@@ -2,23 +2,21 @@
 
 import streamlit as st
 
+from pages.components import paged_search
+
 data = st.session_state.app_data
 
 if "message" in st.session_state:
     st.toast(st.session_state.message, icon="✔️")
     del st.session_state.message
 
-path_options = []
-processed_paths = set()
-for spot in data.graph.spots:
-    if not spot.deleted:
-        for path in spot.paths:
-            pair_key = tuple(sorted((spot.id, path.target_id)))
-            if pair_key not in processed_paths:
-                target_spot = data.graph.spots[path.target_id]
-                # 创建一个用户友好的显示名称
-                path_options.append(f"{spot.name} <-> {target_spot.name}")
-                processed_paths.add(pair_key)
+# 创建一个用户友好的显示名称，只构建当前页的道路
+path_options = [
+    f"{from_spot.name} <-> {to_spot.name}"
+    for from_spot, to_spot, _ in paged_search(
+        "remove_path_list", data.graph.list_paths
+    )
+]
 
 if not path_options:
     st.warning("当前系统中没有可供删除的道路")
@@ -37,7 +35,7 @@ else:
             to_id = data.graph.find_spot_by_name(to_spot_name).id
 
             data.graph.delete_path(from_id, to_id)
-            data.save()
+            data.schedule_save()
 
             st.session_state.message = f"道路 {path_to_delete_str} 已成功删除！"
             st.rerun()
@@ -0,0 +1,63 @@
+import streamlit as st
+
+from exceptions import (
+    ChangeSetConflictError,
+    ChangeSetInvalidError,
+    ChangeSetUnavailableError,
+)
+from models.sync import ChangeSet
+
+data = st.session_state.app_data
+
+st.write(
+    "把本实例上的修改导出为增量修改文件，复制到其他入口的实例上应用，"
+    "只包含新增、修改或删除过的景点和道路，不需要复制整个数据文件。"
+)
+
+st.subheader("导出修改")
+changed = data.graph.revision - data.loaded_revision
+st.caption(
+    f"导出读取数据文件以来的所有修改（共 {changed} 次），其他实例需要使用同一份数据文件。"
+    "本实例重启过或者导入过大量数据时无法导出，请使用命令行 `python cli.py diff` 对比两份数据文件"
+)
+if st.button("导出修改"):
+    try:
+        st.session_state.sync_export = data.export_changes()
+    except ChangeSetUnavailableError as e:
+        st.session_state.sync_export = None
+        st.warning(str(e))
+exported: ChangeSet | None = st.session_state.get("sync_export")
+if exported is not None:
+    if exported.empty:
+        st.info("读取数据文件以来没有任何修改")
+    else:
+        st.json(exported.summary())
+        st.download_button(
+            "下载增量修改文件",
+            data=exported.model_dump_json(indent=2),
+            file_name=f"changes-{exported.target}.json",
+            mime="application/json",
+        )
+
+st.divider()
+
+st.subheader("应用修改")
+st.caption("当前数据必须与修改文件的基准版本一致，重复应用同一个文件不会有任何效果")
+uploaded = st.file_uploader("增量修改文件", type=["json"])
+if uploaded is not None:
+    try:
+        changes = ChangeSet.model_validate_json(uploaded.getvalue())
+    except ValueError as e:
+        st.error(f"无法解析的增量修改文件: {e}")
+    else:
+        st.json(changes.summary())
+        if st.button("应用修改", type="primary"):
+            try:
+                if data.apply_changes(changes):
+                    st.success(
+                        f"已应用 {len(changes.spots)} 个景点、{len(changes.edges)} 条道路的修改"
+                    )
+                else:
+                    st.info("当前数据已经包含这些修改，无需再次应用")
+            except (ChangeSetConflictError, ChangeSetInvalidError) as e:
+                st.error(str(e))
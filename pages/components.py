@@ -0,0 +1,119 @@
+import streamlit as st
+
+from typing import Callable, List, Tuple, TypeVar
+
+from models.graph import Spot
+from models.jobs import Job
+
+T = TypeVar("T")
+
+PAGE_SIZE = 20
+# 后台查询运行期间刷新进度的间隔秒数
+JOB_POLL_INTERVAL = 0.5
+
+
+def paged_search(
+    key: str,
+    fetch: Callable[[str, int, int], Tuple[List[T], bool]],
+    label: str = "按名称搜索",
+    page_size: int = PAGE_SIZE,
+) -> List[T]:
+    """
+    带搜索框和翻页按钮的分页列表，每次重跑只取当前页的数据
+
+    :param key(str): 组件在 session_state 中使用的键前缀，同一页面内需唯一
+    :param fetch(Callable): 取数据的函数，参数为 (关键字, 偏移量, 每页条数)，返回 (当前页条目, 是否还有下一页)
+    :param label(str): 搜索框的标题
+    :param page_size(int): 每页条数
+    :return: 当前页的条目
+    """
+    page_key = f"{key}_page"
+    keyword_key = f"{key}_keyword"
+    last_keyword_key = f"{key}_last_keyword"
+
+    keyword = st.text_input(label, key=keyword_key).strip()
+    # 搜索关键字变化后回到第一页
+    if st.session_state.get(last_keyword_key) != keyword:
+        st.session_state[last_keyword_key] = keyword
+        st.session_state[page_key] = 0
+    page = st.session_state.get(page_key, 0)
+
+    items, has_more = fetch(keyword, page * page_size, page_size)
+    # 数据被删除后当前页可能已经为空，退回上一页
+    if not items and page > 0:
+        st.session_state[page_key] = page - 1
+        st.rerun()
+
+    col_prev, col_info, col_next = st.columns([1, 2, 1])
+    if col_prev.button("上一页", key=f"{key}_prev", disabled=page == 0):
+        st.session_state[page_key] = page - 1
+        st.rerun()
+    col_info.caption(f"第 {page + 1} 页")
+    if col_next.button("下一页", key=f"{key}_next", disabled=not has_more):
+        st.session_state[page_key] = page + 1
+        st.rerun()
+
+    return items
+
+
+def spot_picker(
+    key: str,
+    label: str,
+    fetch: Callable[[str, int, int], Tuple[List[Spot], bool]],
+    page_size: int = PAGE_SIZE,
+) -> Spot | None:
+    """
+    选择一个景点：先按名称搜索并翻页，再从当前页中选择，每次重跑只取一页景点而不是列出所有景点
+
+    :param key(str): 组件在 session_state 中使用的键前缀，同一页面内需唯一
+    :param label(str): 选择框的标题
+    :param fetch(Callable): 取景点的函数，通常为 TourGraph.list_spots
+    :param page_size(int): 每页条数
+    :return: 选中的景点，没有符合条件的景点时返回 None
+    """
+    spots = paged_search(key, fetch, label=f"{label}（按名称搜索）", page_size=page_size)
+    if not spots:
+        st.info("没有找到符合条件的景点")
+        return None
+    names = [spot.name for spot in spots]
+    name = st.selectbox(label, options=names, key=f"{key}_selected")
+    return spots[names.index(name)]
+
+
+def job_status(job: Job, key: str) -> None:
+    """
+    显示后台查询的状态、进度和取消按钮
+
+    查询还没有结束时每隔 JOB_POLL_INTERVAL 秒只刷新这一部分，结束后重跑整个页面，由页面显示结果
+
+    :param job(Job): 查询
+    :param key(str): 组件在 session_state 中使用的键前缀，同一页面内需唯一
+    """
+    running = not job.done
+
+    @st.fragment(run_every=JOB_POLL_INTERVAL if running else None)
+    def status() -> None:
+        if running and job.done:
+            st.rerun()
+        snapshot = job.snapshot()
+        if job.done:
+            message = f"{job.kind}{job.status}，用时 {snapshot['已执行 (秒)']} 秒"
+            if job.error is not None:
+                st.error(f"{message}: {job.error}")
+            elif job.stopped:
+                st.warning(f"{message}，下面是停止之前得到的部分结果")
+            else:
+                st.success(message)
+            return
+        st.info(
+            f"{job.kind}{job.status}，已执行 {snapshot['已执行 (秒)']} 秒"
+            f"（超时 {job.timeout} 秒）"
+        )
+        progress = snapshot["进度"]
+        if progress:
+            for column, (name, value) in zip(st.columns(len(progress)), progress.items()):
+                column.metric(name, value)
+        if st.button("取消查询", key=f"{key}_cancel"):
+            job.cancel()
+
+    status()
@@ -1,6 +1,218 @@
 import streamlit as st
 
+from models.jobs import jobs
+from models.memory import graph_footprint, trace_load, trace_query
+from models.pathcache import path_trees
+from models.registry import EDGE_BYTES, SPOT_BYTES, estimate_bytes, registry
+from profiling import profiler
+
 data = st.session_state.app_data
 
 with st.expander("点击查看当前原始 JSON 数据"):
     st.json(data.model_dump_json())
+
+st.divider()
+
+st.subheader("后台保存")
+metrics = data.save_metrics()
+if metrics is None:
+    st.info("本次运行中还没有需要保存的修改")
+else:
+    col1, col2, col3 = st.columns(3)
+    col1.metric("保存请求次数", metrics["保存请求次数"])
+    col2.metric("实际写入次数", metrics["实际写入次数"])
+    col3.metric("合并的请求数", metrics["合并的请求数"])
+    st.json(metrics)
+if st.button("立即写入"):
+    if data.flush(timeout=30):
+        st.success("所有修改都已写入数据文件")
+    else:
+        st.warning("等待写入超时")
+
+st.divider()
+
+st.subheader("后台查询")
+st.caption(
+    "查询所有路径和游览路线规划在后台线程中执行，同时执行的查询数"
+    "可以通过环境变量 SCENIC_QUERY_WORKERS 调整"
+)
+job_stats = jobs.stats()
+col1, col2, col3 = st.columns(3)
+col1.metric("运行中", job_stats["运行中"])
+col2.metric("排队中", job_stats["排队中"])
+col3.metric("拒绝", job_stats["拒绝"])
+st.json(job_stats)
+job_entries = jobs.entries()
+if job_entries:
+    st.dataframe(
+        [
+            {
+                **entry,
+                "进度": "，".join(f"{name} {value}" for name, value in entry["进度"].items()),
+            }
+            for entry in job_entries
+        ],
+        hide_index=True,
+    )
+
+st.divider()
+
+st.subheader("已加载的景区")
+st.caption(
+    f"内存预算 {registry.memory_budget / 2**20:.0f} MB，"
+    "可以通过环境变量 SCENIC_MEMORY_BUDGET_MB 调整"
+)
+col1, col2, col3 = st.columns(3)
+col1.metric("估计内存 (MB)", round(registry.resident_bytes() / 2**20, 2))
+col2.metric("加载次数", registry.loads)
+col3.metric("换出次数", registry.evictions)
+st.dataframe(registry.stats(), hide_index=True)
+
+st.divider()
+
+st.subheader("图的修改事件")
+col1, col2 = st.columns(2)
+col1.metric("当前修订号", data.graph.revision)
+feed_stats = data.graph._events.stats()
+col2.metric("订阅者", feed_stats["订阅者"])
+recent = data.graph.changes_since(max(feed_stats["可查询的最早修订号"], data.graph.revision - 20))
+if recent:
+    st.dataframe(
+        [{"事件": type(event).__name__, **event.model_dump()} for event in recent],
+        hide_index=True,
+    )
+else:
+    st.info("本次运行中还没有修改过图")
+
+st.divider()
+
+st.subheader("最短路径树缓存")
+st.caption(
+    "所有会话共享，同一起点第二次查询时缓存完整的最短路径树，"
+    "内存预算可以通过环境变量 SCENIC_PATH_CACHE_MB 调整"
+)
+cache_stats = path_trees.stats()
+col1, col2, col3 = st.columns(3)
+col1.metric("缓存的树", cache_stats["缓存的树"])
+col2.metric("命中", cache_stats["命中"])
+col3.metric("未命中", cache_stats["未命中"])
+st.json(cache_stats)
+entries = path_trees.entries()
+if entries:
+    st.dataframe(entries, hide_index=True)
+if st.button("清空缓存"):
+    path_trees.clear()
+    st.rerun()
+
+st.divider()
+
+st.subheader("连通分量")
+components = data.graph._components
+if components is None:
+    st.info("还没有建立连通分量索引，第一次查询路径时建立")
+else:
+    st.json(components.stats())
+
+st.divider()
+
+st.subheader("空间索引")
+spatial = data.graph._spatial
+if spatial is None:
+    st.info("还没有建立空间索引，第一次按位置查找景点或查询最短路径时建立")
+else:
+    st.json(spatial.stats())
+
+st.divider()
+
+st.subheader("多层覆盖图")
+partition = data.graph._partition
+if partition is None:
+    st.info("还没有建立多层覆盖图，第一次使用覆盖图查询时建立")
+else:
+    st.json(partition.stats())
+    for overlay in data.graph._overlays.values():
+        st.json(overlay.stats())
+
+st.divider()
+
+st.subheader("景点简介存储")
+store = data.graph._descriptions
+if store is None:
+    st.info("景点简介保存在图数据中，没有使用单独的简介存储")
+else:
+    st.caption(store.filepath)
+    st.json(store.stats())
+
+st.divider()
+
+st.subheader("内存占用")
+st.caption(
+    "逐个对象统计当前景区及其索引和缓存实际占用的内存，景点很多时需要几秒钟；"
+    f"注册表按每个景点 {SPOT_BYTES} 字节、每条道路 {EDGE_BYTES} 字节估计，"
+    f"当前景区估计为 {estimate_bytes(data) / 2**20:.2f} MB"
+)
+if st.button("统计内存占用"):
+    with st.spinner("正在统计..."):
+        st.session_state.memory_footprint = graph_footprint(data.graph)
+footprint = st.session_state.get("memory_footprint")
+if footprint is not None:
+    summary = footprint.summary()
+    col1, col2, col3 = st.columns(3)
+    col1.metric("总大小 (MB)", summary["总大小 (MB)"])
+    col2.metric("每个景点 (字节)", summary["每个景点 (字节)"])
+    col3.metric("每条道路 (字节)", summary["每条道路 (字节)"])
+    st.dataframe(footprint.rows(), hide_index=True)
+
+    st.markdown("**按比例推算**")
+    col1, col2 = st.columns(2)
+    target_nodes = col1.number_input(
+        "目标景点数", min_value=1, value=max(footprint.nodes * 10, 1), step=1000
+    )
+    target_edges = col2.number_input(
+        "目标道路数", min_value=1, value=max(footprint.edges * 10, 1), step=1000
+    )
+    projection = footprint.project(int(target_nodes), int(target_edges))
+    if projection is None:
+        st.info("当前景区没有景点或道路，无法推算")
+    else:
+        st.metric("推算的内存占用 (MB)", round(projection["合计"] / 2**20, 1))
+        st.json({kind: round(size / 2**20, 2) for kind, size in projection.items()})
+
+st.markdown("**tracemalloc 内存分配跟踪**")
+st.caption("跟踪期间程序会慢好几倍，耗时只能相互比较")
+col1, col2 = st.columns(2)
+if col1.button("跟踪一次加载"):
+    with st.spinner("正在重新加载一份数据文件..."):
+        st.session_state.memory_trace = (
+            "加载",
+            trace_load(str(data.file), data.lazy_descriptions),
+        )
+if col2.button("跟踪一次查询"):
+    try:
+        st.session_state.memory_trace = ("查询", trace_query(data.graph))
+    except ValueError as e:
+        st.warning(str(e))
+trace = st.session_state.get("memory_trace")
+if trace is not None:
+    kind, report = trace
+    st.write(f"最近一次跟踪：{kind}")
+    st.json({key: value for key, value in report.items() if key != "新增最多的位置"})
+    st.dataframe(report["新增最多的位置"], hide_index=True)
+
+st.divider()
+
+st.subheader("启动耗时")
+st.caption("时间均相对于开始记录的时刻，重跑脚本不会覆盖冷启动时的记录")
+stages = profiler.stages()
+if stages:
+    st.dataframe(stages)
+else:
+    st.info("没有记录到启动阶段的耗时")
+
+st.subheader("模块导入耗时")
+top = st.number_input("显示累计耗时最多的前 N 个模块", min_value=5, value=30, step=5)
+modules = profiler.modules(top=int(top))
+if modules:
+    st.dataframe(modules)
+else:
+    st.info("没有记录到模块导入耗时")
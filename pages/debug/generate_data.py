@@ -25,7 +25,7 @@ st.warning(
 
 if st.button("生成 8 个景点和 15 条随机道路", type="primary"):
     try:
-        data.graph.spots.clear()
+        data.graph.clear()
 
         spot_names = [
             ("广东工业大学", "广东工业大学是一所以工为主、工理经管文法艺教结合、多科性协调发展的省属重点大学、广东省高水平大学重点建设高校，1958年开办本科教育，1995年由原广东工学院、广东机械学院和华南建设学院（东院）合并组建而成。2025泰晤士高等教育世界大学排名位列大陆高校第45—59位，2025软科世界大学学术排名位列全球第301—400名。"),
@@ -42,7 +42,7 @@ if st.button("生成 8 个景点和 15 条随机道路", type="primary"):
             new_spot = Spot(
                 id=i, name=name, description=description, deleted=False
             )
-            data.graph.spots.append(new_spot)
+            data.graph.add_node(new_spot)
 
         num_spots = len(data.graph.spots)
         generated_paths = set()
@@ -60,7 +60,7 @@ if st.button("生成 8 个景点和 15 条随机道路", type="primary"):
 
                 data.graph.add_path(from_id, to_id, distance, duration)
 
-        data.save()
+        data.schedule_save()
         st.toast("测试数据生成成功！", icon="🎉")
         st.rerun()
 
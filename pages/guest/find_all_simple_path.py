@@ -1,11 +1,16 @@
 import streamlit as st
-from exceptions import SpotIdInvalidError
+from exceptions import JobQueueFullError, SpotIdInvalidError
 from models.graph import Spot
+from models.jobs import DEFAULT_TIMEOUT, MAX_TIMEOUT, all_paths_job, jobs
+from pages.components import job_status
+
+# 最多显示的路径条数
+DISPLAY_LIMIT = 100
 
 data = st.session_state.app_data
 
 st.header("所有简单路径查询")
-st.info("查询任意两个景点之间的所有不重复的简单路径")
+st.info("查询任意两个景点之间的所有不重复的简单路径，查询在后台执行，可以随时取消")
 
 available_spots = [spot for spot in data.graph.spots if not spot.deleted]
 spot_names = [spot.name for spot in available_spots]
@@ -30,6 +35,15 @@ else:
             index=default_target_index if default_target_index < len(spot_names) else 0,
         )
 
+    timeout = st.number_input(
+        "超时 (秒)",
+        min_value=1,
+        max_value=MAX_TIMEOUT,
+        value=DEFAULT_TIMEOUT,
+        key="all_paths_timeout",
+        help="景点和道路很多时路径数量会急剧增长，超时后只显示已经找到的路径",
+    )
+
     if st.button("查询所有路径"):
         if start_spot_name == target_spot_name:
             st.warning("起始景点和目标景点不能相同。")
@@ -38,35 +52,49 @@ else:
                 start_id = data.graph.find_spot_by_name(start_spot_name).id
                 target_id = data.graph.find_spot_by_name(target_spot_name).id
 
-                all_paths_results = data.graph.find_all_paths(start_id, target_id)
-
-                st.subheader("查询结果")
-                if not all_paths_results:
-                    st.info(
-                        f"从 **{start_spot_name}** 到 **{target_spot_name}** 没有找到任何简单路径。"
-                    )
-                else:
-                    st.success(
-                        f"找到了 {len(all_paths_results)} 条从 **{start_spot_name}** 到 **{target_spot_name}** 的简单路径。"
-                    )
-
-                    # 按总距离排序路径，以便于查看
-                    sorted_paths = sorted(all_paths_results, key=lambda x: x[0])
-
-                    for i, (total_dist, total_duration, path_ids) in enumerate(
-                        sorted_paths
-                    ):
-                        with st.container(border=True):
-                            st.markdown(f"#### 路径 {i+1}")
-                            path_names = [
-                                data.graph.spots[spot_id].name for spot_id in path_ids
-                            ]
-                            st.write(f"**路径:** {' -> '.join(path_names)}")
-                            col1, col2 = st.columns(2)
-                            col1.metric("总距离", f"{total_dist} 米")
-                            col2.metric("总时间", f"{total_duration} 分钟")
+                # 同一个会话重新查询时取消上一次还没有结束的查询
+                previous = jobs.get(st.session_state.get("all_paths_job"))
+                if previous is not None:
+                    previous.cancel()
+                job = jobs.submit(
+                    "查询所有路径",
+                    all_paths_job(data.graph, start_id, target_id, keep=DISPLAY_LIMIT),
+                    timeout=timeout,
+                    params={"start": start_spot_name, "target": target_spot_name},
+                )
+                st.session_state.all_paths_job = job.id
 
             except SpotIdInvalidError:
                 st.error("所选景点ID无效，可能已被删除。")
+            except JobQueueFullError as e:
+                st.warning(str(e))
             except Exception as e:
                 st.error(f"查询所有路径失败: {e}")
+
+    job = jobs.get(st.session_state.get("all_paths_job"))
+    if job is not None:
+        job_status(job, key="all_paths")
+    if job is not None and job.done and job.error is None:
+        total, shortest_paths = job.result
+        start_name, target_name = job.params["start"], job.params["target"]
+
+        st.subheader("查询结果")
+        if not total:
+            st.info(f"从 **{start_name}** 到 **{target_name}** 没有找到任何简单路径。")
+        else:
+            st.success(
+                f"找到了 {total} 条从 **{start_name}** 到 **{target_name}** 的简单路径。"
+            )
+
+            if total > len(shortest_paths):
+                # 路径成千上万时逐条渲染会让页面卡住，查询只保留了最短的一部分
+                st.caption(f"只显示总距离最短的 {len(shortest_paths)} 条路径")
+
+            for i, (total_dist, total_duration, path_ids) in enumerate(shortest_paths):
+                with st.container(border=True):
+                    st.markdown(f"#### 路径 {i+1}")
+                    path_names = [data.graph.spots[spot_id].name for spot_id in path_ids]
+                    st.write(f"**路径:** {' -> '.join(path_names)}")
+                    col1, col2 = st.columns(2)
+                    col1.metric("总距离", f"{total_dist} 米")
+                    col2.metric("总时间", f"{total_duration} 分钟")
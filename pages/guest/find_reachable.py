@@ -0,0 +1,82 @@
+import streamlit as st
+from exceptions import SpotIdInvalidError
+from pages.components import spot_picker
+
+data = st.session_state.app_data
+
+st.header("可达范围查询")
+st.info("查询从某个景点出发，在给定的距离或时间以内能够到达的所有景点")
+
+if not data.graph.live_nodes:
+    st.warning("系统中没有任何有效景点，请联系景区管理员")
+else:
+    start_spot = spot_picker("reachable_start_spot", "选择出发景点", data.graph.list_spots)
+
+    weight_type_display = st.radio(
+        "选择限制类型", options=["距离", "时间"], key="reachable_weight_type"
+    )
+    weight_type_model = "distance" if weight_type_display == "距离" else "duration"
+    unit = "米" if weight_type_model == "distance" else "分钟"
+
+    budget = st.number_input(
+        f"{weight_type_display}上限 ({unit})",
+        min_value=0,
+        value=1000 if weight_type_model == "distance" else 20,
+        step=1,
+        key="reachable_budget",
+    )
+
+    if st.button("查询可达景点", disabled=start_spot is None):
+        try:
+            start_id = data.graph.find_spot_by_name(start_spot.name).id
+            st.session_state.reachable_result = (
+                start_id,
+                weight_type_model,
+                int(budget),
+                data.graph.reachable_within(start_id, int(budget), weight_type_model),
+            )
+        except SpotIdInvalidError:
+            st.error("所选景点ID无效，可能已被删除。")
+        except Exception as e:
+            st.error(f"查询可达景点失败: {e}")
+
+    if "reachable_result" in st.session_state:
+        start_id, result_weight_type, result_budget, reachable = (
+            st.session_state.reachable_result
+        )
+        result_unit = "米" if result_weight_type == "distance" else "分钟"
+        # 结果可能是在景点被删除之前查询的，只显示仍然有效的景点
+        reachable = [
+            item for item in reachable if data.graph._is_valid_node(item[0])
+        ]
+
+        st.subheader("查询结果")
+        if len(reachable) <= 1:
+            st.info(
+                f"从 **{data.graph.spots[start_id].name}** 出发，{result_budget} {result_unit}以内没有可以到达的其他景点"
+            )
+        else:
+            st.success(
+                f"从 **{data.graph.spots[start_id].name}** 出发，{result_budget} {result_unit}以内可以到达 {len(reachable) - 1} 个景点"
+            )
+            st.dataframe(
+                [
+                    {
+                        "景点": data.graph.spots[node_id].name,
+                        f"花费 ({result_unit})": cost,
+                        "上一站": data.graph.spots[previous_id].name,
+                    }
+                    for node_id, cost, previous_id in reachable
+                    if previous_id is not None
+                ],
+                hide_index=True,
+            )
+
+            if st.button("在景区地图中高亮显示"):
+                st.session_state.map_highlight = {
+                    "start": start_id,
+                    "previous": {
+                        node_id: previous_id for node_id, _, previous_id in reachable
+                    },
+                }
+                st.switch_page("pages/guest/view_map.py")
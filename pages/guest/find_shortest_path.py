@@ -87,10 +87,8 @@ else:
                                 next_spot = data.graph.spots[next_id]
 
                                 # 找到当前景点到下一个景点的路径详细信息
-                                segment_path = next(
-                                    p
-                                    for p in current_spot.paths
-                                    if p.target_id == next_id
+                                segment_path = data.graph.find_path(
+                                    current_id, next_id
                                 )
                                 st.markdown(
                                     f"- 从 **{current_spot.name}** 到 **{next_spot.name}**:"
@@ -16,24 +16,24 @@ if st.session_state.queried_spot_name:
 
         st.subheader(f"📍 {spot_info.name}")
 
-        st.markdown(f"{spot_info.description}")
+        st.markdown(f"{data.graph.description(spot_info.id)}")
 
         st.divider()
 
         st.subheader("🚶 从这里出发，您可以前往...")
 
-        if not spot_info.paths:
+        neighbors = list(data.graph.neighbors(spot_info.id))
+        if not neighbors:
             st.info("这个景点目前没有连接任何道路。")
         else:
-            for path in spot_info.paths:
-                if data.graph._is_valid_node(path.target_id):
-                    target_spot = data.graph.spots[path.target_id]
+            for neighbor_id, path in neighbors:
+                target_spot = data.graph.spots[neighbor_id]
 
-                    with st.container(border=True):
-                        st.markdown(f"#### 前往: **{target_spot.name}**")
-                        col1, col2 = st.columns(2)
-                        col1.metric(label="📏 道路距离", value=f"{path.distance} 米")
-                        col2.metric(label="⏱️ 预计时间", value=f"{path.duration} 分钟")
+                with st.container(border=True):
+                    st.markdown(f"#### 前往: **{target_spot.name}**")
+                    col1, col2 = st.columns(2)
+                    col1.metric(label="📏 道路距离", value=f"{path.distance} 米")
+                    col2.metric(label="⏱️ 预计时间", value=f"{path.duration} 分钟")
 
         if st.button("返回查询其他景点"):
             st.session_state.queried_spot_name = None
@@ -46,19 +46,42 @@ if st.session_state.queried_spot_name:
         st.rerun()
 
 else:
-    available_spots = [spot.name for spot in data.graph.spots if not spot.deleted]
-
-    if available_spots:
-        st.info("请从下面的列表中选择一个您感兴趣的景点进行查询。")
-
-        st.selectbox(
-            "选择要查询的景点",
-            options=available_spots,
-            key="spot_name_to_query",
-        )
-
-        if st.button("查询"):
-            st.session_state.queried_spot_name = st.session_state.spot_name_to_query
-            st.rerun()
+    if data.graph.live_nodes:
+        st.info("输入景点名称或简介中的关键字进行搜索，输错个别字也能找到。")
+
+        query = st.text_input("搜索景点", key="spot_search_query").strip()
+        if query:
+            results = data.graph.search(query, limit=10)
+            if not results:
+                st.warning("没有找到相关的景点，换个关键字试试吧。")
+            for spot, _ in results:
+                with st.container(border=True):
+                    col1, col2 = st.columns([4, 1])
+                    col1.markdown(f"**{spot.name}**")
+                    description = data.graph.description(spot.id)
+                    if description:
+                        col1.caption(
+                            description[:80] + ("..." if len(description) > 80 else "")
+                        )
+                    if col2.button("查看", key=f"view_spot_{spot.id}"):
+                        st.session_state.queried_spot_name = spot.name
+                        st.rerun()
+
+        spatial = data.graph.spatial_index()
+        if spatial.bounds() is not None:
+            with st.expander("离我最近的景点"):
+                st.caption("输入您所在位置的坐标，按直线距离列出附近的景点")
+                min_x, min_y, max_x, max_y = spatial.bounds()
+                col1, col2, col3 = st.columns(3)
+                x = col1.number_input("横坐标 (米)", value=(min_x + max_x) / 2, key="near_x")
+                y = col2.number_input("纵坐标 (米)", value=(min_y + max_y) / 2, key="near_y")
+                k = col3.number_input("景点数", min_value=1, max_value=50, value=5, key="near_k")
+                for spot, distance in data.graph.nearest_spots(x, y, int(k)):
+                    with st.container(border=True):
+                        col1, col2 = st.columns([4, 1])
+                        col1.markdown(f"**{spot.name}**　直线距离约 {distance:.0f} 米")
+                        if col2.button("查看", key=f"view_near_spot_{spot.id}"):
+                            st.session_state.queried_spot_name = spot.name
+                            st.rerun()
     else:
         st.error("系统内目前不存在任何景点，请联系景区管理员！")
@@ -1,6 +1,8 @@
 import streamlit as st
-from exceptions import SpotIdInvalidError, StandardInvalidError
+from exceptions import JobQueueFullError, SpotIdInvalidError, StandardInvalidError
 from models.graph import Spot
+from models.jobs import DEFAULT_TIMEOUT, jobs, tour_job
+from pages.components import job_status
 
 data = st.session_state.app_data
 
@@ -47,6 +49,17 @@ else:
     )
     weight_type_model = "distance" if weight_type_display == "最短距离" else "duration"
 
+    optimize = st.checkbox(
+        "优化路线顺序",
+        key="tsp_optimize",
+        help="必经景点较多时，在贪心路线的基础上用局部搜索继续改进，时间越长结果越好",
+    )
+    time_budget = 1.0
+    if optimize:
+        time_budget = st.slider(
+            "优化时间 (秒)", min_value=0.5, max_value=30.0, value=2.0, step=0.5
+        )
+
     if st.button("开始规划"):
         if start_spot_name == target_spot_name:
             st.warning("起始景点和目标景点不能相同。")
@@ -60,43 +73,90 @@ else:
                     for name in must_pass_selected_names
                 ]
 
-                total_cost, planned_path_ids = data.graph.tsp(
-                    start_id=start_id,
-                    target_id=target_id,
-                    must_pass=must_pass_ids,
-                    weight_type=weight_type_model,
+                # 同一个会话重新规划时取消上一次还没有结束的规划
+                previous = jobs.get(st.session_state.get("tsp_job"))
+                if previous is not None:
+                    previous.cancel()
+                job = jobs.submit(
+                    "游览路线规划",
+                    tour_job(
+                        data.graph,
+                        start_id,
+                        target_id,
+                        must_pass_ids,
+                        weight_type_model,
+                        time_budget if optimize else None,
+                    ),
+                    # 优化路线本身就要用满预算，超时在此基础上再放宽
+                    timeout=DEFAULT_TIMEOUT + (time_budget if optimize else 0),
+                    params={
+                        "weight_type": weight_type_model,
+                        "weight_type_display": weight_type_display,
+                        "must_pass": must_pass_selected_names,
+                    },
                 )
-
-                st.subheader("规划结果")
-                if total_cost == -1:
-                    st.error("无法规划出满足条件的路径，部分景点可能不连通或无法经过。")
-                else:
-                    st.success("成功规划出一条游览路线！")
-
-                    planned_path_names = [
-                        data.graph.spots[spot_id].name for spot_id in planned_path_ids
-                    ]
-
-                    with st.container(border=True):
-                        st.markdown(
-                            f"**总{weight_type_display.replace('最短', '')}:** "
-                        )
-                        if weight_type_model == "distance":
-                            st.metric(label="", value=f"{total_cost} 米")
-                        else:
-                            st.metric(label="", value=f"{total_cost} 分钟")
-
-                        st.markdown("**游览路径:**")
-                        st.write(" -> ".join(planned_path_names))
-
-                        if must_pass_selected_names:
-                            st.markdown(
-                                f"**已包含必经景点:** {', '.join(must_pass_selected_names)}"
-                            )
+                st.session_state.tsp_job = job.id
 
             except SpotIdInvalidError:
                 st.error("所选景点ID无效，可能已被删除。")
             except StandardInvalidError as sie:
                 st.error(f"规划参数错误: {sie}")
+            except JobQueueFullError as e:
+                st.warning(str(e))
             except Exception as e:
                 st.error(f"规划路径失败: {e}")
+
+    job = jobs.get(st.session_state.get("tsp_job"))
+    if job is not None:
+        job_status(job, key="tsp")
+    if job is not None and job.done and job.error is None:
+        total_cost, planned_path_ids, report = job.result
+        weight_type_model = job.params["weight_type"]
+        weight_type_display = job.params["weight_type_display"]
+        must_pass_selected_names = job.params["must_pass"]
+
+        # 贪心规划提前停止时只有走过的一段，优化提前停止时仍然是完整的路线
+        unfinished = job.stopped and report is None
+
+        st.subheader("规划结果")
+        if job.stopped and total_cost == -1:
+            st.info("规划在求出景点之间的距离之前就停止了，还没有得到任何路线。")
+        elif total_cost == -1 or not planned_path_ids:
+            st.error("无法规划出满足条件的路径，部分景点可能不连通或无法经过。")
+        else:
+            if unfinished:
+                st.warning("下面的路线只经过了部分必经景点，还没有到达终点。")
+            else:
+                st.success("成功规划出一条游览路线！")
+
+            planned_path_names = [
+                data.graph.spots[spot_id].name for spot_id in planned_path_ids
+            ]
+
+            with st.container(border=True):
+                st.markdown(f"**总{weight_type_display.replace('最短', '')}:** ")
+                if weight_type_model == "distance":
+                    st.metric(label="", value=f"{total_cost} 米")
+                else:
+                    st.metric(label="", value=f"{total_cost} 分钟")
+
+                st.markdown("**游览路径:**")
+                st.write(" -> ".join(planned_path_names))
+
+                if must_pass_selected_names and not unfinished:
+                    st.markdown(
+                        f"**已包含必经景点:** {', '.join(must_pass_selected_names)}"
+                    )
+
+            if report is not None:
+                col1, col2, col3 = st.columns(3)
+                col1.metric("贪心路线", report["初始路线总权重"])
+                col2.metric(
+                    "优化后",
+                    report["优化后总权重"],
+                    delta=-report["改进"],
+                    delta_color="inverse",
+                )
+                col3.metric("改进比例", f"{report['改进比例']:.1%}")
+                with st.expander("优化过程"):
+                    st.json(report)
@@ -1,60 +1,158 @@
 import streamlit as st
-import networkx as nx
-import matplotlib.pyplot as plt
+
+from models.events import TOPOLOGY_EVENTS
+
+# 最多保留布局的图的个数，每个已加载的景区一个
+LAYOUT_CACHE_SIZE = 8
 
 data = st.session_state.app_data
 
 st.header("景区地图")
 
+# 其他页面（例如可达范围查询）可以通过 map_highlight 指定需要高亮的景点和道路
+highlight = st.session_state.get("map_highlight")
+if highlight:
+    col1, col2 = st.columns([4, 1])
+    col1.info("绿色为高亮显示的景点及道路，橙色为出发景点")
+    if col2.button("清除高亮"):
+        del st.session_state.map_highlight
+        st.rerun()
+
 
-def create_graph_from_data(graph_data):
+def create_graph_from_data(graph_data, visible=None):
     """
     将 TourGraph 数据转换为 networkx 图对象
+
+    :param graph_data(TourGraph): 图
+    :param visible(List[Spot] | None): 只转换这些景点以及它们之间的道路，None 表示全部
     """
+    import networkx as nx
+
     G = nx.Graph()
 
     # 添加节点
-    for spot in graph_data.spots:
+    spots = graph_data.spots if visible is None else visible
+    for spot in spots:
         if not spot.deleted:
-            G.add_node(spot.id, label=spot.name, title=spot.description)
+            G.add_node(spot.id, label=spot.name)
 
-    # 添加边
-    processed_edges = set()
-    for spot in graph_data.spots:
-        if not spot.deleted:
-            for path in spot.paths:
-                # 检查边的另一端是否也是有效节点
-                if graph_data._is_valid_node(path.target_id):
-                    edge_key = tuple(sorted((spot.id, path.target_id)))
-
-                    if edge_key not in processed_edges:
-                        G.add_edge(
-                            spot.id,
-                            path.target_id,
-                            label=f"{path.distance}m / {path.duration}min",
-                            title=f"距离: {path.distance}m, 时间: {path.duration}min",
-                        )
-                        processed_edges.add(edge_key)
+    # 添加边，iter_edges 中每条道路只出现一次且两端都是有效节点
+    for path in graph_data.iter_edges():
+        if visible is not None and not (G.has_node(path.from_id) and G.has_node(path.to_id)):
+            continue
+        G.add_edge(
+            path.from_id,
+            path.to_id,
+            label=f"{path.distance}m / {path.duration}min",
+        )
     return G
 
 
+@st.cache_resource
+def layout_cache():
+    """
+    所有会话共享的布局缓存：图编号 -> (计算布局时图的修订号, 景点坐标)
+    """
+    return {}
+
+
+def spring_layout(graph_data, nx_graph, revision):
+    """
+    计算景点的布局，之后只有新增或删除了景点、道路时才重新计算，
+    只修改名称、简介或道路权重时沿用缓存的布局
+
+    :param graph_data(TourGraph): 图
+    :param nx_graph(nx.Graph): 由 create_graph_from_data 转换得到的 networkx 图
+    :param revision(int): 转换时图的修订号
+    """
+    import networkx as nx
+
+    cache = layout_cache()
+    cached = cache.get(graph_data._uid)
+    if cached is not None and cached[0] <= revision:
+        cached_revision, pos = cached
+        changes = graph_data.changes_since(cached_revision)
+        if changes is not None and not any(
+            isinstance(event, TOPOLOGY_EVENTS)
+            for event in changes
+            if event.revision <= revision
+        ):
+            cache[graph_data._uid] = (revision, pos)
+            return pos
+
+    pos = nx.spring_layout(nx_graph, k=0.8, iterations=50, seed=42)
+    cache.pop(graph_data._uid, None)
+    cache[graph_data._uid] = (revision, pos)
+    while len(cache) > LAYOUT_CACHE_SIZE:
+        del cache[next(iter(cache))]
+    return pos
+
+
 if not any(not spot.deleted for spot in data.graph.spots):
     st.warning("当前系统中没有任何有效景点，无法生成地图，请联系景区管理员")
 else:
+    # networkx 和 matplotlib 导入较慢，只在真正需要绘制地图时才导入
+    import networkx as nx
+    from matplotlib import rcParams
+    from matplotlib.figure import Figure
+
+    # 所有景点都有坐标时按坐标绘制，并且只绘制选定范围内的景点
+    spatial = data.graph.spatial_index()
+    visible = None
+    if not spatial.missing:
+        min_x, min_y, max_x, max_y = spatial.bounds()
+        st.caption("所有景点都有坐标，地图按实际位置绘制，可以只查看其中一部分区域")
+        col1, col2 = st.columns(2)
+        if min_x < max_x:
+            min_x, max_x = col1.slider(
+                "横坐标范围 (米)", min_value=min_x, max_value=max_x, value=(min_x, max_x)
+            )
+        if min_y < max_y:
+            min_y, max_y = col2.slider(
+                "纵坐标范围 (米)", min_value=min_y, max_value=max_y, value=(min_y, max_y)
+            )
+        visible = data.graph.spots_in_box(min_x, min_y, max_x, max_y)
+        st.caption(f"范围内共有 {len(visible)} 个景点")
+
+    # 先记下修订号再转换，转换期间图被修改的话下次会重新计算布局
+    revision = data.graph.revision
     if "tour_nx_graph" not in locals():
-        tour_nx_graph = create_graph_from_data(data.graph)
+        tour_nx_graph = create_graph_from_data(data.graph, visible)
 
-    pos = nx.spring_layout(tour_nx_graph, k=0.8, iterations=50, seed=42)
-    plt.rcParams["font.sans-serif"] = ["SimHei"]
-    fig, ax = plt.subplots(figsize=(25, 15))
+    if visible is None:
+        pos = spring_layout(data.graph, tour_nx_graph, revision)
+    else:
+        pos = {spot.id: spot.position for spot in visible}
+    rcParams["font.sans-serif"] = ["SimHei"]
+    # 直接使用 Figure 而不是 pyplot，避免加载 pyplot 的全局状态和交互式后端
+    fig = Figure(figsize=(25, 15))
+    ax = fig.subplots()
 
     # 提取节点和边的标签
     node_labels = nx.get_node_attributes(tour_nx_graph, "label")
     edge_labels = nx.get_edge_attributes(tour_nx_graph, "label")
 
+    # 高亮的景点和最短路径树上的道路使用不同的颜色
+    node_color = "skyblue"
+    edge_color = "lightcoral"
+    if highlight:
+        previous = highlight["previous"]
+        node_color = [
+            "orange"
+            if node == highlight["start"]
+            else "lightgreen" if node in previous else "skyblue"
+            for node in tour_nx_graph.nodes
+        ]
+        edge_color = [
+            "seagreen"
+            if previous.get(u) == v or previous.get(v) == u
+            else "lightcoral"
+            for u, v in tour_nx_graph.edges
+        ]
+
     # 绘制节点
     nx.draw_networkx_nodes(
-        tour_nx_graph, pos, node_size=3000, node_color="skyblue", ax=ax
+        tour_nx_graph, pos, node_size=3000, node_color=node_color, ax=ax
     )
     # 绘制节点标签
     nx.draw_networkx_labels(
@@ -67,7 +165,7 @@ else:
     )
     # 绘制边
     nx.draw_networkx_edges(
-        tour_nx_graph, pos, edge_color="lightcoral", width=1.5, ax=ax
+        tour_nx_graph, pos, edge_color=edge_color, width=1.5, ax=ax
     )
     # 绘制边的标签
     nx.draw_networkx_edge_labels(
@@ -75,5 +173,5 @@ else:
     )
 
     ax.margins(0.1)
-    plt.axis("off")
+    ax.axis("off")
     st.pyplot(fig)
@@ -0,0 +1,141 @@
+"""
+启动耗时记录
+
+只依赖标准库，必须在 streamlit、pydantic 等重量级依赖之前导入，
+否则这些模块的导入耗时无法被记录
+"""
+
+import builtins
+import sys
+import threading
+import time
+
+from contextlib import contextmanager
+from importlib.util import resolve_name
+from typing import Dict, Iterator, List, Tuple
+
+__all__ = ["StartupProfiler", "profiler"]
+
+
+class StartupProfiler:
+    """
+    记录程序启动过程中各阶段以及各模块的导入耗时
+
+    同名阶段只保留第一次的记录，因为 Streamlit 每次重跑脚本都会再次经过这些阶段，
+    而我们关心的是冷启动时的耗时
+    """
+
+    def __init__(self) -> None:
+        self.origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._original_import = builtins.__import__
+        self._installed = False
+        # 卸载之后不再重新安装，Streamlit 每次重跑 app.py 都会再次调用 install
+        self._finished = False
+        # 模块名 -> (累计耗时, 自身耗时)，单位为秒
+        self._modules: Dict[str, Tuple[float, float]] = {}
+        # 阶段名 -> (相对启动的开始时间, 耗时)
+        self._stages: Dict[str, Tuple[float, float]] = {}
+
+    def install(self) -> None:
+        """
+        替换内置的 __import__，开始记录模块导入耗时，重复调用不会重复安装，调用过 uninstall 之后不再安装
+        """
+        with self._lock:
+            if self._installed or self._finished:
+                return
+            self._original_import = builtins.__import__
+            builtins.__import__ = self._timed_import
+            self._installed = True
+
+    def uninstall(self) -> None:
+        """
+        恢复内置的 __import__，停止记录模块导入耗时，之后的每次导入不再经过计时的包装
+        启动完成后调用；之后又有其他代码替换了 __import__ 时保留它们的替换
+        """
+        with self._lock:
+            self._finished = True
+            if not self._installed:
+                return
+            if builtins.__import__ == self._timed_import:
+                builtins.__import__ = self._original_import
+            self._installed = False
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        module_name = name
+        if level > 0:
+            try:
+                package = (globals or {}).get("__package__") or ""
+                module_name = resolve_name("." * level + name, package)
+            except (ImportError, ValueError):
+                pass
+        if module_name in sys.modules:
+            # 已经导入过的模块直接走原本的逻辑，不计时
+            return self._original_import(name, globals, locals, fromlist, level)
+
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(0.0)  # 用来累计子模块的导入耗时
+        start = time.perf_counter()
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start
+            children = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            if module_name in sys.modules:
+                with self._lock:
+                    self._modules.setdefault(module_name, (elapsed, elapsed - children))
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        记录一个代码块的耗时
+
+        :param name(str): 阶段名称
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._stages.setdefault(name, (start - self.origin, elapsed))
+
+    def mark(self, name: str) -> None:
+        """
+        记录一个时间点，例如首次渲染完成的时刻
+
+        :param name(str): 时间点名称
+        """
+        with self._lock:
+            self._stages.setdefault(name, (time.perf_counter() - self.origin, 0.0))
+
+    def stages(self) -> List[Dict[str, object]]:
+        """
+        :return: 按开始时间排序的各阶段耗时，单位为毫秒
+        """
+        with self._lock:
+            items = sorted(self._stages.items(), key=lambda item: item[1][0])
+        return [
+            {"阶段": name, "开始于 (ms)": round(start * 1000, 1), "耗时 (ms)": round(elapsed * 1000, 1)}
+            for name, (start, elapsed) in items
+        ]
+
+    def modules(self, top: int | None = None) -> List[Dict[str, object]]:
+        """
+        :param top(int | None): 只返回累计耗时最多的若干个模块，None 表示全部返回
+        :return: 按累计耗时从大到小排序的模块导入耗时，单位为毫秒
+        """
+        with self._lock:
+            items = sorted(self._modules.items(), key=lambda item: item[1][0], reverse=True)
+        return [
+            {"模块": name, "累计耗时 (ms)": round(total * 1000, 1), "自身耗时 (ms)": round(own * 1000, 1)}
+            for name, (total, own) in items[:top]
+        ]
+
+
+profiler = StartupProfiler()